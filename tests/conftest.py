@@ -1,8 +1,339 @@
 import pytest
 import json
 import os
+import threading
+import warnings
 import boto3
-from typing import Dict, Any, Optional, List, Union
+from botocore.config import Config as BotoConfig
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Optional, List, Union
+
+from sfn_testing import LocalTestStateClient, LocalWorkflowExecutor, RetryDecision, RetrySimulator
+from sfn_testing.definitions import SerializedDefinition, freeze
+from sfn_testing.emulator import iter_states
+from sfn_testing.history_replay import HistoryReplayer, ReplayReport, directory_calls
+from sfn_testing.cassette import CASSETTE_MODES, Cassette, CassetteClient, merge_shards, shard_path
+from sfn_testing.map_simulator import ItemMocks, MapRun, MapSimulator
+from sfn_testing.payload_size import PAYLOAD_LIMIT_BYTES, StatePayloadSize, data_limit_cause, measure_serialized
+from sfn_testing.parallel_simulator import BranchMocks, ParallelRun, ParallelSimulator
+from sfn_testing.rate_limit import RateLimitedClient
+from sfn_testing.retry_sweep import RetrySweepResult, SweepCell, plan_retry_sweep
+from sfn_testing.timing import CallTiming, TimingClient, TimingRecorder
+from sfn_testing.state_batch import BatchMock, BatchSummary, StateBatchEvaluator
+from sfn_testing.selection import (
+    STATE_HASHES_CACHE_KEY, TEST_STATES_CACHE_KEY, StateUsageClient, StateUsageRecorder, advance_hashes, select_tests
+)
+from sfn_testing.state_coverage import CoverageClient, CoverageRecorder, CoverageReport
+from sfn_testing.scheduling import DURATIONS_CACHE_KEY, DurationRecorder, order_slowest_first, worker_id
+from sfn_testing.response_cache import CachingClient, ResponseCache
+
+SFN_ENGINES = ('aws', 'local')
+
+
+def pytest_addoption(parser):
+    """Register the --sfn-engine option that selects where TestState calls are served."""
+    parser.addoption(
+        '--sfn-engine',
+        action='store',
+        default=os.environ.get('SFN_TEST_ENGINE', 'aws'),
+        choices=SFN_ENGINES,
+        help="Serve TestState calls from the AWS API ('aws') or the in-process emulator ('local'). "
+             "Defaults to the SFN_TEST_ENGINE environment variable, or 'aws'."
+    )
+    parser.addoption(
+        '--sfn-cassette',
+        action='store',
+        default=os.environ.get('SFN_TEST_CASSETTE'),
+        help="Record/replay TestState responses in this JSON Lines cassette file. "
+             "Defaults to the SFN_TEST_CASSETTE environment variable; disabled when unset."
+    )
+    parser.addoption(
+        '--sfn-cassette-mode',
+        action='store',
+        default=os.environ.get('SFN_TEST_CASSETTE_MODE', 'replay'),
+        choices=CASSETTE_MODES,
+        help="'record' always calls the engine and stores responses, 'replay' serves recorded "
+             "responses and records misses, 'replay_only' fails on misses. Defaults to 'replay'."
+    )
+    parser.addoption(
+        '--sfn-cache',
+        action='store_true',
+        default=bool(os.environ.get('SFN_TEST_CACHE')),
+        help="Deduplicate identical deterministic TestState calls with an in-memory LRU cache."
+    )
+    parser.addoption(
+        '--sfn-cache-dir',
+        action='store',
+        default=os.environ.get('SFN_TEST_CACHE_DIR'),
+        help="Also persist cached responses in this directory so they are reused across sessions "
+             "(implies --sfn-cache)."
+    )
+    parser.addoption(
+        '--sfn-cache-size',
+        action='store',
+        type=int,
+        default=int(os.environ.get('SFN_TEST_CACHE_SIZE', '1024')),
+        help="Maximum number of responses kept in the in-memory cache. Defaults to 1024."
+    )
+    parser.addoption(
+        '--sfn-max-pool-connections',
+        action='store',
+        type=int,
+        default=int(os.environ.get('SFN_TEST_MAX_POOL_CONNECTIONS', '50')),
+        help="Size of the session boto3 client's HTTP connection pool. Defaults to 50."
+    )
+    parser.addoption(
+        '--sfn-slowest-first',
+        action='store_true',
+        default=bool(os.environ.get('SFN_TEST_SLOWEST_FIRST')),
+        help="Run tests longest-first using durations recorded by earlier runs. "
+             "Always enabled on pytest-xdist workers."
+    )
+    parser.addoption(
+        '--sfn-timing',
+        action='store_true',
+        default=bool(os.environ.get('SFN_TEST_TIMING')),
+        help="Time every test_state call and print p50/p95/p99 latency per state and per test."
+    )
+    parser.addoption(
+        '--sfn-timing-json',
+        action='store',
+        default=os.environ.get('SFN_TEST_TIMING_JSON'),
+        help="Write the test_state timing report to this JSON file (implies --sfn-timing)."
+    )
+    parser.addoption(
+        '--sfn-rate-limit',
+        action='store',
+        type=float,
+        default=float(os.environ.get('SFN_TEST_RATE_LIMIT', '20')),
+        help="Initial TestState requests per second for the AWS engine; adapts to throttling. "
+             "0 disables rate limiting. Defaults to 20."
+    )
+    parser.addoption(
+        '--sfn-max-in-flight',
+        action='store',
+        type=int,
+        default=int(os.environ.get('SFN_TEST_MAX_IN_FLIGHT', '32')),
+        help="Upper bound on concurrent TestState calls for the AWS engine. Defaults to 32."
+    )
+    parser.addoption(
+        '--sfn-coverage',
+        action='store_true',
+        default=bool(os.environ.get('SFN_TEST_COVERAGE')),
+        help="Record the state outcomes and transitions the suite exercised and report them "
+             "against the full graph of the definition."
+    )
+    parser.addoption(
+        '--sfn-coverage-json',
+        action='store',
+        default=os.environ.get('SFN_TEST_COVERAGE_JSON'),
+        help="Write the state coverage report to this JSON file (implies --sfn-coverage)."
+    )
+    parser.addoption(
+        '--sfn-payload-limit',
+        action='store',
+        type=int,
+        default=int(os.environ.get('SFN_TEST_PAYLOAD_LIMIT', str(PAYLOAD_LIMIT_BYTES))),
+        help="Fail runner calls and local workflow runs whose state input, result or output passes "
+             "this many serialized bytes. 0 disables the check. Defaults to 262144 (256 KB)."
+    )
+    parser.addoption(
+        '--sfn-changed-only',
+        action='store_true',
+        default=bool(os.environ.get('SFN_TEST_CHANGED_ONLY')),
+        help="Run only the tests that exercised a state changed in the definition since the last "
+             "passing run, or one of its direct predecessors."
+    )
+
+
+_RESPONSE_CACHE_KEY = pytest.StashKey()
+_DURATIONS_KEY = pytest.StashKey()
+_TIMING_KEY = pytest.StashKey()
+_RATE_LIMITER_KEY = pytest.StashKey()
+_COVERAGE_KEY = pytest.StashKey()
+_STATE_USAGE_KEY = pytest.StashKey()
+_AFFECTED_STATES_KEY = pytest.StashKey()
+_TIMING_WORKER_OUTPUT = 'sfn_timings'
+_COVERAGE_WORKER_OUTPUT = 'sfn_coverage'
+_STATE_USAGE_WORKER_OUTPUT = 'sfn_test_states'
+_SLOWEST_TESTS_SHOWN = 10
+
+
+class _TimingCollector:
+    """Collects the timings recorded by pytest-xdist workers on the controller."""
+
+    def __init__(self, recorder: TimingRecorder):
+        self.recorder = recorder
+
+    def pytest_testnodedown(self, node, error):
+        calls = getattr(node, 'workeroutput', {}).get(_TIMING_WORKER_OUTPUT, [])
+        self.recorder.extend(CallTiming.from_dict(call) for call in calls)
+
+
+class _CoverageCollector:
+    """Collects the outcomes recorded by pytest-xdist workers on the controller."""
+
+    def __init__(self, recorder: CoverageRecorder):
+        self.recorder = recorder
+
+    def pytest_testnodedown(self, node, error):
+        self.recorder.update(getattr(node, 'workeroutput', {}).get(_COVERAGE_WORKER_OUTPUT, []))
+
+
+class _StateUsageCollector:
+    """Collects the test-to-state mappings recorded by pytest-xdist workers on the controller."""
+
+    def __init__(self, recorder: StateUsageRecorder):
+        self.recorder = recorder
+
+    def pytest_testnodedown(self, node, error):
+        self.recorder.update(getattr(node, 'workeroutput', {}).get(_STATE_USAGE_WORKER_OUTPUT, {}))
+
+
+def pytest_configure(config):
+    """
+    Register the sfn_engine marker, load per-test durations and state usage
+    recorded by earlier runs and start recording this run's.
+    """
+    config.addinivalue_line(
+        'markers', "sfn_engine(name): run the test on this engine ('aws' or 'local') whatever --sfn-engine says"
+    )
+    # config.cache is missing when the cache plugin is disabled (-p no:cacheprovider)
+    cache = getattr(config, 'cache', None)
+    previous = cache.get(DURATIONS_CACHE_KEY, {}) if cache is not None else {}
+    recorder = DurationRecorder(previous)
+    config.stash[_DURATIONS_KEY] = recorder
+    config.pluginmanager.register(recorder, 'sfn_durations')
+    usage = StateUsageRecorder(cache.get(TEST_STATES_CACHE_KEY, {}) if cache is not None else {})
+    config.stash[_STATE_USAGE_KEY] = usage
+    config.pluginmanager.register(usage, 'sfn_state_usage')
+    if config.pluginmanager.hasplugin('xdist'):
+        config.pluginmanager.register(_StateUsageCollector(usage), 'sfn_state_usage_collector')
+    if config.getoption('--sfn-timing') or config.getoption('--sfn-timing-json'):
+        timing = TimingRecorder()
+        config.stash[_TIMING_KEY] = timing
+        config.pluginmanager.register(timing, 'sfn_timing')
+        if config.pluginmanager.hasplugin('xdist'):
+            config.pluginmanager.register(_TimingCollector(timing), 'sfn_timing_collector')
+    if config.getoption('--sfn-coverage') or config.getoption('--sfn-coverage-json'):
+        coverage = CoverageRecorder()
+        config.stash[_COVERAGE_KEY] = coverage
+        if config.pluginmanager.hasplugin('xdist'):
+            config.pluginmanager.register(_CoverageCollector(coverage), 'sfn_coverage_collector')
+
+
+def pytest_collection_modifyitems(config, items):
+    """Drop tests unaffected by definition changes, then order the rest longest-first."""
+    cache = getattr(config, 'cache', None)
+    if config.getoption('--sfn-changed-only') and cache is not None:
+        selected, deselected, affected = select_tests(
+            items, config.stash[_STATE_USAGE_KEY].previous, load_state_machine_definition(),
+            cache.get(STATE_HASHES_CACHE_KEY, {})
+        )
+        config.stash[_AFFECTED_STATES_KEY] = affected
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+    if config.getoption('--sfn-slowest-first') or worker_id(config) is not None:
+        order_slowest_first(items, config.stash[_DURATIONS_KEY].previous)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Persist test durations, timings and coverage, and merge cassette shards written by xdist workers."""
+    config = session.config
+    timing = config.stash.get(_TIMING_KEY, None)
+    coverage = config.stash.get(_COVERAGE_KEY, None)
+    usage = config.stash[_STATE_USAGE_KEY]
+    if worker_id(config) is not None:
+        if timing is not None and hasattr(config, 'workeroutput'):
+            config.workeroutput[_TIMING_WORKER_OUTPUT] = [call.to_dict() for call in timing.calls]
+        if coverage is not None and hasattr(config, 'workeroutput'):
+            config.workeroutput[_COVERAGE_WORKER_OUTPUT] = [list(observation) for observation in coverage.observed]
+        if hasattr(config, 'workeroutput'):
+            config.workeroutput[_STATE_USAGE_WORKER_OUTPUT] = {
+                test: sorted(states) for test, states in usage.current.items()
+            }
+        return
+    if timing is not None and config.getoption('--sfn-timing-json'):
+        timing.write_json(config.getoption('--sfn-timing-json'))
+    if coverage is not None and config.getoption('--sfn-coverage-json'):
+        CoverageReport(load_state_machine_definition(), coverage.observed).write_json(
+            config.getoption('--sfn-coverage-json')
+        )
+    recorder = config.stash[_DURATIONS_KEY]
+    cache = getattr(config, 'cache', None)
+    if recorder.current and cache is not None:
+        cache.set(DURATIONS_CACHE_KEY, recorder.merged())
+    if usage.current and cache is not None:
+        cache.set(TEST_STATES_CACHE_KEY, usage.merged())
+    # A state's hash moves forward only once all of its tests have passed, so failing
+    # tests and tests left out of a partial run stay selected
+    if cache is not None:
+        cache.set(STATE_HASHES_CACHE_KEY, advance_hashes(
+            load_state_machine_definition(), cache.get(STATE_HASHES_CACHE_KEY, {}), usage.merged(), usage.settled
+        ))
+    cassette_path = config.getoption('--sfn-cassette')
+    if cassette_path:
+        merge_shards(cassette_path)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Report test selection, response cache effectiveness, test_state latency and state coverage when enabled."""
+    affected = config.stash.get(_AFFECTED_STATES_KEY, None)
+    if affected is not None:
+        terminalreporter.write_sep('-', 'Changed-state test selection')
+        terminalreporter.write_line(
+            f"changed states and their direct predecessors: {', '.join(sorted(name or '(definition)' for name in affected))}"
+            if affected else "no state changed since the last passing run (or no run recorded yet)"
+        )
+    cache = config.stash.get(_RESPONSE_CACHE_KEY, None)
+    if cache is not None:
+        stats = cache.stats()
+        terminalreporter.write_sep('-', 'TestState response cache')
+        terminalreporter.write_line(
+            f"{stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+            f"{stats['size']}/{stats['maxsize']} entries in memory"
+        )
+    limiter = config.stash.get(_RATE_LIMITER_KEY, None)
+    if limiter is not None and limiter.calls:
+        metrics = limiter.metrics()
+        throughput = metrics['throughputPerSecond']
+        # Throughput is unknown until two calls have succeeded at different times
+        sustained = f"{throughput} calls/s sustained" if throughput is not None else "throughput not measured"
+        terminalreporter.write_sep('-', 'TestState rate limiter')
+        terminalreporter.write_line(
+            f"{metrics['successes']}/{metrics['calls']} calls succeeded, {metrics['throttles']} throttled, "
+            f"{metrics['retries']} retried ({metrics['backoffSeconds']}s backoff), "
+            f"{sustained}; "
+            f"final limits {metrics['rateLimit']} calls/s, {metrics['concurrencyLimit']} in flight"
+        )
+    timing = config.stash.get(_TIMING_KEY, None)
+    if timing is not None and timing.calls:
+        terminalreporter.write_sep('-', 'TestState latency per state (ms)')
+        _write_timing_table(terminalreporter, timing.by_state())
+        slowest = sorted(timing.by_test().items(), key=lambda entry: entry[1]['totalMs'], reverse=True)
+        terminalreporter.write_sep('-', f'TestState latency per test (ms, {_SLOWEST_TESTS_SHOWN} slowest)')
+        _write_timing_table(terminalreporter, dict(slowest[:_SLOWEST_TESTS_SHOWN]))
+    coverage = config.stash.get(_COVERAGE_KEY, None)
+    if coverage is not None:
+        terminalreporter.write_sep('-', 'State machine coverage')
+        for line in CoverageReport(load_state_machine_definition(), coverage.observed).to_table().splitlines():
+            terminalreporter.write_line(line)
+
+
+def _write_timing_table(terminalreporter, summaries: Dict[str, Dict[str, Any]]) -> None:
+    width = max(len(name) for name in summaries)
+    terminalreporter.write_line(
+        f"{'name':<{width}} {'calls':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'req KB':>8} {'resp KB':>8} "
+        f"{'retries':>7} {'throttles':>9}"
+    )
+    for name, summary in summaries.items():
+        terminalreporter.write_line(
+            f"{name:<{width}} {summary['calls']:>6} {summary['p50Ms']:>9.3f} {summary['p95Ms']:>9.3f} "
+            f"{summary['p99Ms']:>9.3f} {summary['requestBytes'] / 1024:>8.1f} {summary['responseBytes'] / 1024:>8.1f} "
+            f"{summary['retryAttempts']:>7} {summary['throttles']:>9}"
+        )
+
 
 class StepFunctionTestRunner:
     """
@@ -11,9 +342,10 @@ class StepFunctionTestRunner:
     with comprehensive assertion methods similar to the Java implementation.
     """
     
-    def __init__(self, sfn_client, state_machine_definition):
+    def __init__(self, sfn_client, state_machine_definition, minimal_definition: bool = False):
         self.sfn_client = sfn_client
         self.state_machine_definition = state_machine_definition
+        self.minimal_definition = minimal_definition
         self.input_data = None
         self.mock_result = None
         self.mock_error = None
@@ -21,8 +353,24 @@ class StepFunctionTestRunner:
         self.state_config = None
         self.reveal_secrets = False
         self.inspection_level = 'DEBUG'
+        self.payload_limit = None
+        self.payload_size = None
         self.response = None
         
+    @property
+    def state_machine_definition(self) -> Dict[str, Any]:
+        """The definition under test; replacing it refreshes the memoized serialization."""
+        return self.serialized_definition.definition
+        
+    @state_machine_definition.setter
+    def state_machine_definition(self, definition: Dict[str, Any]):
+        self.serialized_definition = SerializedDefinition.of(definition)
+        
+    @property
+    def definition_hash(self) -> str:
+        """SHA-256 of the serialized definition, computed once per definition object."""
+        return self.serialized_definition.hash
+        
     def with_input(self, input_data: Dict[Any, Any]) -> 'StepFunctionTestRunner':
         """Set input data for the test."""
         self.input_data = input_data
@@ -51,6 +399,11 @@ class StepFunctionTestRunner:
             }
         return self
         
+    def with_item_batch(self, items: List[Any], batch_input: Optional[Dict[str, Any]] = None) -> 'StepFunctionTestRunner':
+        """Set the input an ItemProcessor state receives from a Map with an ItemBatcher."""
+        self.input_data = dict(batch_input or {}, Items=items)
+        return self
+        
     def with_context(self, context: Union[str, Dict[Any, Any]]) -> 'StepFunctionTestRunner':
         """Set context object for the execution."""
         if isinstance(context, str):
@@ -90,6 +443,16 @@ class StepFunctionTestRunner:
         self.inspection_level = level
         return self
         
+    def with_minimal_definition(self, enabled: bool = True) -> 'StepFunctionTestRunner':
+        """Send a definition holding only the target state instead of the full document."""
+        self.minimal_definition = enabled
+        return self
+        
+    def with_payload_limit(self, limit: Optional[int] = PAYLOAD_LIMIT_BYTES) -> 'StepFunctionTestRunner':
+        """Measure the serialized input, mock result and output of each call and fail once one passes limit bytes."""
+        self.payload_limit = limit
+        return self
+        
     def clear_mocks(self) -> 'StepFunctionTestRunner':
         """Clear all mock data (result and error) and context."""
         self.mock_result = None
@@ -102,7 +465,7 @@ class StepFunctionTestRunner:
         """Execute the TestState API call."""
         # Prepare parameters
         params = {
-            'definition': json.dumps(self.state_machine_definition),
+            'definition': self._definition_text(state_name),
             'stateName': state_name,
             'input': json.dumps(self.input_data or {}),
             'inspectionLevel': self.inspection_level
@@ -126,10 +489,71 @@ class StepFunctionTestRunner:
         if self.reveal_secrets:
             params['revealSecrets'] = self.reveal_secrets
             
+        # An oversized input fails before the call is made; the request and response
+        # texts are measured as they are, without serializing or parsing them again
+        if self.payload_limit:
+            result = params.get('mock', {}).get('result')
+            self._check_payload(measure_serialized(state_name, params['input'], result, limit=self.payload_limit))
+            
         # Execute the API call
         self.response = self.sfn_client.test_state(**params)
+        if self.payload_limit:
+            self._check_payload(measure_serialized(state_name, params['input'], result, self.response.get('output'),
+                                                   limit=self.payload_limit))
         return self
         
+    def _check_payload(self, size: StatePayloadSize) -> None:
+        self.payload_size = size
+        assert size.max_bytes <= self.payload_limit, data_limit_cause(size, self.payload_limit)
+        
+    def _definition_text(self, state_name: str) -> str:
+        if self.minimal_definition:
+            return self.serialized_definition.minimal_text(state_name)
+        return self.serialized_definition.text
+        
+    def new_runner(self) -> 'StepFunctionTestRunner':
+        """Create a fresh runner sharing this runner's client, definition and request settings."""
+        runner = StepFunctionTestRunner(self.sfn_client, self.state_machine_definition, self.minimal_definition)
+        runner.reveal_secrets = self.reveal_secrets
+        runner.inspection_level = self.inspection_level
+        runner.payload_limit = self.payload_limit
+        return runner
+        
+    def execute_batch(self, specs: List[Dict[str, Any]], max_workers: int = 8) -> List['StepFunctionTestRunner']:
+        """
+        Execute independent TestState calls concurrently on a bounded thread pool.
+        
+        Each spec is a dict with the same keys as StepFunctionTestHelper.test_state:
+        'state_name' (required), 'input_data', 'mock_result', 'mock_error',
+        'context' and 'state_config'. Every spec runs on its own runner sharing
+        this runner's client, so results keep the fluent assertion methods.
+        
+        Usage example:
+        results = runner.execute_batch([
+            {"state_name": "CheckApproval", "input_data": {"approvalResult": {"approved": True}}},
+            {"state_name": "CheckApproval", "input_data": {"approvalResult": {"approved": False}}}
+        ])
+        results[0].assert_next_state("SaveOrderDetails")
+        results[1].assert_next_state("OrderRejected")
+        
+        Returns:
+            One executed runner per spec, in the same order as specs
+        """
+        def execute_spec(spec: Dict[str, Any]) -> 'StepFunctionTestRunner':
+            runner = self.new_runner().with_input(spec.get('input_data'))
+            if spec.get('mock_result') is not None:
+                runner.with_mock_result(spec['mock_result'])
+            if spec.get('mock_error') is not None:
+                runner.with_mock_error(spec['mock_error'])
+            if spec.get('context') is not None:
+                runner.with_context(spec['context'])
+            if spec.get('state_config'):
+                runner.with_state_configuration(spec['state_config'])
+            return runner.execute(spec['state_name'])
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(specs) or 1))) as pool:
+            return list(pool.map(execute_spec, specs))
+        
     # Assertion methods following Java patterns
     def assert_succeeded(self) -> 'StepFunctionTestRunner':
         """Assert that the state execution succeeded."""
@@ -261,15 +685,30 @@ class StepFunctionTestHelper:
     Provides simplified methods that wrap the new StepFunctionTestRunner.
     """
     
-    def __init__(self, sfn_client, state_machine_definition):
+    def __init__(self, sfn_client, state_machine_definition, minimal_definition: bool = False):
         self.sfn_client = sfn_client
         self.state_machine_definition = state_machine_definition
+        self.minimal_definition = minimal_definition
         self.last_response = None
         self.last_output = None
         
+    @property
+    def state_machine_definition(self) -> Dict[str, Any]:
+        """The definition under test; replacing it refreshes the memoized serialization."""
+        return self.serialized_definition.definition
+        
+    @state_machine_definition.setter
+    def state_machine_definition(self, definition: Dict[str, Any]):
+        self.serialized_definition = SerializedDefinition.of(definition)
+        
+    @property
+    def definition_hash(self) -> str:
+        """SHA-256 of the serialized definition, computed once per definition object."""
+        return self.serialized_definition.hash
+        
     def create_runner(self) -> StepFunctionTestRunner:
         """Create a new test runner instance."""
-        return StepFunctionTestRunner(self.sfn_client, self.state_machine_definition)
+        return StepFunctionTestRunner(self.sfn_client, self.state_machine_definition, self.minimal_definition)
     
     def test_state(
         self,
@@ -306,8 +745,12 @@ class StepFunctionTestHelper:
             input_data = self.last_output
         
         # Prepare the TestState API call parameters
+        if self.minimal_definition:
+            definition = self.serialized_definition.minimal_text(state_name)
+        else:
+            definition = self.serialized_definition.text
         params = {
-            'definition': json.dumps(self.state_machine_definition),
+            'definition': definition,
             'stateName': state_name,
             'input': json.dumps(input_data or {}),
             'inspectionLevel': 'DEBUG'  # Always use DEBUG for comprehensive inspection
@@ -462,6 +905,228 @@ class StepFunctionTestHelper:
         
         return response
     
+    def sweep_retry_mechanisms(
+        self,
+        state_names: Optional[List[str]] = None,
+        errors: Optional[List[str]] = None,
+        input_data: Optional[Dict[Any, Any]] = None,
+        max_retry_count: Optional[int] = None,
+        max_workers: int = 8
+    ) -> RetrySweepResult:
+        """
+        Run test_retry_mechanism over the whole (Task state x error x attempt) grid.
+        
+        States with identical Retry policies and Catch ErrorEquals are checked
+        once. Cells run concurrently, each on its own helper, and are compared
+        with the locally simulated status and backoff.
+        
+        The sweep only checks something against the AWS engine. The local
+        emulator retries with the same Retrier the simulation uses, so under
+        --sfn-engine=local every cell passes by construction; a warning says so.
+        
+        Usage example:
+        sweep = sfn_test_helper.sweep_retry_mechanisms()
+        print(sweep.to_table())
+        sweep.assert_all_passed()
+        
+        Returns:
+            RetrySweepResult holding one checked cell per grid point
+        """
+        client = self.sfn_client
+        while hasattr(client, 'client'):
+            client = client.client
+        if type(client) is LocalTestStateClient:
+            warnings.warn("The retry sweep compares the local emulator's Retrier with itself; "
+                          "run it with --sfn-engine=aws to check the definition against AWS")
+        cells = plan_retry_sweep(self.state_machine_definition, state_names, errors, max_retry_count)
+        
+        def check_cell(cell: SweepCell) -> None:
+            helper = StepFunctionTestHelper(self.sfn_client, self.state_machine_definition, self.minimal_definition)
+            try:
+                if cell.expected.status == 'FAILED':
+                    response = helper.test_state(
+                        state_name=cell.state_name,
+                        input_data=input_data,
+                        mock_error={'error': cell.error, 'cause': 'Retry sweep'},
+                        state_config={'retrierRetryCount': cell.retry_count},
+                        expected_status='FAILED'
+                    )
+                else:
+                    policy = cell.expected.retry_policy
+                    response = helper.test_retry_mechanism(
+                        state_name=cell.state_name,
+                        input_data=input_data,
+                        error_type=cell.error,
+                        error_cause='Retry sweep',
+                        retry_count=cell.retry_count,
+                        max_attempts=policy.max_attempts if policy is not None else 0,
+                        expected_backoff_seconds=cell.expected_backoff_seconds,
+                        auto_use_last_output=False
+                    )
+                cell.record(response)
+            except AssertionError as e:
+                cell.record(helper.last_response or {'status': None})
+                cell.message = str(e).splitlines()[0] if str(e) else 'assertion failed'
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cells) or 1))) as pool:
+            list(pool.map(check_cell, cells))
+        return RetrySweepResult(cells)
+    
+    @property
+    def retry_simulator(self) -> RetrySimulator:
+        """Local Retry/Catch decisions for the definition under test, built once per definition."""
+        if getattr(self, '_retry_simulator_definition', None) is not self.serialized_definition:
+            self._retry_simulator = RetrySimulator(self.state_machine_definition)
+            self._retry_simulator_definition = self.serialized_definition
+        return self._retry_simulator
+    
+    def simulate_retry_mechanism(
+        self,
+        state_name: str,
+        error_type: str = 'Lambda.TooManyRequestsException',
+        retry_count: int = 0
+    ) -> RetryDecision:
+        """
+        Compute locally what test_retry_mechanism would get from the API, without a call.
+        
+        Usage example:
+        decision = sfn_test_helper.simulate_retry_mechanism("ValidateOrder", retry_count=3)
+        assert decision.status == "CAUGHT_ERROR" and decision.next_state == "ValidationFailed"
+        
+        Returns:
+            RetryDecision with status, retry/catch policy indices, backoff and nextState
+        """
+        return self.retry_simulator.decide(state_name, error_type, retry_count)
+
+    def simulate_map_state(
+        self,
+        state_name: str = 'ProcessOrderItems',
+        input_data: Optional[Dict[Any, Any]] = None,
+        item_mocks: Optional[ItemMocks] = None,
+        expected_status: str = 'SUCCEEDED',
+        expected_next_state: Optional[str] = None,
+        **run_options
+    ) -> MapRun:
+        """
+        Run a Map state's ItemProcessor locally for every item, with per-item mocks.
+
+        Usage example:
+        run = sfn_test_helper.simulate_map_state(
+            input_data=order_input,
+            item_mocks=lambda index, item: {"ProcessItem": {"result": {"itemId": item["itemId"]}}},
+            expected_next_state="ParallelProcessing"
+        )
+
+        Extra keyword arguments (items, max_concurrency, keep_results, sink,
+        context, state_config, item_batcher) are passed to MapSimulator.run. The Map state's
+        output becomes last_output for the next helper call.
+
+        Returns:
+            MapRun with item counts, failures and the Map state's result
+        """
+        run = MapSimulator(self.state_machine_definition, state_name).run(input_data or {}, item_mocks, **run_options)
+        run.assert_status(expected_status)
+        if expected_next_state is not None:
+            run.assert_next_state(expected_next_state)
+        self.last_response = run.to_response()
+        self.last_output = run.output
+        return run
+
+    def simulate_parallel_state(
+        self,
+        state_name: str = 'ParallelProcessing',
+        input_data: Optional[Dict[Any, Any]] = None,
+        branch_mocks: Optional[BranchMocks] = None,
+        expected_status: str = 'SUCCEEDED',
+        expected_next_state: Optional[str] = None,
+        **run_options
+    ) -> ParallelRun:
+        """
+        Run a Parallel state's branches locally and concurrently, cancelling siblings when one fails.
+
+        Usage example:
+        run = sfn_test_helper.simulate_parallel_state(
+            input_data=order_input,
+            branch_mocks={"ProcessPayment": {"errorOutput": {"error": "Payment.Declined", "cause": "card"}},
+                          "UpdateInventory": {"result": {"inventoryUpdated": True}}},
+            expected_status="CAUGHT_ERROR",
+            expected_next_state="OrderRejected"
+        )
+
+        Extra keyword arguments (context, latencies, max_attempts) are passed
+        to ParallelSimulator.run. The Parallel state's output becomes
+        last_output for the next helper call.
+
+        Returns:
+            ParallelRun with every attempt's branches, timings and the final state result
+        """
+        run = ParallelSimulator(self.state_machine_definition, state_name).run(
+            input_data or {}, branch_mocks, **run_options
+        )
+        run.assert_status(expected_status)
+        if expected_next_state is not None:
+            run.assert_next_state(expected_next_state)
+        self.last_response = run.to_response()
+        self.last_output = run.output
+        return run
+
+    def evaluate_state_batch(
+        self,
+        state_name: str,
+        inputs: Union[str, Iterable[Any]],
+        mock: Optional[BatchMock] = None,
+        expected_next_states: Optional[Dict[Optional[str], int]] = None,
+        **run_options
+    ) -> BatchSummary:
+        """
+        Evaluate one state locally over many inputs and return the nextState histogram.
+        
+        Usage example:
+        summary = sfn_test_helper.evaluate_state_batch("CheckApproval", "approvals.jsonl")
+        assert summary.errors == {}
+        
+        inputs is an iterable of parsed inputs or the path of a JSON Lines
+        file. Extra keyword arguments (context, state_config, sink) are passed
+        to StateBatchEvaluator.run. The local engine is used whatever the
+        session's engine is.
+        
+        Returns:
+            BatchSummary with nextState, status and error counts
+        """
+        summary = StateBatchEvaluator(self.state_machine_definition, state_name).run(inputs, mock, **run_options)
+        if expected_next_states is not None:
+            summary.assert_next_states(expected_next_states)
+        return summary
+
+    def replay_histories(
+        self,
+        directory: str,
+        max_workers: int = 8,
+        assert_no_divergence: bool = True,
+        **replay_options
+    ) -> ReplayReport:
+        """
+        Replay the Task states of exported execution histories against the current definition.
+        
+        Usage example:
+        report = sfn_test_helper.replay_histories("exports/", assert_no_divergence=False)
+        print(report.to_table())
+        
+        Every ``*.json`` file in directory is a get-execution-history export.
+        Each recorded task attempt runs as a TestState call with the recorded
+        result or error as its mock, through this helper's client. Extra
+        keyword arguments (chunk_size, max_divergences_kept) are passed to
+        HistoryReplayer.
+        
+        Returns:
+            ReplayReport with the calls whose status, nextState or output diverged
+        """
+        replayer = HistoryReplayer(self.create_runner(), max_workers=max_workers, **replay_options)
+        report = replayer.replay(directory_calls(directory))
+        if assert_no_divergence:
+            report.assert_no_divergence()
+        return report
+
     def test_terminal_state(
         self,
         state_name: str,
@@ -499,9 +1164,8 @@ class StepFunctionTestHelper:
         self.last_response = None
 
 
-@pytest.fixture
-def state_machine_definition():
-    """Load the complete state machine definition"""
+def load_state_machine_definition() -> Dict[str, Any]:
+    """Read the state machine definition from statemachine/order_processing.asl.json."""
     definition_path = os.path.join(
         os.path.dirname(__file__), 
         '..', 
@@ -512,10 +1176,126 @@ def state_machine_definition():
         return json.load(f)
 
 
+@pytest.fixture(scope='session')
+def session_state_machine_definition():
+    """
+    The state machine definition, read once per session and frozen.
+    
+    Any attempt to mutate it raises TypeError; use sfn_testing.definitions.thaw()
+    to get a private mutable copy.
+    """
+    return freeze(load_state_machine_definition())
+
+
+@pytest.fixture
+def state_machine_definition(session_state_machine_definition):
+    """Load the complete state machine definition (shared, frozen session copy)"""
+    return session_state_machine_definition
+
+
+@pytest.fixture
+def sfn_engine(request):
+    """
+    Engine flag for TestState calls: 'aws' or 'local'.
+    
+    Set it with --sfn-engine / SFN_TEST_ENGINE. A test module pins itself to
+    one engine with pytestmark = pytest.mark.sfn_engine('local').
+    """
+    marker = request.node.get_closest_marker('sfn_engine')
+    return marker.args[0] if marker is not None else request.config.getoption('--sfn-engine')
+
+
+@pytest.fixture(scope='session')
+def sfn_cassette(request):
+    """
+    Session-wide record/replay cassette selected with --sfn-cassette, or None.
+    
+    New recordings are written back to the cassette file when the session ends.
+    """
+    path = request.config.getoption('--sfn-cassette')
+    if not path:
+        yield None
+        return
+    cassette = Cassette(path)
+    yield cassette
+    worker = worker_id(request.config)
+    # Parallel workers write their own shard; the controller merges them at session end
+    cassette.save(shard_path(path, worker) if worker else None)
+
+
+@pytest.fixture(scope='session')
+def sfn_response_cache(request):
+    """Session-wide content-addressed response cache selected with --sfn-cache/--sfn-cache-dir, or None."""
+    directory = request.config.getoption('--sfn-cache-dir')
+    if not (request.config.getoption('--sfn-cache') or directory):
+        return None
+    cache = ResponseCache(maxsize=request.config.getoption('--sfn-cache-size'), directory=directory)
+    request.config.stash[_RESPONSE_CACHE_KEY] = cache
+    return cache
+
+
+@pytest.fixture(scope='session')
+def sfn_client_pool(request, sfn_cassette, sfn_response_cache):
+    """
+    Session-wide Step Functions clients, one per engine, built on first use.
+    
+    Returns a function mapping an engine name ('aws' or 'local') to its client,
+    so every test reuses one boto3 client and its pooled keep-alive connections.
+    The AWS client is rate limited (--sfn-rate-limit) so parallel runs back off
+    on ThrottlingException instead of failing.
+    """
+    clients = {}
+    lock = threading.Lock()
+    
+    def get_client(engine: str):
+        with lock:
+            if engine not in clients:
+                if engine == 'local':
+                    client = LocalTestStateClient()
+                else:
+                    rate = request.config.getoption('--sfn-rate-limit')
+                    # Under the rate limiter, throttles must reach its AIMD controller instead of
+                    # being retried inside botocore first
+                    retries = {'mode': 'standard', 'total_max_attempts': 1} if rate > 0 else None
+                    client = boto3.client('stepfunctions', region_name='ca-central-1', config=BotoConfig(
+                        max_pool_connections=request.config.getoption('--sfn-max-pool-connections'),
+                        tcp_keepalive=True,
+                        retries=retries
+                    ))
+                    if rate > 0:
+                        client = RateLimitedClient(
+                            client, rate=rate, max_concurrency=request.config.getoption('--sfn-max-in-flight')
+                        )
+                        request.config.stash[_RATE_LIMITER_KEY] = client
+                # Cassettes hold AWS responses only, so emulator answers never replay as AWS results
+                if sfn_cassette is not None and engine == 'aws':
+                    client = CassetteClient(client, sfn_cassette, mode=request.config.getoption('--sfn-cassette-mode'))
+                # Likewise the response cache, whose keys do not name the engine
+                if sfn_response_cache is not None and engine == 'aws':
+                    client = CachingClient(client, sfn_response_cache)
+                timing = request.config.stash.get(_TIMING_KEY, None)
+                if timing is not None:
+                    client = TimingClient(client, timing)
+                coverage = request.config.stash.get(_COVERAGE_KEY, None)
+                if coverage is not None:
+                    client = CoverageClient(client, coverage)
+                client = StateUsageClient(client, request.config.stash[_STATE_USAGE_KEY])
+                clients[engine] = client
+            return clients[engine]
+    
+    return get_client
+
+
+@pytest.fixture(scope='session')
+def sfn_session_client(request, sfn_client_pool):
+    """Session-scoped Step Functions client for the engine selected with --sfn-engine"""
+    return sfn_client_pool(request.config.getoption('--sfn-engine'))
+
+
 @pytest.fixture
-def sfn_client():
-    """Step Functions client for TestState API calls"""
-    return boto3.client('stepfunctions', region_name='ca-central-1')
+def sfn_client(sfn_engine, sfn_client_pool):
+    """Step Functions client for TestState API calls (shared for the session per engine)"""
+    return sfn_client_pool(sfn_engine)
 
 
 @pytest.fixture
@@ -550,7 +1330,7 @@ def sfn_test_helper(sfn_client, state_machine_definition):
 
 
 @pytest.fixture
-def runner(sfn_client, state_machine_definition):
+def runner(request, sfn_client, state_machine_definition):
     """
     Direct fixture that provides a StepFunctionTestRunner for method chaining tests.
     
@@ -561,4 +1341,23 @@ def runner(sfn_client, state_machine_definition):
         .execute("ValidateOrder")
         .assert_succeeded())
     """
-    return StepFunctionTestRunner(sfn_client, state_machine_definition)
+    return StepFunctionTestRunner(sfn_client, state_machine_definition).with_payload_limit(
+        request.config.getoption('--sfn-payload-limit') or None
+    )
+
+
+@pytest.fixture
+def workflow_executor(request, state_machine_definition):
+    """
+    Fixture that runs the complete workflow in process, from StartAt to a terminal state.
+    
+    Usage example:
+    execution = (workflow_executor
+        .run(order_input, mocks={"ValidateOrder": {"result": validation_result}, ...})
+        .assert_succeeded()
+        .assert_path(["ValidateOrder", "CheckValidation", ...]))
+    """
+    # A whole-workflow run may pass through any state, so it depends on all of them
+    request.config.stash[_STATE_USAGE_KEY].record_all(name for name, _ in iter_states(state_machine_definition))
+    return LocalWorkflowExecutor(state_machine_definition, coverage=request.config.stash.get(_COVERAGE_KEY, None),
+                                 payload_limit=request.config.getoption('--sfn-payload-limit') or None)
@@ -0,0 +1,127 @@
+"""
+Tests for the ASL transition graph analyzer and the covering scenario planner.
+"""
+
+import pytest
+
+from order_scenarios import HAPPY_PATH_MOCKS, ORDER_INPUT
+from sfn_testing.graph import StateGraph, plan_scenarios
+
+
+def _choice(variable, next_true, next_false):
+    return {
+        'Type': 'Choice',
+        'Choices': [{'Condition': f'{{% $states.input.{variable} = true %}}', 'Next': next_true}],
+        'Default': next_false
+    }
+
+
+# Two independent decisions in a row: 4 paths, but 2 of them cover every edge
+DIAMONDS = {
+    'QueryLanguage': 'JSONata',
+    'StartAt': 'First',
+    'States': {
+        'First': _choice('first', 'A', 'B'),
+        'A': {'Type': 'Pass', 'Next': 'Second'},
+        'B': {'Type': 'Pass', 'Next': 'Second'},
+        'Second': _choice('second', 'C', 'D'),
+        'C': {'Type': 'Succeed'},
+        'D': {'Type': 'Succeed'}
+    }
+}
+
+
+class TestStateGraph:
+    """Tests for edges, path enumeration and the minimum edge cover."""
+
+    def test_edges_from_next_choices_default_catch_and_end(self, state_machine_definition):
+        graph = StateGraph(state_machine_definition)
+        assert [repr(edge) for edge in graph.outgoing('SendNotification')] == [
+            'SendNotification -next-> OrderProcessed',
+            'SendNotification -catch[0]-> OrderProcessed'
+        ]
+        assert [repr(edge) for edge in graph.outgoing('CheckValidation')] == [
+            'CheckValidation -choice[0]-> ProcessOrderItems',
+            'CheckValidation -default-> ValidationFailed'
+        ]
+        assert [repr(edge) for edge in graph.outgoing('OrderRejected')] == ['OrderRejected -end-> (end)']
+        assert len(graph.edges) == 19
+        assert set(graph.subgraphs()) == {'ProcessOrderItems', 'ParallelProcessing'}
+        assert len(graph.subgraphs()['ParallelProcessing']) == 2
+
+    def test_paths_include_failure_and_caught_notification_routes(self, state_machine_definition):
+        paths = [[edge.source for edge in path] for path in StateGraph(state_machine_definition).paths()]
+        assert len(paths) == 9
+        assert ['ValidateOrder', 'ValidationFailed'] in paths
+        assert ['ValidateOrder', 'CheckValidation', 'ValidationFailed'] in paths
+        assert ['ValidateOrder', 'CheckValidation', 'ProcessOrderItems', 'ParallelProcessing', 'WaitForApproval',
+                'CheckApproval', 'OrderRejected'] in paths
+        notification_routes = [path for path in StateGraph(state_machine_definition).paths()
+                               if any(edge.source == 'SendNotification' and edge.kind == 'catch' for edge in path)]
+        assert [edge.source for edge in notification_routes[0]][-2:] == ['SendNotification', 'OrderProcessed']
+
+    def test_edge_cover_takes_every_edge(self, state_machine_definition):
+        graph = StateGraph(state_machine_definition)
+        cover = graph.edge_cover()
+        assert {edge for path in cover for edge in path} == set(graph.edges)
+        # Every terminal edge has its own last branch here, so no path can be dropped
+        assert len(cover) == 9
+
+    def test_edge_cover_is_smaller_than_all_paths(self):
+        graph = StateGraph(DIAMONDS)
+        assert len(graph.paths()) == 4
+        cover = graph.edge_cover()
+        assert len(cover) == 2
+        assert {edge for path in cover for edge in path} == set(graph.edges)
+
+    def test_cyclic_graph_falls_back_to_greedy_cover(self):
+        loop = {
+            'StartAt': 'Poll',
+            'States': {
+                'Poll': {'Type': 'Pass', 'Next': 'Done?'},
+                'Done?': {'Type': 'Choice', 'Choices': [{'Condition': '{% $states.input.done %}', 'Next': 'End'}],
+                          'Default': 'Poll'},
+                'End': {'Type': 'Succeed'}
+            }
+        }
+        graph = StateGraph(loop)
+        assert not graph.is_acyclic()
+        assert [[edge.source for edge in path] for path in graph.edge_cover()] == [['Poll', 'Done?', 'End']]
+
+    def test_missing_target_is_rejected(self):
+        with pytest.raises(ValueError, match='does not exist'):
+            StateGraph({'StartAt': 'A', 'States': {'A': {'Type': 'Pass', 'Next': 'B'}}})
+
+
+class TestScenarioPlanning:
+    """Tests for mock scenarios generated from the edge cover."""
+
+    def test_scenarios_follow_their_paths_with_happy_path_mocks(self, state_machine_definition):
+        scenarios = plan_scenarios(state_machine_definition, ORDER_INPUT, HAPPY_PATH_MOCKS)
+        assert len(scenarios) == 9
+        assert all(scenario.verified for scenario in scenarios), [s.name for s in scenarios if not s.verified]
+        statuses = sorted(scenario.execution.status for scenario in scenarios)
+        assert statuses == ['FAILED'] * 7 + ['SUCCEEDED'] * 2
+
+    def test_choice_data_is_derived_from_the_conditions(self, state_machine_definition):
+        scenarios = {scenario.name: scenario for scenario in plan_scenarios(state_machine_definition, {'orderId': 'o-1'})}
+        assert all(scenario.verified for scenario in scenarios.values())
+        rejected = scenarios['CheckValidation -choice[0]-> ProcessOrderItems, CheckApproval -default-> OrderRejected']
+        assert rejected.mocks['ValidateOrder'] == {'result': {'isValid': True}}
+        assert rejected.mocks['WaitForApproval'] == {'result': {'approved': False}}
+        caught = scenarios['ValidateOrder -catch[0]-> ValidationFailed']
+        assert caught.mocks['ValidateOrder']['errorOutput']['error'] == 'States.TaskFailed'
+        assert caught.execution.path == ['ValidateOrder', 'ValidationFailed']
+
+    def test_choice_data_can_come_from_the_execution_input(self):
+        scenarios = plan_scenarios(DIAMONDS)
+        assert [scenario.input for scenario in scenarios] == [
+            {'first': True, 'second': True}, {'first': False, 'second': False}
+        ]
+        assert all(scenario.verified for scenario in scenarios)
+
+    def test_run_errors_are_reported_not_raised(self, state_machine_definition):
+        # OrderProcessed outputs $states.input.orderId, which is undefined without an orderId
+        scenario = plan_scenarios(state_machine_definition)[0]
+        assert not scenario.verified
+        assert 'undefined' in scenario.error
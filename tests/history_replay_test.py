@@ -0,0 +1,226 @@
+"""
+Tests for replaying exported execution histories as TestState calls.
+"""
+
+import json
+
+import pytest
+
+from conftest import StepFunctionTestRunner
+from sfn_testing import LocalTestStateClient
+from sfn_testing.definitions import thaw
+from sfn_testing.history_replay import HistoryReplayer, history_calls, iter_history_events
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+class _History:
+    """Builds a get-execution-history export event by event."""
+
+    def __init__(self):
+        self.events = [{'id': 1, 'type': 'ExecutionStarted', 'previousEventId': 0}]
+
+    def add(self, event_type, previous, **details):
+        event = dict({'id': len(self.events) + 1, 'type': event_type, 'previousEventId': previous}, **details)
+        self.events.append(event)
+        return event['id']
+
+    def enter(self, state_type, name, previous, state_input):
+        return self.add(f'{state_type}StateEntered', previous,
+                        stateEnteredEventDetails={'name': name, 'input': json.dumps(state_input)})
+
+    def succeed(self, previous, result):
+        previous = self.add('TaskScheduled', previous)
+        previous = self.add('TaskStarted', previous)
+        return self.add('TaskSucceeded', previous, taskSucceededEventDetails={'output': json.dumps(result)})
+
+    def fail(self, previous, error, cause):
+        previous = self.add('TaskScheduled', previous)
+        previous = self.add('TaskStarted', previous)
+        return self.add('TaskFailed', previous, taskFailedEventDetails={'error': error, 'cause': cause})
+
+    def exit(self, name, previous, output):
+        return self.add('TaskStateExited', previous,
+                        stateExitedEventDetails={'name': name, 'output': json.dumps(output)})
+
+    def write(self, path):
+        path.write_text(json.dumps({'events': self.events}, indent=1))
+        return str(path)
+
+
+def _validated_order(directory, name='validated.json', is_valid=True):
+    history = _History()
+    order = {'orderId': 'order-1'}
+    entered = history.enter('Task', 'ValidateOrder', 1, order)
+    failed = history.fail(entered, 'Lambda.TooManyRequestsException', 'Rate exceeded')
+    succeeded = history.succeed(failed, {'isValid': is_valid})
+    exited = history.exit('ValidateOrder', succeeded, dict(order, validationResult={'isValid': is_valid}))
+    history.enter('Choice', 'CheckValidation', exited, dict(order, validationResult={'isValid': is_valid}))
+    return history.write(directory / name)
+
+
+def _rejected_order(directory):
+    history = _History()
+    order = {'orderId': 'order-2'}
+    entered = history.enter('Task', 'ValidateOrder', 1, order)
+    failed = history.fail(entered, 'ValidationException', 'Missing customer')
+    exited = history.exit('ValidateOrder', failed,
+                          dict(order, error={'Error': 'ValidationException', 'Cause': 'Missing customer'}))
+    history.enter('Fail', 'ValidationFailed', exited, {})
+    return history.write(directory / 'rejected.json')
+
+
+def _replayer(state_machine_definition, definition=None, **options):
+    runner = StepFunctionTestRunner(LocalTestStateClient(), definition or state_machine_definition)
+    return HistoryReplayer(runner, **options)
+
+
+class TestHistoryEvents:
+    """Tests for reading history exports one event at a time."""
+
+    def test_small_chunks_yield_every_event(self, tmp_path):
+        path = _validated_order(tmp_path)
+        expected = json.loads(open(path).read())['events']
+        assert list(iter_history_events(path, chunk_size=7)) == expected
+        assert list(iter_history_events(path)) == expected
+
+    def test_bare_event_arrays_are_accepted(self, tmp_path):
+        path = tmp_path / 'bare.json'
+        path.write_text(json.dumps([{'id': 1, 'type': 'ExecutionStarted'}, {'id': 2, 'type': 'ExecutionSucceeded'}]))
+        assert [event['id'] for event in iter_history_events(str(path), chunk_size=5)] == [1, 2]
+
+    def test_truncated_exports_raise(self, tmp_path):
+        path = tmp_path / 'cut.json'
+        path.write_text(json.dumps({'events': _History().events})[:-10])
+        with pytest.raises(ValueError, match='cut.json: malformed event at offset'):
+            list(iter_history_events(str(path), chunk_size=8))
+
+    def test_malformed_events_stop_reading_at_the_size_cap(self, tmp_path):
+        path = tmp_path / 'malformed.json'
+        events = [{'id': 1, 'type': 'ExecutionStarted'}] + [{'id': index, 'pad': 'x' * 100} for index in range(2, 500)]
+        text = json.dumps({'events': events})
+        broken = text.index('{"id": 2')
+        path.write_text(text[:broken] + '{"id": 2 "type": ' + text[broken + len('{"id": 2,'):])
+        reads = []
+
+        with pytest.raises(ValueError, match=f'malformed event at offset {broken}, it does not decode within 256'):
+            for event in iter_history_events(str(path), chunk_size=64, max_event_size=256):
+                reads.append(event['id'])
+        assert reads == [1]
+
+
+class TestHistoryCalls:
+    """Tests for rebuilding TestState calls from Task state events."""
+
+    def test_attempts_become_retry_and_success_calls(self, tmp_path):
+        calls = list(history_calls(_validated_order(tmp_path)))
+        assert [(call.expected_status, call.retry_count) for call in calls] == [('RETRIABLE', 0), ('SUCCEEDED', 1)]
+        assert calls[0].to_spec()['mock_error'] == {'Error': 'Lambda.TooManyRequestsException',
+                                                    'Cause': 'Rate exceeded'}
+        assert calls[1].to_spec() == {
+            'state_name': 'ValidateOrder',
+            'input_data': {'orderId': 'order-1'},
+            'mock_result': '{"isValid": true}',
+            'state_config': {'retrierRetryCount': 1}
+        }
+        assert calls[1].expected_next_state == 'CheckValidation'
+
+    def test_caught_and_uncaught_failures(self, tmp_path):
+        (caught,) = history_calls(_rejected_order(tmp_path))
+        assert (caught.expected_status, caught.expected_next_state) == ('CAUGHT_ERROR', 'ValidationFailed')
+
+        history = _History()
+        entered = history.enter('Task', 'ValidateOrder', 1, {'orderId': 'order-3'})
+        failed = history.fail(entered, 'ValidationException', 'Missing customer')
+        history.add('ExecutionFailed', failed)
+        (uncaught,) = history_calls(history.write(tmp_path / 'failed.json'))
+        assert (uncaught.expected_status, uncaught.expected_next_state) == ('FAILED', None)
+
+    def test_interleaved_parallel_branches_stay_apart(self, tmp_path):
+        history = _History()
+        order = {'orderId': 'order-4'}
+        parallel = history.add('ParallelStateEntered', 1, stateEnteredEventDetails={'name': 'ProcessPaymentAndInventory'})
+        payment = history.enter('Task', 'ProcessPayment', parallel, order)
+        inventory = history.enter('Task', 'UpdateInventory', parallel, order)
+        payment = history.add('TaskScheduled', payment)
+        inventory = history.add('TaskScheduled', inventory)
+        inventory = history.add('TaskSucceeded', inventory, taskSucceededEventDetails={'output': '{"updated": true}'})
+        payment = history.add('TaskSucceeded', payment, taskSucceededEventDetails={'output': '{"charged": true}'})
+        history.exit('UpdateInventory', inventory, {'updated': True})
+        history.exit('ProcessPayment', payment, {'charged': True})
+        history.add('ParallelStateSucceeded', parallel)
+        calls = {call.state_name: call for call in history_calls(history.write(tmp_path / 'parallel.json'))}
+        assert calls['ProcessPayment'].result == '{"charged": true}'
+        assert calls['UpdateInventory'].result == '{"updated": true}'
+        assert calls['ProcessPayment'].expected_next_state is None
+
+    def test_truncated_inputs_are_skipped(self, tmp_path):
+        history = _History()
+        entered = history.add('TaskStateEntered', 1, stateEnteredEventDetails={
+            'name': 'ValidateOrder', 'input': '{"orderId": "ord', 'inputDetails': {'truncated': True}})
+        exited = history.exit('ValidateOrder', history.succeed(entered, {'isValid': True}), {})
+        history.enter('Choice', 'CheckValidation', exited, {})
+        assert list(history_calls(history.write(tmp_path / 'truncated.json'))) == []
+
+    def test_truncated_results_and_outputs_are_skipped(self, tmp_path):
+        history = _History()
+        entered = history.enter('Task', 'ValidateOrder', 1, {'orderId': 'order-5'})
+        previous = history.add('TaskScheduled', entered)
+        succeeded = history.add('TaskSucceeded', previous, taskSucceededEventDetails={
+            'output': '{"isVal', 'outputDetails': {'truncated': True}})
+        exited = history.exit('ValidateOrder', succeeded, {'orderId': 'order-5'})
+        history.enter('Choice', 'CheckValidation', exited, {})
+        assert list(history_calls(history.write(tmp_path / 'result.json'))) == []
+
+        history = _History()
+        entered = history.enter('Task', 'ValidateOrder', 1, {'orderId': 'order-6'})
+        exited = history.add('TaskStateExited', history.succeed(entered, {'isValid': True}), stateExitedEventDetails={
+            'name': 'ValidateOrder', 'output': '{"orderId": "ord', 'outputDetails': {'truncated': True}})
+        history.enter('Choice', 'CheckValidation', exited, {})
+        assert list(history_calls(history.write(tmp_path / 'output.json'))) == []
+
+
+class TestHistoryReplayer:
+    """Tests for replaying calls against the current definition and reporting divergences."""
+
+    def test_unchanged_definition_replays_cleanly(self, state_machine_definition, tmp_path):
+        _validated_order(tmp_path)
+        _rejected_order(tmp_path)
+        report = _replayer(state_machine_definition, chunk_size=2).replay(
+            call for path in sorted(tmp_path.glob('*.json')) for call in history_calls(str(path))
+        )
+        report.assert_no_divergence()
+        assert (report.total, report.calls_per_state['ValidateOrder']) == (3, 3)
+
+    def test_changed_definition_reports_divergences(self, state_machine_definition, tmp_path):
+        definition = thaw(state_machine_definition)
+        definition['States']['ValidateOrder']['Next'] = 'ProcessOrderItems'
+        definition['States']['ValidateOrder']['Output'] = "{% $merge([$states.input, {'valid': $states.result}]) %}"
+        records = []
+        report = _replayer(state_machine_definition, definition).replay(
+            history_calls(_validated_order(tmp_path)), sink=lambda index, record: records.append((index, record))
+        )
+        assert (report.total, report.diverged) == (2, 1)
+        assert report.divergences[0].fields == ['nextState', 'output']
+        assert records[0][0] == 0
+        assert records[0][1]['actual']['nextState'] == 'ProcessOrderItems'
+        assert report.to_dict()['states'] == {'ValidateOrder': {'calls': 2, 'diverged': 1}}
+        with pytest.raises(AssertionError, match='1 of 2 replayed calls diverged'):
+            report.assert_no_divergence()
+
+    def test_divergences_kept_are_bounded(self, state_machine_definition, tmp_path):
+        for index in range(5):
+            _validated_order(tmp_path, f'order-{index}.json', is_valid=False)
+        definition = thaw(state_machine_definition)
+        definition['States']['ValidateOrder']['Next'] = 'ProcessOrderItems'
+        report = _replayer(state_machine_definition, definition, max_divergences_kept=2).replay(
+            call for path in sorted(tmp_path.glob('*.json')) for call in history_calls(str(path))
+        )
+        assert (report.diverged, len(report.divergences)) == (5, 2)
+
+    def test_helper_replays_a_directory(self, sfn_test_helper, tmp_path):
+        _validated_order(tmp_path)
+        _rejected_order(tmp_path)
+        report = sfn_test_helper.replay_histories(str(tmp_path), max_workers=2)
+        assert 'ValidateOrder' in report.to_table()
@@ -0,0 +1,318 @@
+"""
+Unit tests for the in-process TestState emulator and its JSONata evaluator.
+These tests never call AWS: they pin the engine to the local emulator.
+"""
+
+import pytest
+import json
+
+from order_scenarios import HAPPY_PATH_MOCKS, ORDER_INPUT
+from sfn_testing import JSONataError, LocalStateEngine, LocalTestStateError, LocalWorkflowExecutor
+from sfn_testing.choice_index import ChoiceIndex
+from sfn_testing.overlay import MAX_OVERLAY_DEPTH, Overlay, to_plain
+from sfn_testing.jsonata import UNDEFINED, Environment, ExpressionCache, compile_template, evaluate, evaluate_template
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+class TestJSONataEvaluator:
+    """Tests for the JSONata subset used by the state machine definition."""
+
+    def test_merge_and_path_navigation(self):
+        states = {
+            'input': {'orderId': 'order-1', 'amount': 10},
+            'result': {'isValid': True}
+        }
+        output = evaluate("$merge([$states.input, {'validationResult': $states.result}])", {'states': states})
+        assert output == {'orderId': 'order-1', 'amount': 10, 'validationResult': {'isValid': True}}
+
+    def test_boolean_equality_is_type_strict(self):
+        assert evaluate('$states.input.flag = true', {'states': {'input': {'flag': True}}}) is True
+        assert evaluate('$states.input.flag = true', {'states': {'input': {'flag': 1}}}) is False
+        assert evaluate('$states.input.missing = true', {'states': {'input': {}}}) is False
+
+    def test_string_formats_numbers_like_javascript(self):
+        assert evaluate('$string(100.0)') == '100'
+        assert evaluate('$string(150.75)') == '150.75'
+        assert evaluate("$string({'a': [1, 2.5]})") == '{"a":[1,2.5]}'
+
+    def test_path_maps_over_arrays_and_filters(self):
+        bindings = {'states': {'input': {'items': [{'id': 'a', 'qty': 1}, {'id': 'b', 'qty': 3}]}}}
+        assert evaluate('$states.input.items.id', bindings) == ['a', 'b']
+        assert evaluate('$states.input.items[qty > 2].id', bindings) == 'b'
+        assert evaluate('$states.input.items[0].id', bindings) == 'a'
+        assert evaluate('$sum($states.input.items.qty)', bindings) == 4
+
+    def test_template_omits_undefined_fields(self):
+        template = {
+            'orderId': '{% $states.input.orderId %}',
+            'taskToken': '{% $states.context.Task.Token %}',
+            'static': 'value'
+        }
+        result = evaluate_template(template, {'states': {'input': {'orderId': 'o-1'}, 'context': {}}})
+        assert result == {'orderId': 'o-1', 'static': 'value'}
+        assert evaluate_template('{% $states.input.nothing %}', {'states': {'input': {}}}) is UNDEFINED
+
+    def test_invalid_expression_raises(self):
+        with pytest.raises(JSONataError):
+            evaluate('$states.input.')
+        with pytest.raises(JSONataError):
+            evaluate('$unknownFunction(1)')
+
+    @pytest.mark.parametrize('expression', ['$length(5)', '$uppercase(5)', '1/0', '$sum(["a"])', '$max([])'])
+    def test_function_and_operator_errors_raise_jsonata_errors(self, expression):
+        with pytest.raises(JSONataError):
+            evaluate(expression)
+
+
+class TestExpressionCache:
+    """Tests for parsing each expression once and reusing the compiled AST."""
+
+    def test_expression_is_parsed_once(self):
+        cache = ExpressionCache()
+        first = cache.compile('$states.input.validationResult.isValid = true')
+        second = cache.compile('$states.input.validationResult.isValid = true')
+        assert first is second
+        assert cache.cache_info()['misses'] == 1
+        assert cache.cache_info()['hits'] == 1
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = ExpressionCache(maxsize=2)
+        cache.compile('1')
+        cache.compile('2')
+        cache.compile('1')
+        cache.compile('3')
+        assert cache.cache_info()['size'] == 2
+        cache.compile('1')
+        assert cache.cache_info()['misses'] == 3
+
+    def test_engine_compiles_definition_once(self, state_machine_definition):
+        cache = ExpressionCache()
+        engine = LocalStateEngine(state_machine_definition, cache=cache)
+        compiled = cache.cache_info()['misses']
+        for approved in (True, False) * 50:
+            response = engine.test_state('CheckApproval', {'approvalResult': {'approved': approved}})
+            assert response['nextState'] == ('SaveOrderDetails' if approved else 'OrderRejected')
+        assert cache.cache_info()['misses'] == compiled
+
+    def test_constant_templates_are_not_reevaluated(self):
+        template = ExpressionCache().compile_template({'TableName': 'Orders', 'Item': {'status': {'S': 'DONE'}}})
+        assert template.evaluate() == {'TableName': 'Orders', 'Item': {'status': {'S': 'DONE'}}}
+
+
+class TestMergeOverlay:
+    """Tests for $merge sharing its first object instead of copying it."""
+
+    def test_merge_shares_the_input(self):
+        state_input = {'orderId': 'o-1', 'amount': 10, 'note': 'old'}
+        merged = evaluate("$merge([$states.input, {'note': 'new', 'extra': true}])", {'states': {'input': state_input}})
+        assert isinstance(merged, Overlay) and merged.base is state_input
+        assert merged == {'orderId': 'o-1', 'amount': 10, 'note': 'new', 'extra': True}
+        assert list(merged) == ['orderId', 'amount', 'note', 'extra'] and len(merged) == 4
+        assert state_input == {'orderId': 'o-1', 'amount': 10, 'note': 'old'}
+
+    def test_overlays_behave_as_objects_in_expressions(self):
+        bindings = {'states': {'input': {'a': {'x': 1}}}}
+        merged = "$merge([$states.input, {'b': 2}])"
+        assert evaluate(f"$keys({merged})", bindings) == ['a', 'b']
+        assert evaluate(f"$string({merged})", bindings) == '{"a":{"x":1},"b":2}'
+        assert evaluate(f"{merged} = {{'a': {{'x': 1}}, 'b': 2}}", bindings) is True
+        assert evaluate("$merge([$merge([$states.input, {'b': 2}]), {'c': 3}]).a.x", bindings) == 1
+
+    def test_long_chains_stay_shallow_and_linear(self):
+        data = {f'key-{index}': index for index in range(10000)}
+        for hop in range(2000):
+            data = evaluate("$merge([$states.input, {'hop': $states.context.hop}])",
+                            {'states': {'input': data, 'context': {'hop': hop}}})
+            assert data.depth <= MAX_OVERLAY_DEPTH
+        assert data['hop'] == 1999 and data['key-9999'] == 9999 and len(data) == 10001
+
+    def test_outputs_are_plain_at_the_boundary(self, state_machine_definition):
+        execution = LocalWorkflowExecutor(state_machine_definition).run(ORDER_INPUT, HAPPY_PATH_MOCKS)
+        step = execution.steps[2]
+        assert isinstance(step.result.output, Overlay) and type(step.output) is dict
+        assert json.loads(step.to_response()['output']) == to_plain(step.result.output) == step.output
+        assert isinstance(step.state_input, Overlay) and type(step.input) is dict
+        assert step.input == to_plain(step.state_input)
+
+
+def _sequential_match(conditions, env):
+    for number, condition in enumerate(conditions):
+        if condition.evaluate_in(env) is True:
+            return number
+    return None
+
+
+class TestChoiceIndex:
+    """Tests for the hash-indexed Choice rule lookup."""
+
+    def test_definition_choices_are_indexed(self, state_machine_definition):
+        engine = LocalStateEngine(state_machine_definition)
+        for name in ('CheckValidation', 'CheckApproval'):
+            index = engine.states[name].choice_index
+            assert (index.indexed, index.sequential) == (1, [])
+
+    def test_matches_sequential_evaluation(self):
+        rules = []
+        for number in range(300):
+            if number % 7 == 0:
+                rules.append(f"{{% $states.input.amount > {number} %}}")
+            elif number % 3 == 0:
+                rules.append(f"{{% $states.input.tier = 'tier-{number % 20}' %}}")
+            elif number % 3 == 1:
+                rules.append(f"{{% {number % 50} = $states.input.code %}}")
+            else:
+                rules.append(f"{{% $states.input.flag = {'true' if number % 2 else 'false'} %}}")
+        conditions = [compile_template(rule) for rule in rules]
+        index = ChoiceIndex(conditions)
+        assert len(index.groups) == 3
+        inputs = [{'tier': f'tier-{n % 25}', 'code': n % 60, 'flag': bool(n % 3), 'amount': n * 3}
+                  for n in range(120)]
+        inputs += [{'code': 4.0}, {'code': True}, {'flag': 1}, {'tier': ['tier-3']}, {}]
+        for state_input in inputs:
+            env = Environment({'states': {'input': state_input}})
+            assert index.match(env) == _sequential_match(conditions, env), state_input
+
+    def test_equality_is_type_strict(self):
+        index = ChoiceIndex([compile_template('{% $states.input.v = 1 %}'),
+                             compile_template('{% $states.input.v = true %}'),
+                             compile_template("{% $states.input.v = '1' %}")])
+        assert [index.match(Environment({'states': {'input': {'v': value}}})) for value in (1.0, True, '1', None)] == [
+            0, 1, 2, None
+        ]
+
+    def test_complex_rule_before_the_match_still_raises(self):
+        index = ChoiceIndex([compile_template('{% $states.input.go = true %}'),
+                             compile_template("{% $states.input.name > 1 %}"),
+                             compile_template('{% $states.input.stop = true %}')])
+        assert index.match(Environment({'states': {'input': {'go': True, 'name': 'x'}}})) == 0
+        with pytest.raises(JSONataError):
+            index.match(Environment({'states': {'input': {'stop': True, 'name': 'x'}}}))
+
+    def test_large_choice_state_picks_the_first_matching_rule(self, sfn_client):
+        choices = [{'Condition': f"{{% $states.input.region = 'region-{number % 500}' %}}", 'Next': f'Done{number}'}
+                   for number in range(1000)]
+        definition = {
+            'QueryLanguage': 'JSONata',
+            'StartAt': 'Route',
+            'States': dict({'Route': {'Type': 'Choice', 'Choices': choices, 'Default': 'Done0'}},
+                           **{f'Done{number}': {'Type': 'Succeed'} for number in range(1000)})
+        }
+        engine = LocalStateEngine(definition)
+        assert engine.states['Route'].choice_index.indexed == 1000
+        assert engine.run('Route', {'region': 'region-499'}).next_state == 'Done499'
+        assert engine.run('Route', {'region': 'elsewhere'}).next_state == 'Done0'
+
+
+class TestLocalTestStateEngine:
+    """Tests for state types and error handling the unit suite does not reach."""
+
+    def test_choice_without_match_or_default_fails(self, sfn_client):
+        definition = {
+            'QueryLanguage': 'JSONata',
+            'StartAt': 'Decide',
+            'States': {
+                'Decide': {
+                    'Type': 'Choice',
+                    'Choices': [{'Condition': '{% $states.input.go = true %}', 'Next': 'Done'}]
+                },
+                'Done': {'Type': 'Succeed'}
+            }
+        }
+        response = sfn_client.test_state(
+            definition=json.dumps(definition), stateName='Decide', input=json.dumps({'go': False})
+        )
+        assert response['status'] == 'FAILED'
+        assert response['error'] == 'States.NoChoiceMatched'
+
+    def test_choice_rule_without_output_uses_the_state_output(self, sfn_client):
+        definition = {
+            'QueryLanguage': 'JSONata',
+            'StartAt': 'Decide',
+            'States': {
+                'Decide': {
+                    'Type': 'Choice',
+                    'Output': "{% {'routed': $states.input.go} %}",
+                    'Choices': [{'Condition': '{% $states.input.go = true %}', 'Next': 'Done'}],
+                    'Default': 'Done'
+                },
+                'Done': {'Type': 'Succeed'}
+            }
+        }
+        for go in (True, False):
+            response = sfn_client.test_state(
+                definition=json.dumps(definition), stateName='Decide', input=json.dumps({'go': go})
+            )
+            assert json.loads(response['output']) == {'routed': go}
+
+    def test_uncaught_error_fails_the_state(self, runner):
+        (runner
+         .with_input({'orderId': 'order-1'})
+         .with_mock_error({'Error': 'Custom.Error', 'Cause': 'boom'})
+         .execute('ItemProcessingFailed')
+         .assert_failed()
+         .assert_error('ItemProcessingError')
+         .assert_cause('Failed to process individual item'))
+
+    def test_catch_output_receives_error_output(self, runner):
+        (runner
+         .with_input({'orderId': 'order-1'})
+         .with_mock_error({'Error': 'ValidationException', 'Cause': 'bad order'})
+         .execute('ValidateOrder')
+         .assert_caught_error()
+         .assert_catch_policy_handled_error(0)
+         .assert_output_matches_json({
+             'orderId': 'order-1',
+             'error': {'Error': 'ValidationException', 'Cause': 'bad order'}
+         }))
+
+    def test_dynamodb_arguments_use_context_and_string_conversion(self, runner):
+        (runner
+         .with_input({'orderId': 'order-1', 'amount': 100.0})
+         .with_context({'State': {'EnteredTime': '2025-01-15T10:36:00Z'}})
+         .with_mock_result({'Attributes': {}})
+         .execute('SaveOrderDetails')
+         .assert_succeeded()
+         .assert_after_arguments({
+             'TableName': 'Orders',
+             'Item': {
+                 'orderId': {'S': 'order-1'},
+                 'amount': {'N': '100'},
+                 'status': {'S': 'COMPLETED'},
+                 'processedAt': {'S': '2025-01-15T10:36:00Z'}
+             }
+         }))
+
+    def test_succeed_state_output_expression(self, runner):
+        (runner
+         .with_input({'orderId': 'order-1'})
+         .execute('OrderProcessed')
+         .assert_succeeded()
+         .assert_no_next_state()
+         .assert_output_matches_json('"order-1"'))
+
+    def test_undefined_output_fails_with_query_evaluation_error(self, sfn_client, state_machine_definition):
+        response = sfn_client.test_state(
+            definition=json.dumps(state_machine_definition), stateName='OrderProcessed', input='{}'
+        )
+        assert response['status'] == 'FAILED'
+        assert response['error'] == 'States.QueryEvaluationError'
+
+    def test_function_errors_fail_the_state(self, sfn_client):
+        definition = {
+            'QueryLanguage': 'JSONata',
+            'StartAt': 'Shout',
+            'States': {'Shout': {'Type': 'Pass', 'Output': '{% $uppercase($states.input.name) %}', 'End': True}}
+        }
+        response = sfn_client.test_state(definition=json.dumps(definition), stateName='Shout', input='{"name": 5}')
+        assert (response['status'], response['error']) == ('FAILED', 'States.QueryEvaluationError')
+        assert '$uppercase' in response['cause']
+
+    def test_task_without_mock_is_rejected(self, runner):
+        with pytest.raises(LocalTestStateError):
+            runner.with_input({'orderId': 'order-1'}).execute('ValidateOrder')
+
+    def test_unknown_state_is_rejected(self, runner):
+        with pytest.raises(LocalTestStateError):
+            runner.with_input({}).execute('DoesNotExist')
@@ -0,0 +1,274 @@
+"""
+Tests for the local Map state simulator.
+"""
+
+import json
+import threading
+
+import pytest
+
+from conftest import StepFunctionTestRunner
+from sfn_testing import ItemBatcher, LocalTestStateClient, LocalTestStateError, MapSimulator
+from sfn_testing.emulator import StateError
+from sfn_testing.definitions import thaw
+from sfn_testing.item_io import CsvReader, JsonLinesReader, JsonLinesWriter, item_reader
+
+
+def _processed(index, item):
+    return {'ProcessItem': {'result': {'itemId': item['itemId'], 'processed': True}}}
+
+
+def _order(count):
+    return {'orderId': 'order-map', 'orderItems': [{'itemId': f'item-{index}'} for index in range(count)]}
+
+
+class TestMapSimulator:
+    """Tests for per-item ItemProcessor runs, concurrency and the tolerated failure threshold."""
+
+    def test_results_keep_item_order_and_feed_the_map_output(self, state_machine_definition):
+        run = MapSimulator(state_machine_definition).run(_order(25), _processed)
+        run.assert_status('SUCCEEDED').assert_next_state('ParallelProcessing')
+        assert run.output['orderId'] == 'order-map'
+        assert [result['itemId'] for result in run.output['processedItems']] == [f'item-{i}' for i in range(25)]
+        assert run.to_response()['inspectionData']['maxConcurrency'] == 10
+
+    def test_workers_are_bounded_by_max_concurrency(self, state_machine_definition):
+        # The first ten items wait for each other, so all ten workers are busy at once
+        barrier = threading.Barrier(10, timeout=10)
+
+        def gathered_mocks(index, item):
+            if index < 10:
+                barrier.wait()
+            return _processed(index, item)
+
+        simulator = MapSimulator(state_machine_definition)
+        run = simulator.run(_order(60), gathered_mocks)
+        assert run.max_in_flight == 10
+        assert simulator.run(_order(60), _processed, max_concurrency=3).max_in_flight <= 3
+
+    def test_item_retries_run_inside_the_item_processor(self, state_machine_definition):
+        throttled_once = {'ProcessItem': [
+            {'errorOutput': {'error': 'Lambda.TooManyRequestsException', 'cause': 'busy'}},
+            {'result': {'processed': True}}
+        ]}
+        run = MapSimulator(state_machine_definition).run(_order(4), throttled_once)
+        assert (run.status, run.succeeded, run.failed) == ('SUCCEEDED', 4, 0)
+
+    def test_exceeding_the_threshold_stops_starting_items(self, state_machine_definition):
+        def first_three_fail(index, item):
+            if index < 3:
+                return {'ProcessItem': {'errorOutput': {'error': 'Lambda.ServiceException', 'cause': 'down'}}}
+            return _processed(index, item)
+
+        run = MapSimulator(state_machine_definition).run(_order(10000), first_three_fail, max_concurrency=1)
+        run.assert_status('CAUGHT_ERROR').assert_next_state('ValidationFailed')
+        assert run.error == 'States.ExceedToleratedFailureThreshold'
+        assert [failure.index for failure in run.failures] == [0, 1, 2]
+        assert run.started == 3
+        assert run.output['error']['Cause'] == '3 of 3 items failed; 2 tolerated'
+
+    def test_tolerated_percentage_without_a_known_length_is_checked_at_the_end(self, state_machine_definition):
+        definition = thaw(state_machine_definition)
+        state = definition['States']['ProcessOrderItems']
+        del state['ToleratedFailureCount']
+        state['ToleratedFailurePercentage'] = 10
+        failing = {'ProcessItem': {'errorOutput': {'error': 'Lambda.ServiceException', 'cause': 'down'}}}
+
+        def one_in(every):
+            return lambda index, item: failing if index % every == 0 else _processed(index, item)
+
+        simulator = MapSimulator(definition)
+        items = ({'itemId': f'item-{index}'} for index in range(100))
+        assert simulator.run({}, one_in(10), items=items).status == 'SUCCEEDED'
+        items = ({'itemId': f'item-{index}'} for index in range(100))
+        run = simulator.run({}, one_in(5), items=items)
+        assert (run.error, run.started, run.failed) == ('States.ExceedToleratedFailureThreshold', 100, 20)
+
+    def test_streams_100k_items_to_a_sink_without_keeping_results(self, state_machine_definition):
+        received = []
+        items = ({'itemId': f'item-{index}'} for index in range(100000))
+        run = MapSimulator(state_machine_definition).run(
+            {'orderId': 'order-large'}, {'ProcessItem': {'result': {'processed': True}}}, items=items,
+            keep_results=False, sink=lambda index, output: received.append(index)
+        )
+        assert (run.status, run.succeeded, run.results) == ('SUCCEEDED', 100000, None)
+        assert received == list(range(100000))
+        assert run.output['processedItems'] == []
+
+    def test_item_selector_failures_count_against_the_threshold(self, state_machine_definition):
+        definition = thaw(state_machine_definition)
+        definition['States']['ProcessOrderItems']['ItemSelector'] = (
+            "{% {'itemId': $uppercase($states.context.Map.Item.Value.itemId)} %}"
+        )
+        simulator = MapSimulator(definition)
+        items = [{'itemId': 'a'}, {'itemId': 1}, {'itemId': 'b'}, {'itemId': 2}]
+        run = simulator.run({}, _processed, items=items)
+        assert (run.status, run.failed) == ('SUCCEEDED', 2)
+        assert {failure.error for failure in run.failures} == {'States.QueryEvaluationError'}
+        run = simulator.run({}, _processed, items=items + [{'itemId': 3}])
+        assert run.error == 'States.ExceedToleratedFailureThreshold'
+
+    def test_failure_without_kept_failures_still_fails_the_map(self, state_machine_definition):
+        definition = thaw(state_machine_definition)
+        state = definition['States']['ProcessOrderItems']
+        del state['ToleratedFailureCount']
+        state['ItemProcessor']['ProcessorConfig'] = {'Mode': 'INLINE'}
+        failing = {'ProcessItem': {'errorOutput': {'error': 'Lambda.ServiceException', 'cause': 'down'}}}
+        run = MapSimulator(definition, max_failures_kept=0).run(_order(3), failing)
+        assert run.failed >= 1 and run.failures == []
+        assert run.error == 'ItemProcessingError'
+
+    def test_non_map_state_is_rejected(self, state_machine_definition):
+        with pytest.raises(LocalTestStateError, match='not a Map state'):
+            MapSimulator(state_machine_definition, 'ValidateOrder')
+
+
+class TestItemReaderAndResultWriter:
+    """Tests for streaming items from files and writing results incrementally."""
+
+    def test_jsonl_items_stream_to_a_jsonl_result_file(self, state_machine_definition, tmp_path):
+        source = tmp_path / 'items.jsonl'
+        source.write_text(''.join(json.dumps({'itemId': f'item-{index}'}) + '\n' for index in range(5000)))
+        target = tmp_path / 'results.jsonl'
+        with JsonLinesWriter(str(target)) as writer:
+            run = MapSimulator(state_machine_definition).run(
+                {'orderId': 'order-file'}, _processed, items=JsonLinesReader(str(source)),
+                keep_results=False, sink=writer
+            )
+        run.assert_status('SUCCEEDED')
+        lines = target.read_text().splitlines()
+        assert len(lines) == writer.written == 5000
+        assert json.loads(lines[4999]) == {'itemId': 'item-4999', 'processed': True}
+        # Workers never run further ahead of the oldest unfinished item than the read-ahead window
+        assert run.max_buffered <= 10 * 4
+
+    def test_csv_rows_become_objects(self, tmp_path):
+        source = tmp_path / 'items.csv'
+        source.write_text('itemId,quantity\nitem-1,2\nitem-2,1\n')
+        assert list(CsvReader(str(source))) == [{'itemId': 'item-1', 'quantity': '2'}, {'itemId': 'item-2', 'quantity': '1'}]
+        reader = item_reader(str(source), {'InputType': 'CSV', 'CSVHeaderLocation': 'GIVEN',
+                                           'CSVHeaders': ['a', 'b'], 'MaxItems': 1})
+        assert list(reader) == [{'a': 'itemId', 'b': 'quantity'}]
+
+    def test_reader_failure_is_retried_then_caught(self, state_machine_definition, tmp_path):
+        source = tmp_path / 'items.jsonl'
+        source.write_text('{"itemId": "item-1"}\n{"itemId": \n')
+        simulator = MapSimulator(state_machine_definition)
+        run = simulator.run({'orderId': 'order-bad'}, _processed, items=JsonLinesReader(str(source)))
+        assert (run.status, run.error) == ('RETRIABLE', 'States.ItemReaderFailed')
+        assert run.to_response()['inspectionData']['errorDetails']['retryBackoffIntervalSeconds'] == 2
+        run = simulator.run({'orderId': 'order-bad'}, _processed, items=JsonLinesReader(str(source)),
+                            state_config={'retrierRetryCount': 2})
+        run.assert_status('CAUGHT_ERROR').assert_next_state('ValidationFailed')
+        assert 'items.jsonl:2' in run.output['error']['Cause']
+
+    def test_missing_file_is_a_reader_failure(self, state_machine_definition, tmp_path):
+        run = MapSimulator(state_machine_definition).run(
+            {}, _processed, items=JsonLinesReader(str(tmp_path / 'missing.jsonl'))
+        )
+        assert (run.status, run.error, run.started) == ('RETRIABLE', 'States.ItemReaderFailed', 0)
+
+    def test_writer_failure_is_retried(self, state_machine_definition, tmp_path):
+        writer = JsonLinesWriter(str(tmp_path))
+        run = MapSimulator(state_machine_definition).run(_order(20), _processed, keep_results=False, sink=writer)
+        assert (run.status, run.error) == ('RETRIABLE', 'States.ResultWriterFailed')
+        assert run.to_response()['inspectionData']['errorDetails']['retryPolicyHandledError'] == 0
+
+
+def _processed_batch(index, batch):
+    return {'ProcessItem': {'result': {'batch': index, 'processed': [item['itemId'] for item in batch['Items']]}}}
+
+
+class TestItemBatcher:
+    """Tests for batching items per ItemProcessor execution."""
+
+    def test_batches_are_cut_at_max_items(self):
+        batches = list(ItemBatcher(max_items_per_batch=3).batches(range(7)))
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_batches_stay_within_max_input_bytes(self):
+        batcher = ItemBatcher(max_input_bytes_per_batch=100, batch_input={'orderId': 'order-1'})
+        items = [{'itemId': f'item-{index}', 'sku': 'x' * index} for index in range(30)]
+        batches = list(batcher.batches(items))
+        assert [item for batch in batches for item in batch] == items
+        for batch in batches:
+            size = len(json.dumps(batcher.batch_input(batch), separators=(',', ':')))
+            assert size <= 100
+        # Adding the next batch's first item would have crossed the limit
+        for batch, following in zip(batches, batches[1:]):
+            assert len(json.dumps(batcher.batch_input(batch + following[:1]), separators=(',', ':'))) > 100
+
+    def test_an_item_larger_than_a_batch_is_a_reader_failure(self):
+        with pytest.raises(StateError, match='does not fit'):
+            list(ItemBatcher(max_input_bytes_per_batch=20).batches([{'itemId': 'x' * 50}]))
+
+    def test_batcher_needs_a_limit(self):
+        with pytest.raises(ValueError):
+            ItemBatcher()
+
+    def test_each_execution_receives_a_batch(self, state_machine_definition):
+        received = []
+
+        def mocks(index, batch):
+            received.append(batch)
+            return _processed_batch(index, batch)
+
+        run = MapSimulator(state_machine_definition).run(
+            _order(25), mocks, item_batcher=ItemBatcher(10, batch_input={'orderId': 'order-map'})
+        )
+        run.assert_status('SUCCEEDED').assert_next_state('ParallelProcessing')
+        assert (run.started, run.items) == (3, 25)
+        assert [result['batch'] for result in run.output['processedItems']] == [0, 1, 2]
+        assert run.output['processedItems'][2]['processed'] == [f'item-{i}' for i in range(20, 25)]
+        assert all(batch['orderId'] == 'order-map' for batch in received)
+
+    def test_item_batcher_from_the_definition(self, state_machine_definition):
+        definition = thaw(state_machine_definition)
+        definition['States']['ProcessOrderItems']['ItemBatcher'] = {
+            'MaxItemsPerBatch': '{% $count($states.input.orderItems) > 100 ? 50 : 4 %}',
+            'BatchInput': {'orderId': '{% $states.input.orderId %}'}
+        }
+        run = MapSimulator(definition).run(_order(10), _processed_batch)
+        assert (run.status, run.started, run.items) == ('SUCCEEDED', 3, 10)
+
+    def test_failed_batches_count_every_item_against_the_threshold(self, state_machine_definition):
+        def second_batch_fails(index, batch):
+            if index == 1:
+                return {'ProcessItem': {'errorOutput': {'error': 'Lambda.ServiceException', 'cause': 'down'}}}
+            return _processed_batch(index, batch)
+
+        run = MapSimulator(state_machine_definition).run(
+            _order(20), second_batch_fails, item_batcher=ItemBatcher(5), max_concurrency=1
+        )
+        # One failed batch of five items exceeds ToleratedFailureCount 2
+        run.assert_status('CAUGHT_ERROR').assert_next_state('ValidationFailed')
+        assert (run.failed, run.failed_items, run.started) == (1, 5, 2)
+        assert run.output['error']['Cause'] == '5 of 10 items failed; 2 tolerated'
+
+    def test_item_selector_failures_fail_their_batch(self, state_machine_definition):
+        definition = thaw(state_machine_definition)
+        definition['States']['ProcessOrderItems']['ItemSelector'] = (
+            "{% {'itemId': $uppercase($states.context.Map.Item.Value.itemId)} %}"
+        )
+        received = []
+
+        def mocks(index, batch):
+            received.append(batch['Items'])
+            return _processed_batch(index, batch)
+
+        items = [{'itemId': 'a'}, {'itemId': 'b'}, {'itemId': 1}, {'itemId': 'c'}]
+        run = MapSimulator(definition).run({}, mocks, items=items, item_batcher=ItemBatcher(2), max_concurrency=1)
+        # The failed batch's two items are within ToleratedFailureCount 2
+        assert (run.status, run.failed, run.failed_items) == ('SUCCEEDED', 1, 2)
+        assert [(failure.index, failure.error) for failure in run.failures] == [(1, 'States.QueryEvaluationError')]
+        assert received == [[{'itemId': 'A'}, {'itemId': 'B'}]]
+
+    def test_runner_sends_a_batch_to_the_item_processor(self, state_machine_definition):
+        runner = StepFunctionTestRunner(LocalTestStateClient(), state_machine_definition)
+        (runner
+         .with_item_batch([{'itemId': 'i-1'}, {'itemId': 'i-2'}], batch_input={'orderId': 'o-1'})
+         .with_mock_result({'processed': 2})
+         .execute('ProcessItem')
+         .assert_succeeded()
+         .assert_after_arguments({'FunctionName': 'ProcessItemFunction',
+                                  'Payload': {'orderId': 'o-1', 'Items': [{'itemId': 'i-1'}, {'itemId': 'i-2'}]}}))
@@ -0,0 +1,28 @@
+"""
+Shared order processing scenarios: the workflow input, mocks for every Task
+state on the happy path, and the states that path visits.
+"""
+
+ORDER_INPUT = {
+    "orderId": "order-12345",
+    "amount": 150.75,
+    "customerEmail": "customer@example.com",
+    "orderItems": [
+        {"itemId": "item-1", "quantity": 2, "price": 50.25},
+        {"itemId": "item-2", "quantity": 1, "price": 50.25}
+    ]
+}
+
+HAPPY_PATH_MOCKS = {
+    "ValidateOrder": {"result": {"statusCode": 200, "isValid": True}},
+    "ProcessOrderItems": {"result": [{"itemId": "item-1", "processed": True}, {"itemId": "item-2", "processed": True}]},
+    "ParallelProcessing": {"result": [{"paymentId": "pay-12345"}, {"inventoryUpdated": True}]},
+    "WaitForApproval": {"result": {"approved": True}},
+    "SaveOrderDetails": {"result": {"Attributes": {}}},
+    "SendNotification": {"result": {"messageId": "msg-12345", "sent": True}}
+}
+
+HAPPY_PATH = [
+    "ValidateOrder", "CheckValidation", "ProcessOrderItems", "ParallelProcessing",
+    "WaitForApproval", "CheckApproval", "SaveOrderDetails", "SendNotification", "OrderProcessed"
+]
@@ -0,0 +1,90 @@
+"""
+Tests for the local Parallel state simulator.
+"""
+
+import time
+
+import pytest
+
+from sfn_testing import LocalTestStateError, ParallelSimulator
+
+ORDER = {'orderId': 'order-parallel', 'amount': 200.0}
+PAYMENT_OK = {'result': {'paymentId': 'pay-1', 'status': 'completed'}}
+INVENTORY_OK = {'result': {'inventoryUpdated': True}}
+DECLINED = {'errorOutput': {'error': 'Payment.Declined', 'cause': 'card declined'}}
+
+
+class TestParallelSimulator:
+    """Tests for concurrent branches, fail-fast cancellation and the Parallel Retry/Catch."""
+
+    def test_branch_outputs_feed_the_parallel_output_in_branch_order(self, state_machine_definition):
+        run = ParallelSimulator(state_machine_definition).run(
+            ORDER, {'ProcessPayment': PAYMENT_OK, 'UpdateInventory': INVENTORY_OK}
+        )
+        run.assert_status('SUCCEEDED').assert_next_state('WaitForApproval')
+        assert run.output['parallelResults'] == [PAYMENT_OK['result'], INVENTORY_OK['result']]
+        assert [branch.execution.path for branch in run.branches] == [['ProcessPayment'], ['UpdateInventory']]
+
+    def test_branches_run_concurrently(self, state_machine_definition):
+        run = ParallelSimulator(state_machine_definition).run(
+            ORDER, {'ProcessPayment': PAYMENT_OK, 'UpdateInventory': INVENTORY_OK},
+            latencies={'ProcessPayment': 0.2, 'UpdateInventory': 0.2}
+        )
+        assert run.status == 'SUCCEEDED'
+        assert all(branch.duration >= 0.2 for branch in run.branches)
+        # Each branch starts before the other one finishes
+        assert max(branch.started for branch in run.branches) < min(branch.finished for branch in run.branches)
+
+    def test_failed_branch_cancels_its_sibling(self, state_machine_definition):
+        started = time.perf_counter()
+        run = ParallelSimulator(state_machine_definition).run(
+            ORDER, {'ProcessPayment': DECLINED, 'UpdateInventory': INVENTORY_OK},
+            latencies={'UpdateInventory': 30}
+        )
+        assert time.perf_counter() - started < 5
+        attempt = run.attempts[0]
+        assert attempt.failed_branch.execution.path == ['ProcessPayment', 'PaymentFailed']
+        assert [branch.status for branch in attempt.branches] == ['FAILED', 'CANCELLED']
+
+    def test_branch_failure_is_retried_then_caught(self, state_machine_definition):
+        run = ParallelSimulator(state_machine_definition).run(
+            ORDER, {'ProcessPayment': PAYMENT_OK, 'UpdateInventory': DECLINED}
+        )
+        run.assert_status('CAUGHT_ERROR').assert_next_state('OrderRejected')
+        assert [attempt.state_result.status for attempt in run.attempts] == ['RETRIABLE', 'RETRIABLE', 'CAUGHT_ERROR']
+        assert [attempt.state_result.inspection['errorDetails'].get('retryBackoffIntervalSeconds')
+                for attempt in run.attempts] == [2, 4, None]
+        assert run.output['error'] == {
+            'Error': 'States.BranchFailed',
+            'Cause': 'Branch 1 failed with InventoryUpdateError: Failed to update inventory'
+        }
+
+    def test_a_retried_attempt_can_succeed(self, state_machine_definition):
+        def mocks(attempt):
+            return {'ProcessPayment': DECLINED if attempt == 0 else PAYMENT_OK, 'UpdateInventory': INVENTORY_OK}
+
+        run = ParallelSimulator(state_machine_definition).run(ORDER, mocks)
+        run.assert_status('SUCCEEDED').assert_next_state('WaitForApproval')
+        assert len(run.attempts) == 2
+
+    def test_branch_error_can_be_propagated_unchanged(self, state_machine_definition):
+        run = ParallelSimulator(state_machine_definition, branch_error=None).run(
+            ORDER, {'ProcessPayment': DECLINED, 'UpdateInventory': INVENTORY_OK}
+        )
+        # PaymentProcessingError is not in the Retry, so the Catch takes it on the first attempt
+        assert (run.status, run.error, len(run.attempts)) == ('CAUGHT_ERROR', 'PaymentProcessingError', 1)
+
+    def test_trace_has_branch_timing_per_attempt(self, state_machine_definition):
+        run = ParallelSimulator(state_machine_definition).run(
+            ORDER, {'ProcessPayment': DECLINED, 'UpdateInventory': INVENTORY_OK}, latencies={'UpdateInventory': 30}
+        )
+        trace = run.trace()
+        assert [(entry['attempt'], entry['branch'], entry['status']) for entry in trace] == [
+            (attempt, branch, status) for attempt in range(3) for branch, status in ((0, 'FAILED'), (1, 'CANCELLED'))
+        ]
+        assert all(entry['durationMs'] >= 0 and entry['startMs'] >= 0 for entry in trace)
+        assert trace[-1]['attemptStatus'] == 'CAUGHT_ERROR'
+
+    def test_non_parallel_state_is_rejected(self, state_machine_definition):
+        with pytest.raises(LocalTestStateError, match='not a Parallel state'):
+            ParallelSimulator(state_machine_definition, 'ProcessOrderItems')
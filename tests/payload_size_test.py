@@ -0,0 +1,112 @@
+"""
+Tests for payload size accounting and the 256 KB limit check.
+"""
+
+import json
+
+import pytest
+
+from conftest import StepFunctionTestRunner
+from order_scenarios import HAPPY_PATH, HAPPY_PATH_MOCKS, ORDER_INPUT
+from sfn_testing import LocalTestStateClient, LocalWorkflowExecutor
+from sfn_testing.jsonata import evaluate
+from sfn_testing.payload_size import (
+    DATA_LIMIT_EXCEEDED, PAYLOAD_LIMIT_BYTES, PayloadReport, find_item_limit, measure, measure_serialized,
+    payload_bytes, scale_order_items
+)
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+def _mocks_for(order):
+    processed = [{'itemId': item['itemId'], 'processed': True} for item in order['orderItems']]
+    return dict(HAPPY_PATH_MOCKS, ProcessOrderItems={'result': processed})
+
+
+class TestPayloadSize:
+    """Tests for measuring serialized payloads and their largest keys."""
+
+    def test_bytes_match_compact_serialization(self):
+        value = {'orderId': 'order-é', 'items': [{'a': 1.5}, None, True], 'nested': {'x': 'y'}}
+        assert payload_bytes(value) == len(json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode())
+        merged = evaluate("$merge([$states.input, {'extra': [1, 2, 3]}])", {'states': {'input': value}})
+        assert payload_bytes(merged) == payload_bytes(dict(value, extra=[1, 2, 3]))
+
+    def test_largest_keys_come_from_the_largest_payload(self):
+        order = scale_order_items(ORDER_INPUT, 50)
+        size = measure('ProcessOrderItems', order, [{'itemId': 'i'}], dict(order, processedItems=[{'processed': True}] * 30))
+        assert size.max_bytes == size.output_bytes > size.input_bytes > size.result_bytes
+        assert [key for key, _ in size.largest_keys(2)] == ['orderItems', 'processedItems']
+
+    def test_serialized_texts_are_only_parsed_over_the_limit(self):
+        text = json.dumps(scale_order_items(ORDER_INPUT, 20))
+        size = measure_serialized('ValidateOrder', text, '{"isValid": true}', limit=len(text))
+        assert (size.input_bytes, size.result_bytes, size.output_bytes) == (len(text), 17, 0)
+        assert size.key_sizes == {}
+        over = measure_serialized('ValidateOrder', text, '{"isValid": true}', limit=len(text) - 1)
+        assert over.largest_keys(1)[0][0] == 'orderItems'
+
+    def test_scaled_orders_repeat_item_templates_with_unique_ids(self):
+        order = scale_order_items(ORDER_INPUT, 5)
+        assert [item['itemId'] for item in order['orderItems']] == [f'item-{index}' for index in range(1, 6)]
+        assert order['orderItems'][2]['quantity'] == ORDER_INPUT['orderItems'][0]['quantity']
+        assert len(ORDER_INPUT['orderItems']) == 2
+
+
+class TestPayloadLimit:
+    """Tests for failing fast when a state's payload passes the limit."""
+
+    def test_every_step_is_measured(self, workflow_executor):
+        execution = workflow_executor.run(ORDER_INPUT, HAPPY_PATH_MOCKS).assert_succeeded()
+        assert [size.state_name for size in execution.payload.sizes] == HAPPY_PATH
+        assert execution.payload.limit == PAYLOAD_LIMIT_BYTES
+        assert execution.payload.peak.state_name == 'SendNotification'
+        assert 'orderItems (' in execution.payload.to_table()
+
+    def test_run_stops_at_the_first_state_over_the_limit(self, state_machine_definition):
+        order = scale_order_items(ORDER_INPUT, 400)
+        execution = LocalWorkflowExecutor(state_machine_definition, payload_limit=32 * 1024).run(
+            order, _mocks_for(order)
+        )
+        execution.assert_failed(DATA_LIMIT_EXCEEDED)
+        # The items alone fit; with processedItems merged in the Map output passes the limit
+        assert execution.path == ['ValidateOrder', 'CheckValidation', 'ProcessOrderItems']
+        assert 'State ProcessOrderItems has a payload of' in execution.cause
+        assert 'largest keys: orderItems' in execution.cause
+        assert execution.payload.exceeded == execution.payload.sizes[-1:]
+
+    def test_finds_the_exact_item_count_that_hits_the_limit(self, state_machine_definition):
+        limit = 16 * 1024
+        executor = LocalWorkflowExecutor(state_machine_definition, payload_limit=limit)
+        calls = []
+
+        def exceeds(count):
+            calls.append(count)
+            order = scale_order_items(ORDER_INPUT, count)
+            return executor.run(order, _mocks_for(order)).error == DATA_LIMIT_EXCEEDED
+
+        count = find_item_limit(exceeds)
+        assert exceeds(count) and not exceeds(count - 1)
+        assert len(calls) < 40
+        peak = LocalWorkflowExecutor(state_machine_definition).run(
+            scale_order_items(ORDER_INPUT, count - 1), _mocks_for(scale_order_items(ORDER_INPUT, count - 1))
+        )
+        assert peak.status == 'SUCCEEDED'
+
+    def test_limit_that_is_never_hit(self):
+        assert find_item_limit(lambda count: False, max_count=64) is None
+        assert find_item_limit(lambda count: count >= 1) == 1
+
+    def test_runner_fails_fast_on_oversized_input(self, state_machine_definition):
+        client = LocalTestStateClient()
+        runner = StepFunctionTestRunner(client, state_machine_definition).with_payload_limit(1024)
+        runner.with_input(scale_order_items(ORDER_INPUT, 100)).with_mock_result({'isValid': True})
+        with pytest.raises(AssertionError, match='State ValidateOrder has a payload of .* largest keys: orderItems'):
+            runner.execute('ValidateOrder')
+        assert runner.response is None
+
+    def test_runner_records_the_payload_size(self, runner):
+        runner.with_input(ORDER_INPUT).with_mock_result({'isValid': True}).execute('ValidateOrder').assert_succeeded()
+        assert runner.payload_size.output_bytes > runner.payload_size.input_bytes
+        assert PayloadReport([runner.payload_size]).peak is runner.payload_size
@@ -0,0 +1,155 @@
+"""
+Tests for the local Retry/Catch simulator.
+"""
+
+import pytest
+
+from conftest import StepFunctionTestHelper, StepFunctionTestRunner
+from sfn_testing import LocalTestStateClient
+from sfn_testing import Retrier, RetrySimulator
+from sfn_testing.emulator import iter_states
+from sfn_testing.retry_sweep import plan_retry_sweep
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+class TestRetrier:
+    """Tests for Retrier decisions on hand-written policies."""
+
+    def test_backoff_grows_until_max_attempts_then_catches(self):
+        retrier = Retrier({
+            'Retry': [{'ErrorEquals': ['Lambda.TooManyRequestsException'], 'IntervalSeconds': 2,
+                       'MaxAttempts': 3, 'BackoffRate': 2}],
+            'Catch': [{'ErrorEquals': ['States.ALL'], 'Next': 'Failed'}]
+        })
+        schedule = retrier.schedule('Lambda.TooManyRequestsException')
+        assert [decision.status for decision in schedule] == ['RETRIABLE'] * 3 + ['CAUGHT_ERROR']
+        assert [decision.backoff_seconds for decision in schedule[:3]] == [2, 4, 8]
+        assert schedule[-1].error_details() == {'catchIndex': 0, 'catchPolicyHandledError': 0}
+        assert schedule[-1].next_state == 'Failed'
+
+    def test_max_delay_caps_backoff_and_full_jitter_is_flagged(self):
+        retrier = Retrier({'Retry': [{'ErrorEquals': ['States.ALL'], 'IntervalSeconds': 3, 'BackoffRate': 3,
+                                      'MaxAttempts': 5, 'MaxDelaySeconds': 20, 'JitterStrategy': 'FULL'}]})
+        decisions = retrier.schedule('States.Timeout')
+        assert [decision.error_details()['retryBackoffIntervalSeconds'] for decision in decisions[:5]] == [
+            3, 9, 20, 20, 20
+        ]
+        assert all(decision.jittered for decision in decisions[:5])
+        assert decisions[-1].status == 'FAILED' and decisions[-1].error_details() == {}
+
+    def test_first_matching_retrier_decides_even_when_exhausted(self):
+        retrier = Retrier({
+            'Retry': [
+                {'ErrorEquals': ['Custom.Error'], 'MaxAttempts': 1},
+                {'ErrorEquals': ['States.ALL'], 'MaxAttempts': 5}
+            ],
+            'Catch': [{'ErrorEquals': ['Other.Error'], 'Next': 'A'}, {'ErrorEquals': ['States.TaskFailed'], 'Next': 'B'}]
+        })
+        assert retrier.decide('Custom.Error', 0).retry_policy_handled_error == 0
+        decision = retrier.decide('Custom.Error', 1)
+        assert (decision.status, decision.catch_policy_handled_error, decision.next_state) == ('CAUGHT_ERROR', 1, 'B')
+        assert retrier.decide('Another.Error', 4).retry_policy_handled_error == 1
+        assert retrier.decide('States.Timeout', 5).status == 'FAILED'
+
+    def test_max_attempts_zero_never_retries(self):
+        retrier = Retrier({'Retry': [{'ErrorEquals': ['States.ALL'], 'MaxAttempts': 0}]})
+        assert retrier.decide('States.ALL').status == 'FAILED'
+
+
+class TestRetrySimulator:
+    """Tests that simulated decisions match the TestState responses for the order definition."""
+
+    ERRORS = ['Lambda.TooManyRequestsException', 'States.BranchFailed', 'States.ItemReaderFailed',
+              'States.Timeout', 'PaymentFailed']
+
+    def test_matches_test_state_for_every_task_error_and_attempt(self, sfn_client, state_machine_definition):
+        simulator = RetrySimulator(state_machine_definition)
+        runner = StepFunctionTestRunner(sfn_client, state_machine_definition)
+        checked = 0
+        for state_name, state in iter_states(state_machine_definition):
+            if state['Type'] != 'Task':
+                continue
+            for error in self.ERRORS:
+                for retry_count in range(5):
+                    decision = simulator.decide(state_name, error, retry_count)
+                    response = (runner
+                                .with_input({'orderId': 'o-1'})
+                                .with_mock_error({'Error': error, 'Cause': 'simulated'})
+                                .with_retrier_retry_count(retry_count)
+                                .execute(state_name)
+                                .get_response())
+                    assert response['status'] == decision.status, (state_name, error, retry_count)
+                    assert response.get('nextState') == decision.next_state
+                    assert response['inspectionData'].get('errorDetails', {}) == decision.error_details()
+                    checked += 1
+        assert checked > 0
+
+    def test_helper_simulates_retry_mechanism(self, sfn_test_helper):
+        decision = sfn_test_helper.simulate_retry_mechanism('ValidateOrder', retry_count=1)
+        assert decision.status == 'RETRIABLE'
+        assert decision.error_details()['retryBackoffIntervalSeconds'] == 4
+
+        decision = sfn_test_helper.simulate_retry_mechanism('ValidateOrder', retry_count=3)
+        assert (decision.status, decision.next_state) == ('CAUGHT_ERROR', 'ValidationFailed')
+
+        response = sfn_test_helper.test_retry_mechanism('ValidateOrder', input_data={'orderId': 'o-1'}, retry_count=1)
+        assert response['inspectionData']['errorDetails'] == (
+            sfn_test_helper.simulate_retry_mechanism('ValidateOrder', retry_count=1).error_details()
+        )
+
+    def test_unknown_state_is_rejected(self, state_machine_definition):
+        with pytest.raises(ValueError):
+            RetrySimulator(state_machine_definition).decide('DoesNotExist', 'States.ALL')
+
+
+class _SlowBackoffClient(LocalTestStateClient):
+    """Local client that reports a backoff one second too long for SaveOrderDetails."""
+
+    def test_state(self, **params):
+        response = super().test_state(**params)
+        error_details = response['inspectionData'].get('errorDetails', {})
+        if params['stateName'] == 'SaveOrderDetails' and 'retryBackoffIntervalSeconds' in error_details:
+            error_details['retryBackoffIntervalSeconds'] += 1
+        return response
+
+
+class TestRetrySweep:
+    """Tests for the retry-schedule sweep over every Task state."""
+
+    def test_identical_policies_are_planned_once(self, state_machine_definition):
+        cells = plan_retry_sweep(state_machine_definition)
+        assert {cell.state_name for cell in cells} == {'ValidateOrder', 'SaveOrderDetails'}
+        lambda_cells = [cell for cell in cells if cell.state_name == 'ValidateOrder']
+        assert lambda_cells[0].shared_with == [
+            'ProcessItem', 'ProcessPayment', 'UpdateInventory', 'WaitForApproval', 'SendNotification'
+        ]
+        # 3 listed errors plus one unlisted, each at retrierRetryCount 0..3
+        assert len(lambda_cells) == 16
+
+    def test_explicit_states_errors_and_attempts(self, state_machine_definition):
+        cells = plan_retry_sweep(state_machine_definition, state_names=['SendNotification'],
+                                 errors=['Lambda.TooManyRequestsException'], max_retry_count=5)
+        assert [cell.expected.status for cell in cells] == ['RETRIABLE'] * 3 + ['CAUGHT_ERROR'] * 3
+        assert cells[-1].expected.next_state == 'OrderProcessed'
+
+    def test_sweep_reports_wrong_backoff(self, state_machine_definition):
+        helper = StepFunctionTestHelper(_SlowBackoffClient(), state_machine_definition)
+        sweep = helper.sweep_retry_mechanisms(max_workers=4)
+        failed = {(cell.state_name, cell.error, cell.retry_count) for cell in sweep.failures}
+        assert failed == {
+            ('SaveOrderDetails', error, retry_count)
+            for error in ('DynamoDB.ProvisionedThroughputExceededException', 'DynamoDB.ThrottlingException')
+            for retry_count in range(3)
+        }
+        table = sweep.to_table()
+        assert 'RETRIABLE 2s  RETRIABLE 3s  FAIL' in table
+        assert 'ValidateOrder (+5)' in table
+        with pytest.raises(AssertionError, match='6 retry sweep cells failed'):
+            sweep.assert_all_passed()
+
+    def test_sweep_warns_against_the_local_emulator(self, sfn_test_helper):
+        with pytest.warns(UserWarning, match="compares the local emulator's Retrier with itself"):
+            sweep = sfn_test_helper.sweep_retry_mechanisms(state_names=['SendNotification'], max_workers=2)
+        sweep.assert_all_passed()
@@ -0,0 +1,481 @@
+"""
+Tests for StepFunctionTestRunner and StepFunctionTestHelper infrastructure
+(batch execution and request handling), run against the local emulator.
+"""
+
+import copy
+import pytest
+import json
+import threading
+import time
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+from conftest import StepFunctionTestHelper, StepFunctionTestRunner
+from sfn_testing import LocalTestStateClient
+from sfn_testing.definitions import minimal_definition, thaw
+from sfn_testing.cassette import Cassette, CassetteClient, CassetteMissError, merge_shards, shard_path
+from sfn_testing.request_keys import request_key
+from sfn_testing.response_cache import CachingClient, ResponseCache
+from sfn_testing.scheduling import DurationRecorder, order_slowest_first
+from sfn_testing.rate_limit import AIMDController, RateLimitedClient, TokenBucket
+from sfn_testing.timing import TimingClient, TimingRecorder, percentile
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+class CountingClient(LocalTestStateClient):
+    """Local client that records the test_state calls reaching it."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.definitions = []
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def test_state(self, **params):
+        # execute_batch calls this from several worker threads
+        with self._lock:
+            self.calls += 1
+            self.definitions.append(params['definition'])
+            self.threads.add(threading.get_ident())
+        return super().test_state(**params)
+
+
+class TestBatchExecution:
+    """Tests for running independent TestState calls concurrently."""
+
+    def test_results_come_back_in_spec_order(self, runner):
+        specs = [
+            {"state_name": "CheckApproval", "input_data": {"approvalResult": {"approved": index % 2 == 0}}}
+            for index in range(20)
+        ]
+        results = runner.execute_batch(specs, max_workers=4)
+        assert len(results) == 20
+        for index, result in enumerate(results):
+            (result
+             .assert_succeeded()
+             .assert_next_state("SaveOrderDetails" if index % 2 == 0 else "OrderRejected"))
+
+    def test_specs_support_mocks_errors_and_state_configuration(self, runner):
+        throttling_error = {"Error": "Lambda.TooManyRequestsException", "Cause": "Request rate exceeded"}
+        results = runner.execute_batch([
+            {"state_name": "ValidateOrder", "input_data": {"orderId": "o-1"}, "mock_result": {"isValid": True}},
+            {"state_name": "ValidateOrder", "input_data": {"orderId": "o-2"}, "mock_error": throttling_error,
+             "state_config": {"retrierRetryCount": 1}},
+            {"state_name": "ValidateOrder", "input_data": {"orderId": "o-3"}, "mock_error": throttling_error,
+             "state_config": {"retrierRetryCount": 3}},
+            {"state_name": "WaitForApproval", "input_data": {"orderId": "o-4", "amount": 1},
+             "mock_result": {"approved": True}, "context": {"Task": {"Token": "token-4"}}}
+        ])
+        results[0].assert_succeeded().assert_next_state("CheckValidation")
+        results[1].assert_retriable().assert_retry_backoff_interval_seconds(4)
+        results[2].assert_caught_error().assert_next_state("ValidationFailed")
+        results[3].assert_succeeded().assert_after_arguments(
+            {"FunctionName": "RequestApprovalFunction",
+             "Payload": {"orderId": "o-4", "amount": 1, "taskToken": "token-4"}})
+
+    def test_batch_shares_one_client_across_a_bounded_pool(self, state_machine_definition):
+        client = CountingClient()
+        runner = StepFunctionTestRunner(client, state_machine_definition)
+        results = runner.execute_batch([{"state_name": "OrderProcessed", "input_data": {"orderId": "o"}}] * 30,
+                                       max_workers=3)
+        assert all(result.sfn_client is client for result in results)
+        assert client.calls == 30
+        assert len(client.threads) <= 3
+
+    def test_batch_does_not_touch_the_calling_runner(self, runner):
+        runner.with_input({"orderId": "original"})
+        runner.execute_batch([{"state_name": "OrderProcessed", "input_data": {"orderId": "other"}}])
+        assert runner.input_data == {"orderId": "original"}
+        assert runner.response is None
+
+
+class TestCassette:
+    """Tests for recording TestState responses and replaying them without the API."""
+
+    def test_request_key_ignores_json_formatting(self, state_machine_definition):
+        definition = json.dumps(state_machine_definition)
+        first = request_key({'definition': definition, 'stateName': 'CheckApproval',
+                             'input': '{"a": 1, "b": {"c": true}}'})
+        second = request_key({'definition': definition, 'stateName': 'CheckApproval',
+                              'input': '{"b":{"c":true},"a":1}'})
+        third = request_key({'definition': definition, 'stateName': 'CheckApproval',
+                             'input': '{"a": 2, "b": {"c": true}}'})
+        assert first == second
+        assert first != third
+
+    def test_record_then_replay_from_disk(self, tmp_path, state_machine_definition):
+        path = str(tmp_path / 'cassette.jsonl')
+        live_client = CountingClient()
+        recorder = CassetteClient(live_client, Cassette(path), mode='record')
+        (StepFunctionTestRunner(recorder, state_machine_definition)
+         .with_input({'orderId': 'o-1'})
+         .with_mock_result({'isValid': True})
+         .execute('ValidateOrder')
+         .assert_succeeded())
+        StepFunctionTestHelper(recorder, state_machine_definition).test_choice_state(
+            'CheckValidation', input_data={'validationResult': {'isValid': True}},
+            expected_next_state='ProcessOrderItems')
+        recorder.cassette.save()
+        assert live_client.calls == 2
+
+        offline_client = CountingClient()
+        replayer = CassetteClient(offline_client, Cassette(path), mode='replay_only')
+        (StepFunctionTestRunner(replayer, state_machine_definition)
+         .with_input({'orderId': 'o-1'})
+         .with_mock_result({'isValid': True})
+         .execute('ValidateOrder')
+         .assert_succeeded()
+         .assert_next_state('CheckValidation'))
+        assert offline_client.calls == 0
+        assert replayer.hits == 1
+
+    def test_replay_falls_through_only_for_changed_requests(self, tmp_path, state_machine_definition):
+        client = CountingClient()
+        cassette_client = CassetteClient(client, Cassette(str(tmp_path / 'c.jsonl')), mode='replay')
+        runner = StepFunctionTestRunner(cassette_client, state_machine_definition)
+        for approved in (True, True, False, True):
+            runner.with_input({'approvalResult': {'approved': approved}}).execute('CheckApproval')
+        assert client.calls == 2
+        assert (cassette_client.hits, cassette_client.misses) == (2, 2)
+
+    def test_replayed_responses_are_isolated_copies(self, tmp_path):
+        cassette = Cassette(str(tmp_path / 'c.jsonl'))
+        cassette.record('key', {}, {'status': 'SUCCEEDED', 'inspectionData': {'input': '{}'}})
+        cassette.get('key')['inspectionData']['input'] = 'changed'
+        assert cassette.get('key')['inspectionData'] == {'input': '{}'}
+
+    def test_replay_only_raises_on_miss(self, tmp_path, state_machine_definition):
+        cassette_client = CassetteClient(CountingClient(), Cassette(str(tmp_path / 'c.jsonl')), mode='replay_only')
+        with pytest.raises(CassetteMissError):
+            StepFunctionTestRunner(cassette_client, state_machine_definition).execute('CheckApproval')
+
+
+class TestResponseCache:
+    """Tests for deduplicating identical TestState calls."""
+
+    def test_duplicate_calls_hit_the_cache(self, state_machine_definition):
+        client = CountingClient()
+        cache = ResponseCache()
+        runner = StepFunctionTestRunner(CachingClient(client, cache), state_machine_definition)
+        for _ in range(3):
+            (runner
+             .with_input({'validationResult': {'isValid': True}})
+             .execute('CheckValidation')
+             .assert_next_state('ProcessOrderItems'))
+        assert client.calls == 1
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['misses'] == 1
+
+    def test_unmocked_task_calls_are_never_cached(self, state_machine_definition):
+        calls = []
+
+        class RecordingClient:
+            def test_state(self, **params):
+                calls.append(params['stateName'])
+                return {'status': 'SUCCEEDED', 'output': '{}'}
+
+        runner = StepFunctionTestRunner(CachingClient(RecordingClient(), ResponseCache()), state_machine_definition)
+        runner.execute('ValidateOrder')
+        runner.execute('ValidateOrder')
+        assert calls == ['ValidateOrder', 'ValidateOrder']
+
+    def test_hits_are_isolated_copies(self):
+        cache = ResponseCache()
+        response = {'status': 'SUCCEEDED', 'inspectionData': {'input': '{}'}}
+        cache.put('a', response)
+        response['inspectionData']['input'] = 'changed by the caller'
+        cache.get('a')['inspectionData']['input'] = 'changed by a later caller'
+        assert cache.get('a')['inspectionData'] == {'input': '{}'}
+
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = ResponseCache(maxsize=2)
+        cache.put('a', {'status': 'SUCCEEDED'})
+        cache.put('b', {'status': 'SUCCEEDED'})
+        cache.get('a')
+        cache.put('c', {'status': 'SUCCEEDED'})
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_persistent_cache_is_shared_across_sessions(self, tmp_path, state_machine_definition):
+        first_client = CountingClient()
+        first_runner = StepFunctionTestRunner(
+            CachingClient(first_client, ResponseCache(directory=str(tmp_path))), state_machine_definition)
+        first_runner.with_input({'orderId': 'o-1'}).with_mock_result({'isValid': True}).execute('ValidateOrder')
+
+        second_client = CountingClient()
+        second_cache = ResponseCache(directory=str(tmp_path))
+        second_runner = StepFunctionTestRunner(CachingClient(second_client, second_cache), state_machine_definition)
+        (second_runner
+         .with_input({'orderId': 'o-1'})
+         .with_mock_result({'isValid': True})
+         .execute('ValidateOrder')
+         .assert_succeeded()
+         .assert_next_state('CheckValidation'))
+        assert (first_client.calls, second_client.calls) == (1, 0)
+        assert second_cache.stats()['hits'] == 1
+
+
+class TestDefinitionSerialization:
+    """Tests for serializing the definition once and sending minimized definitions."""
+
+    def test_definition_is_serialized_once_per_object(self, state_machine_definition):
+        client = CountingClient()
+        runner = StepFunctionTestRunner(client, state_machine_definition)
+        helper = StepFunctionTestHelper(client, state_machine_definition)
+        runner.with_input({'orderId': 'o-1'}).execute('OrderProcessed')
+        runner.with_input({'orderId': 'o-2'}).execute('OrderProcessed')
+        helper.test_terminal_state('OrderProcessed', input_data={'orderId': 'o-3'})
+        sent = client.definitions
+        assert sent[0] is sent[1] is sent[2]
+        assert json.loads(sent[0]) == state_machine_definition
+        assert runner.definition_hash == helper.definition_hash
+
+    def test_replacing_the_definition_refreshes_the_serialization(self, sfn_client, state_machine_definition):
+        runner = StepFunctionTestRunner(sfn_client, state_machine_definition)
+        original_hash = runner.definition_hash
+        changed = thaw(state_machine_definition)
+        changed['States']['OrderProcessed']['Output'] = '{% $states.input.amount %}'
+        runner.state_machine_definition = changed
+        assert runner.definition_hash != original_hash
+        (runner
+         .with_input({'orderId': 'o-1', 'amount': 5})
+         .execute('OrderProcessed')
+         .assert_output_matches_json('5'))
+
+    def test_minimal_definition_keeps_only_the_target_state(self, state_machine_definition):
+        minimal = minimal_definition(state_machine_definition, 'ValidateOrder')
+        assert minimal['StartAt'] == 'ValidateOrder'
+        assert minimal['QueryLanguage'] == 'JSONata'
+        assert set(minimal['States']) == {'ValidateOrder', 'CheckValidation', 'ValidationFailed'}
+        assert minimal['States']['CheckValidation'] == {'Type': 'Succeed'}
+
+    @pytest.mark.parametrize('state_name, input_data, mock_result, mock_error', [
+        ('ValidateOrder', {'orderId': 'o-1'}, {'isValid': True}, None),
+        ('ValidateOrder', {'orderId': 'o-1'}, None, {'Error': 'ValidationException', 'Cause': 'bad'}),
+        ('CheckApproval', {'approvalResult': {'approved': False}}, None, None),
+        ('ProcessOrderItems', {'orderItems': [{'itemId': 'i-1'}]}, [{'itemId': 'i-1', 'processed': True}], None),
+        ('ProcessItem', {'itemId': 'i-1'}, {'itemId': 'i-1', 'processed': True}, None),
+    ])
+    def test_minimal_definition_gives_the_same_response(
+            self, sfn_client, state_machine_definition, state_name, input_data, mock_result, mock_error):
+        responses = []
+        for minimal in (False, True):
+            runner = StepFunctionTestRunner(sfn_client, state_machine_definition).with_minimal_definition(minimal)
+            runner.with_input(input_data)
+            if mock_result is not None:
+                runner.with_mock_result(mock_result)
+            if mock_error is not None:
+                runner.with_mock_error(mock_error)
+            responses.append(runner.execute(state_name).get_response())
+        assert responses[0] == responses[1]
+
+
+class TestSessionFixtures:
+    """Tests for the session-scoped client and frozen definition fixtures."""
+
+    def test_client_is_shared_between_tests(self, sfn_client, sfn_client_pool):
+        assert sfn_client is sfn_client_pool('local')
+
+    def test_session_definition_is_frozen(self, state_machine_definition, session_state_machine_definition):
+        assert state_machine_definition is session_state_machine_definition
+        with pytest.raises(TypeError):
+            state_machine_definition['StartAt'] = 'CheckValidation'
+        with pytest.raises(TypeError):
+            state_machine_definition['States']['ValidateOrder']['Retry'].append({})
+        assert json.loads(json.dumps(state_machine_definition))['StartAt'] == 'ValidateOrder'
+
+    def test_thawed_copy_is_private_and_mutable(self, state_machine_definition):
+        thawed = thaw(state_machine_definition)
+        thawed['States']['OrderProcessed']['Output'] = '{% $states.input %}'
+        assert state_machine_definition['States']['OrderProcessed']['Output'] == '{% $states.input.orderId %}'
+
+    def test_deepcopy_gives_a_mutable_copy(self, state_machine_definition):
+        definition = copy.deepcopy(state_machine_definition)
+        definition['States']['ValidateOrder']['Retry'].append({'ErrorEquals': ['States.Timeout']})
+        assert len(state_machine_definition['States']['ValidateOrder']['Retry']) == 1
+        shallow = copy.copy(state_machine_definition)
+        shallow['StartAt'] = 'CheckValidation'
+        assert state_machine_definition['StartAt'] == 'ValidateOrder'
+
+
+class _Item:
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+
+
+class TestScheduling:
+    """Tests for duration-based ordering and per-worker cassette shards."""
+
+    def test_slowest_first_with_unknown_tests_leading(self):
+        items = [_Item('fast'), _Item('new'), _Item('slow'), _Item('medium'), _Item('also_fast')]
+        order_slowest_first(items, {'fast': 0.01, 'slow': 2.0, 'medium': 0.5, 'also_fast': 0.01})
+        assert [item.nodeid for item in items] == ['new', 'slow', 'medium', 'fast', 'also_fast']
+
+    def test_recorder_sums_phases_and_keeps_previous_timings(self):
+        recorder = DurationRecorder({'a': 1.0, 'b': 3.0})
+        recorder.add('b', 0.25)
+        recorder.add('b', 0.5)
+        recorder.add('c', 0.1)
+        assert recorder.merged() == {'a': 1.0, 'b': 0.75, 'c': 0.1}
+
+    def test_worker_shards_merge_into_the_cassette(self, tmp_path):
+        path = str(tmp_path / 'cassette.jsonl')
+        main = Cassette(path)
+        main.record('k0', {}, {'status': 'SUCCEEDED'})
+        main.save()
+        for worker in ('gw0', 'gw1'):
+            shard = Cassette(path)
+            shard.record(f'k-{worker}', {}, {'status': 'FAILED'})
+            shard.save(shard_path(path, worker))
+
+        assert merge_shards(path) == 2
+        merged = Cassette(path)
+        assert set(merged.entries) == {'k0', 'k-gw0', 'k-gw1'}
+        assert not (tmp_path / 'cassette.jsonl.shard-gw0').exists()
+        assert merge_shards(path) == 0
+
+
+class _ThrottledClient:
+    """Fake boto3 client whose single call is throttled twice before succeeding."""
+
+    def __init__(self):
+        self.meta = type('Meta', (), {'events': HierarchicalEmitter()})()
+
+    def test_state(self, **params):
+        for _ in range(2):
+            self.meta.events.emit(
+                'needs-retry.sfn.TestState',
+                response=(None, {'Error': {'Code': 'ThrottlingException'}}),
+                caught_exception=None
+            )
+        return {'status': 'SUCCEEDED', 'output': '{}', 'ResponseMetadata': {'RetryAttempts': 2}}
+
+
+class TestTiming:
+    """Tests for per-call latency instrumentation."""
+
+    def test_percentiles_interpolate_between_ranks(self):
+        values = [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert percentile(values, 50) == 3.0
+        assert percentile(values, 95) == pytest.approx(4.8)
+        assert percentile([], 99) == 0.0
+
+    def test_calls_from_runner_and_helper_are_attributed(self, state_machine_definition):
+        recorder = TimingRecorder()
+        recorder.current_test = 'tests/example_test.py::test_flow'
+        client = TimingClient(LocalTestStateClient(), recorder)
+
+        runner = StepFunctionTestRunner(client, state_machine_definition)
+        runner.with_input({'orderId': 'o-1'}).with_mock_result({'isValid': True}).execute('ValidateOrder')
+        helper = StepFunctionTestHelper(client, state_machine_definition)
+        helper.test_choice_state('CheckApproval', input_data={'approvalResult': {'approved': True}})
+        with pytest.raises(Exception):
+            runner.execute('DoesNotExist')
+
+        assert [(call.state_name, call.status) for call in recorder.calls] == [
+            ('ValidateOrder', 'SUCCEEDED'), ('CheckApproval', 'SUCCEEDED'), ('DoesNotExist', 'LocalTestStateError')
+        ]
+        first = recorder.calls[0]
+        assert first.test_id == 'tests/example_test.py::test_flow'
+        assert first.wall_time > 0
+        assert first.request_bytes > len(json.dumps(state_machine_definition))
+        assert first.response_bytes > 0
+
+        report = recorder.report()
+        assert report['summary']['calls'] == 3
+        assert report['states']['ValidateOrder']['calls'] == 1
+        assert report['tests']['tests/example_test.py::test_flow']['statuses'] == {
+            'SUCCEEDED': 2, 'LocalTestStateError': 1
+        }
+
+    def test_counts_sdk_retries_and_throttled_attempts(self):
+        recorder = TimingRecorder()
+        client = TimingClient(_ThrottledClient(), recorder)
+        client.test_state(stateName='ValidateOrder', definition='{}', input='{}')
+        call = recorder.calls[0]
+        assert (call.retry_attempts, call.throttles) == (2, 2)
+        assert recorder.report()['summary']['throttles'] == 2
+
+
+class _QuotaClient(LocalTestStateClient):
+    """Local client that throttles the first calls and tracks concurrent calls."""
+
+    def __init__(self, throttled_calls=0, delay=0.0):
+        super().__init__()
+        self.throttled_calls = throttled_calls
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def test_state(self, **params):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            throttled = self.throttled_calls > 0
+            self.throttled_calls -= 1
+        try:
+            time.sleep(self.delay)
+            if throttled:
+                raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'TestState')
+            return super().test_state(**params)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class TestRateLimiting:
+    """Tests for the token bucket, AIMD control and throttle retries."""
+
+    def test_throttles_are_retried_and_halve_the_limits(self, state_machine_definition):
+        delays = []
+        client = RateLimitedClient(_QuotaClient(throttled_calls=2), rate=1000, max_concurrency=16, sleep=delays.append)
+        runner = StepFunctionTestRunner(client, state_machine_definition)
+        runner.with_input({'approvalResult': {'approved': True}}).execute('CheckApproval').assert_succeeded()
+
+        metrics = client.metrics()
+        assert (metrics['calls'], metrics['successes'], metrics['throttles'], metrics['retries']) == (3, 1, 2, 2)
+        assert len(delays) == 2 and 0 <= delays[0] <= 0.1 and 0 <= delays[1] <= 0.2
+        assert metrics['rateLimit'] < 1000
+        assert metrics['concurrencyLimit'] < 4
+
+    def test_gives_up_after_max_retries(self, state_machine_definition):
+        client = RateLimitedClient(_QuotaClient(throttled_calls=10), rate=1000, max_retries=2, sleep=lambda delay: None)
+        with pytest.raises(ClientError):
+            StepFunctionTestRunner(client, state_machine_definition).execute('CheckApproval')
+        assert client.metrics()['throttles'] == 3
+
+    def test_one_decrease_per_congestion_event(self):
+        now = [0.0]
+        bucket = TokenBucket(100, clock=lambda: now[0])
+        controller = AIMDController(bucket, concurrency=8, min_rate=1, max_rate=1000, max_concurrency=8,
+                                    clock=lambda: now[0])
+        first, second = controller.enter(), controller.enter()
+        now[0] = 1.0
+        assert controller.on_throttle(first)
+        assert not controller.on_throttle(second)
+        assert (controller.concurrency, bucket.rate) == (4.0, 50.0)
+        for _ in range(4):
+            controller.on_success()
+        assert 4.9 < controller.concurrency < 5.0 and bucket.rate > 50.0
+
+    def test_token_bucket_paces_requests(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        assert time.monotonic() - started >= 0.04
+
+    def test_batch_concurrency_stays_within_the_limit(self, state_machine_definition):
+        quota_client = _QuotaClient(delay=0.005)
+        client = RateLimitedClient(quota_client, rate=1000, max_concurrency=4)
+        specs = [{'state_name': 'CheckApproval', 'input_data': {'approvalResult': {'approved': True}}}] * 40
+        results = StepFunctionTestRunner(client, state_machine_definition).execute_batch(specs, max_workers=16)
+        assert all(result.response['status'] == 'SUCCEEDED' for result in results)
+        assert quota_client.max_in_flight <= 4
+        assert client.metrics()['throughputPerSecond'] > 0
@@ -0,0 +1,122 @@
+"""
+Tests for incremental test selection from per-state definition hashes.
+"""
+
+import pytest
+
+from conftest import StepFunctionTestRunner
+from sfn_testing import LocalTestStateClient
+from sfn_testing.definitions import thaw
+from sfn_testing.selection import (
+    DEFINITION_KEY, StateUsageClient, StateUsageRecorder, advance_hashes, affected_states, changed_states,
+    select_tests, state_hashes
+)
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+class _Item:
+    """Stand-in for a collected pytest item."""
+
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+
+
+class _Report:
+    """Stand-in for a test phase report."""
+
+    def __init__(self, nodeid, failed=False):
+        self.nodeid = nodeid
+        self.failed = failed
+
+
+class TestStateHashes:
+    """Tests for detecting which states changed between two definitions."""
+
+    def test_only_the_edited_state_changes(self, state_machine_definition):
+        edited = thaw(state_machine_definition)
+        edited['States']['SaveOrderDetails']['Arguments']['Item']['status'] = {'S': 'SAVED'}
+        assert changed_states(state_hashes(state_machine_definition), state_hashes(edited)) == {'SaveOrderDetails'}
+
+    def test_nested_edit_marks_the_enclosing_state(self, state_machine_definition):
+        edited = thaw(state_machine_definition)
+        edited['States']['ParallelProcessing']['Branches'][0]['States']['PaymentFailed']['Cause'] = 'declined'
+        assert changed_states(state_hashes(state_machine_definition), state_hashes(edited)) == {
+            'ParallelProcessing', 'PaymentFailed'
+        }
+
+    def test_top_level_fields_are_hashed_separately(self, state_machine_definition):
+        edited = thaw(state_machine_definition)
+        edited['TimeoutSeconds'] = 60
+        assert changed_states(state_hashes(state_machine_definition), state_hashes(edited)) == {DEFINITION_KEY}
+
+    def test_direct_predecessors_are_affected_but_not_their_predecessors(self, state_machine_definition):
+        assert affected_states(state_machine_definition, {'SaveOrderDetails'}) == {'SaveOrderDetails', 'CheckApproval'}
+        assert affected_states(state_machine_definition, {'OrderProcessed'}) == {
+            'OrderProcessed', 'SendNotification'
+        }
+        assert affected_states(state_machine_definition, {'PaymentFailed'}) == {'PaymentFailed', 'ProcessPayment'}
+
+
+class TestSelection:
+    """Tests for recording test-to-state mappings and selecting tests from them."""
+
+    def test_runner_calls_are_attributed_to_the_running_test(self, state_machine_definition):
+        recorder = StateUsageRecorder()
+        runner = StepFunctionTestRunner(StateUsageClient(LocalTestStateClient(), recorder), state_machine_definition)
+        runner.with_input({'approvalResult': {'approved': True}}).execute('CheckApproval')
+        recorder.pytest_runtest_logstart('test_approval', None)
+        runner.execute('CheckApproval')
+        recorder.pytest_runtest_logfinish('test_approval', None)
+        recorder.pytest_runtest_logstart('test_nothing', None)
+        assert recorder.merged() == {'test_approval': ['CheckApproval'], 'test_nothing': []}
+
+    def test_selects_tests_touching_changed_states_or_their_predecessors(self, state_machine_definition):
+        previous = state_hashes(state_machine_definition)
+        edited = thaw(state_machine_definition)
+        edited['States']['SaveOrderDetails']['Comment'] = 'edited'
+        tests = {
+            'save': ['SaveOrderDetails'],
+            'approval': ['CheckApproval'],
+            'validate': ['ValidateOrder', 'CheckValidation'],
+            'graph': [],
+        }
+        items = [_Item(nodeid) for nodeid in ('save', 'approval', 'validate', 'graph', 'new')]
+        selected, deselected, affected = select_tests(items, tests, edited, previous)
+        assert [item.nodeid for item in selected] == ['save', 'approval', 'graph', 'new']
+        assert [item.nodeid for item in deselected] == ['validate']
+        assert affected == {'SaveOrderDetails', 'CheckApproval'}
+
+    def test_everything_runs_without_a_baseline_or_on_top_level_changes(self, state_machine_definition):
+        items = [_Item('validate')]
+        tests = {'validate': ['ValidateOrder']}
+        assert select_tests(items, tests, state_machine_definition, {})[0] == items
+        edited = thaw(state_machine_definition)
+        edited['QueryLanguage'] = 'JSONPath'
+        assert select_tests(items, tests, edited, state_hashes(state_machine_definition))[0] == items
+        assert select_tests(items, tests, state_machine_definition, state_hashes(state_machine_definition))[1] == items
+
+    def test_partial_runs_only_advance_states_whose_tests_all_passed(self, state_machine_definition):
+        previous = state_hashes(state_machine_definition)
+        edited = thaw(state_machine_definition)
+        edited['States']['SaveOrderDetails']['Comment'] = 'edited'
+        edited['States']['ValidateOrder']['Comment'] = 'edited'
+        tests = {'save': ['SaveOrderDetails'], 'approval': ['CheckApproval'], 'validate': ['ValidateOrder']}
+        # A run of only the save and approval tests, say with -k
+        hashes = advance_hashes(edited, previous, tests, {'save', 'approval'})
+        assert hashes['SaveOrderDetails'] == state_hashes(edited)['SaveOrderDetails']
+        assert hashes['ValidateOrder'] == previous['ValidateOrder']
+        items = [_Item(nodeid) for nodeid in tests]
+        assert [item.nodeid for item in select_tests(items, tests, edited, hashes)[0]] == ['validate']
+        # The predecessor's test must pass too before a state's hash moves forward
+        assert advance_hashes(edited, previous, tests, {'save'})['SaveOrderDetails'] == previous['SaveOrderDetails']
+        assert DEFINITION_KEY not in advance_hashes(edited, {}, tests, {'save'})
+
+    def test_tests_failing_in_any_phase_are_not_settled(self):
+        recorder = StateUsageRecorder()
+        phases = {'passed': (False, False, False), 'failed': (False, True, False), 'teardown': (False, False, True)}
+        for nodeid, failures in phases.items():
+            for failed in failures:
+                recorder.pytest_runtest_logreport(_Report(nodeid, failed))
+        assert recorder.settled == {'passed'}
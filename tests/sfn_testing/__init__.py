@@ -0,0 +1,35 @@
+"""
+Support package for the Step Functions TestState test suite.
+
+Provides an in-process emulator of the TestState API so the fluent runner
+can execute states locally without network calls, an executor that runs
+the whole workflow locally from StartAt, a simulator for Retry and Catch
+decisions, and Map and Parallel simulators that run the nested states.
+"""
+
+from .emulator import LocalStateEngine, LocalTestStateClient, LocalTestStateError, RetrySimulator, StateResult
+from .executor import LocalWorkflowExecutor, TraceStep, WorkflowExecution
+from .item_batcher import ItemBatcher
+from .jsonata import JSONataError
+from .map_simulator import MapRun, MapSimulator
+from .parallel_simulator import ParallelRun, ParallelSimulator
+from .retrier import Retrier, RetryDecision
+
+__all__ = [
+    'ItemBatcher',
+    'JSONataError',
+    'LocalStateEngine',
+    'LocalTestStateClient',
+    'LocalTestStateError',
+    'LocalWorkflowExecutor',
+    'MapRun',
+    'MapSimulator',
+    'ParallelRun',
+    'ParallelSimulator',
+    'Retrier',
+    'RetryDecision',
+    'RetrySimulator',
+    'StateResult',
+    'TraceStep',
+    'WorkflowExecution',
+]
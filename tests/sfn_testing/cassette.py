@@ -0,0 +1,147 @@
+"""
+Record/replay cassettes for TestState responses.
+
+A cassette is a JSON Lines file with one ``{"key", "request", "response"}``
+record per distinct request. CassetteClient wraps a Step Functions client:
+in 'record' mode every call goes to the wrapped client and is stored; in
+'replay' mode recorded responses are served from an in-memory index (O(1)
+lookup by request key) and only unseen requests fall through to the wrapped
+client; 'replay_only' raises instead of falling through.
+"""
+
+import copy
+import glob
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from .request_keys import canonical_request, request_key
+
+CASSETTE_MODES = ('record', 'replay', 'replay_only')
+
+
+class CassetteMissError(LookupError):
+    """Raised in 'replay_only' mode when a request has no recorded response."""
+
+
+class Cassette:
+    """An on-disk store of TestState requests and responses, indexed by request key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        """Read the cassette file; later records for the same key win."""
+        with open(self.path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    self.entries[record['key']] = record
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a deep copy of the recorded response for a key, or None."""
+        record = self.entries.get(key)
+        return copy.deepcopy(record['response']) if record else None
+
+    def record(self, key: str, request: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Store a copy of a response; the file is written by save()."""
+        with self._lock:
+            self.entries[key] = {'key': key, 'request': request, 'response': copy.deepcopy(response)}
+            self.dirty = True
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write all records to disk atomically (to path, or the cassette's own file), if anything changed."""
+        path = path or self.path
+        with self._lock:
+            if not self.dirty:
+                return
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, 'w') as f:
+                for key in sorted(self.entries):
+                    f.write(json.dumps(self.entries[key], sort_keys=True, separators=(',', ':')) + '\n')
+            os.replace(temporary_path, path)
+            self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+
+def shard_path(path: str, shard: str) -> str:
+    """Return the file a parallel worker writes its part of a cassette to."""
+    return f"{path}.shard-{shard}"
+
+
+def merge_shards(path: str) -> int:
+    """
+    Merge worker shard files into the cassette at path and delete them.
+
+    Returns the number of shards merged.
+    """
+    shards = sorted(glob.glob(shard_path(glob.escape(path), '*')))
+    if not shards:
+        return 0
+    cassette = Cassette(path)
+    for shard in shards:
+        cassette.entries.update(Cassette(shard).entries)
+        cassette.dirty = True
+    cassette.save()
+    for shard in shards:
+        os.remove(shard)
+    return len(shards)
+
+
+def _recordable(response: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in response.items() if name != 'ResponseMetadata'}
+
+
+class CassetteClient:
+    """
+    Step Functions client wrapper that records and replays test_state calls.
+
+    Usage example:
+    cassette = Cassette('tests/cassettes/order_processing.jsonl')
+    client = CassetteClient(boto3.client('stepfunctions'), cassette, mode='replay')
+    runner = StepFunctionTestRunner(client, definition)
+    """
+
+    def __init__(self, client: Any, cassette: Cassette, mode: str = 'replay'):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Cassette mode must be one of {CASSETTE_MODES}, got {mode!r}")
+        self.client = client
+        self.cassette = cassette
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        """Serve a test_state call from the cassette or the wrapped client."""
+        key = request_key(params)
+        if self.mode != 'record':
+            response = self.cassette.get(key)
+            if response is not None:
+                self.hits += 1
+                return response
+            if self.mode == 'replay_only':
+                raise CassetteMissError(
+                    f"No recorded response for {params.get('stateName')} in {self.cassette.path}; "
+                    f"re-record with the 'record' or 'replay' cassette mode"
+                )
+        self.misses += 1
+        response = _recordable(self.client.test_state(**params))
+        self.cassette.record(key, canonical_request(params), response)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
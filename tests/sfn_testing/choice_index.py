@@ -0,0 +1,94 @@
+"""
+Decision index for Choice states.
+
+A Choice state takes the first rule whose Condition is true. Most rules in
+practice are plain equality tests such as
+``{% $states.input.approvalResult.approved = true %}``. ChoiceIndex groups
+those by the field path they read and keeps one hash table per path, from
+the literal to the first rule that compares against it. Choosing a rule
+then costs one lookup per distinct path, and only the complex conditions
+that come before the best indexed candidate are evaluated in order.
+
+The result is always the rule sequential evaluation would pick. Equality
+follows JSONata's type-strict ``=`` (true is not 1, 1 is 1.0), and a
+complex rule that raises before the chosen rule still raises.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .jsonata import UNDEFINED, Environment, Node, Template, equality_condition, field_path
+from .overlay import Overlay
+
+
+def _resolve(path: Tuple[str, ...], path_node: Node, env: Environment) -> Any:
+    """Follow a field path through objects directly; arrays take the evaluator's mapping semantics."""
+    value = env.lookup(path[0])
+    for name in path[1:]:
+        if isinstance(value, (dict, Overlay)):
+            value = value.get(name, UNDEFINED)
+        elif isinstance(value, list):
+            return path_node.evaluate(UNDEFINED, env)
+        else:
+            return UNDEFINED
+    return value
+
+
+def _literal_key(value: Any) -> Optional[Tuple[Any, ...]]:
+    """A hash key under which two values are equal exactly when JSONata's ``=`` says so, or None."""
+    if isinstance(value, bool):
+        return ('boolean', value)
+    if isinstance(value, (int, float)):
+        return ('number', value)
+    if isinstance(value, str):
+        return ('string', value)
+    if value is None:
+        return ('null',)
+    return None
+
+
+class ChoiceIndex:
+    """
+    Picks the first matching rule of a Choice state.
+
+    Usage example:
+    index = ChoiceIndex([cache.compile_template(rule['Condition']) for rule in state['Choices']])
+    rule_number = index.match(Environment({'states': states}))
+    """
+
+    __slots__ = ('size', 'groups', 'sequential')
+
+    def __init__(self, conditions: List[Template]):
+        self.size = len(conditions)
+        groups: Dict[Tuple[str, ...], Tuple[Tuple[str, ...], Node, Dict[Tuple[Any, ...], int]]] = {}
+        self.sequential: List[Tuple[int, Template]] = []
+        for number, condition in enumerate(conditions):
+            simple = equality_condition(condition)
+            key = _literal_key(simple[1]) if simple is not None else None
+            if key is None:
+                self.sequential.append((number, condition))
+                continue
+            path, node = simple[0], condition.node
+            path_node = node.left if field_path(node.left) == path else node.right
+            table = groups.setdefault(path, (path, path_node, {}))[2]
+            table.setdefault(key, number)
+        self.groups = list(groups.values())
+
+    @property
+    def indexed(self) -> int:
+        """How many rules are answered by hash lookup."""
+        return self.size - len(self.sequential)
+
+    def match(self, env: Environment) -> Optional[int]:
+        """Return the number of the first rule whose condition is true, or None."""
+        best = self.size
+        for path, path_node, table in self.groups:
+            value = _resolve(path, path_node, env)
+            key = _literal_key(value) if value is not UNDEFINED else None
+            if key is not None:
+                best = min(best, table.get(key, best))
+        for number, condition in self.sequential:
+            if number >= best:
+                break
+            if condition.evaluate_in(env) is True:
+                return number
+        return best if best < self.size else None
@@ -0,0 +1,146 @@
+"""
+Memoized serialization of state machine definitions.
+
+Serializing the full ASL document for every TestState call is wasted work:
+SerializedDefinition serializes and hashes a definition object once and
+reuses the same string for every request, and can also produce a minimized
+definition that holds only the state under test. freeze() makes a definition
+immutable so it can be shared safely by every test in a session.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Set
+
+from .emulator import LocalTestStateError, iter_states
+from .request_keys import definition_hash
+
+
+def _transition_targets(state: Dict[str, Any]) -> Set[str]:
+    targets = set()
+    if 'Next' in state:
+        targets.add(state['Next'])
+    if 'Default' in state:
+        targets.add(state['Default'])
+    for rule in state.get('Choices', []):
+        targets.add(rule['Next'])
+    for catcher in state.get('Catch', []):
+        targets.add(catcher['Next'])
+    return targets
+
+
+def minimal_definition(definition: Dict[str, Any], state_name: str) -> Dict[str, Any]:
+    """
+    Return a definition holding only the named state.
+
+    States it transitions to are replaced by empty Succeed placeholders so the
+    definition stays valid; nextState in the response still names the real
+    target. Top-level settings such as QueryLanguage are kept.
+    """
+    for name, state in iter_states(definition):
+        if name == state_name:
+            break
+    else:
+        raise LocalTestStateError(f"State {state_name} does not exist in the definition")
+    states = {target: {'Type': 'Succeed'} for target in _transition_targets(state) if target != state_name}
+    states[state_name] = state
+    minimal = {key: value for key, value in definition.items() if key not in ('States', 'StartAt', 'Comment')}
+    minimal['StartAt'] = state_name
+    minimal['States'] = states
+    return minimal
+
+
+class SerializedDefinition:
+    """
+    A definition object together with its JSON text and SHA-256 hash, computed once.
+
+    Use SerializedDefinition.of(definition) to share one instance between all
+    runners built from the same definition object. The instance is tied to the
+    object identity, so it is refreshed only when the definition is replaced;
+    in-place mutation of the definition is not detected.
+    """
+
+    _instances: 'OrderedDict[int, SerializedDefinition]' = OrderedDict()
+    _instances_lock = threading.Lock()
+    _max_instances = 32
+
+    def __init__(self, definition: Dict[str, Any]):
+        self.definition = definition
+        self.text = json.dumps(definition)
+        self.hash = definition_hash(self.text)
+        self._minimal_texts: Dict[str, str] = {}
+
+    @classmethod
+    def of(cls, definition: Dict[str, Any]) -> 'SerializedDefinition':
+        """Return the shared SerializedDefinition for a definition object."""
+        key = id(definition)
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is not None and instance.definition is definition:
+                cls._instances.move_to_end(key)
+                return instance
+        instance = cls(definition)
+        with cls._instances_lock:
+            cls._instances[key] = instance
+            while len(cls._instances) > cls._max_instances:
+                cls._instances.popitem(last=False)
+        return instance
+
+    def minimal_text(self, state_name: str) -> str:
+        """Return the serialized minimal definition for one state, computed once per state."""
+        text = self._minimal_texts.get(state_name)
+        if text is None:
+            text = self._minimal_texts[state_name] = json.dumps(minimal_definition(self.definition, state_name))
+        return text
+
+
+class FrozenDict(dict):
+    """A dict that rejects mutation; still serializes with json.dumps like a plain dict."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable; copy it with thaw() before changing it")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    # Copies are mutable, so copy.deepcopy() still gives a test its own definition to change
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+class FrozenList(list):
+    """A list that rejects mutation; still serializes with json.dumps like a plain list."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable; copy it with thaw() before changing it")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value: Any) -> Any:
+    """Return a deeply immutable copy of a JSON value."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Return a mutable deep copy of a (possibly frozen) JSON value."""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
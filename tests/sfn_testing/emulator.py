@@ -0,0 +1,381 @@
+"""
+In-process emulator for the Step Functions TestState API.
+
+LocalTestStateClient exposes the same ``test_state(**params)`` call as the
+boto3 ``stepfunctions`` client and returns the same response shape, so it can
+be dropped in wherever a runner or helper expects ``sfn_client``.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .choice_index import ChoiceIndex
+from .jsonata import DEFAULT_CACHE, UNDEFINED, Environment, ExpressionCache, JSONataError, Template
+from .overlay import json_default
+from .retrier import Retrier, RetryDecision
+
+
+class LocalTestStateError(ValueError):
+    """Raised for requests the local engine cannot serve (the API would reject them too)."""
+
+
+class StateError(Exception):
+    """An error raised while running a state, routed through Retry and Catch."""
+
+    def __init__(self, error: str, cause: str = ''):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+def iter_states(definition: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (name, state) for every state, including those nested in Map and Parallel states."""
+    for name, state in definition.get('States', {}).items():
+        yield name, state
+        processor = state.get('ItemProcessor') or state.get('Iterator')
+        if processor:
+            yield from iter_states(processor)
+        for branch in state.get('Branches', []):
+            yield from iter_states(branch)
+
+
+def find_state(definition: Dict[str, Any], state_name: str) -> Dict[str, Any]:
+    """Look up a state by name anywhere in the definition (a linear scan; engines keep an index)."""
+    for name, state in iter_states(definition):
+        if name == state_name:
+            return state
+    raise LocalTestStateError(f"State {state_name} does not exist in the definition")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), default=json_default)
+
+
+class StateResult:
+    """
+    The outcome of running one state, holding parsed values.
+
+    to_response() serializes it into the TestState API response shape; the
+    workflow executor chains the parsed output directly instead.
+    """
+
+    __slots__ = ('status', 'output', 'next_state', 'error', 'cause', 'inspection')
+
+    _SERIALIZED_INSPECTION_FIELDS = ('input', 'afterArguments', 'result')
+
+    def __init__(
+        self,
+        status: str,
+        inspection: Dict[str, Any],
+        output: Any = UNDEFINED,
+        next_state: Optional[str] = None,
+        error: Optional[str] = None,
+        cause: Optional[str] = None
+    ):
+        self.status = status
+        self.inspection = inspection
+        self.output = output
+        self.next_state = next_state
+        self.error = error
+        self.cause = cause
+
+    def to_response(self) -> Dict[str, Any]:
+        """Return the TestState-shaped response dictionary."""
+        inspection = dict(self.inspection)
+        for field in self._SERIALIZED_INSPECTION_FIELDS:
+            if field in inspection:
+                inspection[field] = _dumps(inspection[field])
+        response = {'status': self.status, 'inspectionData': inspection}
+        if self.output is not UNDEFINED:
+            response['output'] = _dumps(self.output)
+        if self.next_state is not None:
+            response['nextState'] = self.next_state
+        if self.error is not None:
+            response['error'] = self.error
+        if self.cause is not None:
+            response['cause'] = self.cause
+        return response
+
+
+class CompiledState:
+    """A state of the definition with every JSONata template compiled ahead of time."""
+
+    __slots__ = ('name', 'state', 'type', 'arguments', 'output', 'choices', 'choice_index', 'default', 'catchers',
+                 'retrier', 'error', 'cause')
+
+    def __init__(self, name: str, state: Dict[str, Any], cache: ExpressionCache):
+        self.name = name
+        self.state = state
+        self.type = state.get('Type')
+        self.arguments = self._compile(cache, state, 'Arguments')
+        self.output = self._compile(cache, state, 'Output')
+        self.choices = [
+            (cache.compile_template(rule['Condition']), self._compile(cache, rule, 'Output'), rule['Next'])
+            for rule in state.get('Choices', [])
+        ]
+        self.choice_index = ChoiceIndex([condition for condition, _, _ in self.choices])
+        self.default = state.get('Default')
+        self.catchers = [
+            (catcher.get('ErrorEquals', []), self._compile(cache, catcher, 'Output'), catcher['Next'])
+            for catcher in state.get('Catch', [])
+        ]
+        self.retrier = Retrier(state)
+        self.error = cache.compile_template(state.get('Error', ''))
+        self.cause = cache.compile_template(state.get('Cause', ''))
+
+    @staticmethod
+    def _compile(cache: ExpressionCache, owner: Dict[str, Any], field: str) -> Optional[Template]:
+        return cache.compile_template(owner[field]) if field in owner else None
+
+
+class LocalStateEngine:
+    """
+    Evaluates a single state of a parsed ASL definition.
+
+    The engine follows the TestState semantics: Task, Map and Parallel states
+    take their result from the mock, errors run through the state's Retry and
+    Catch policies, and the response reports status, nextState, output, error,
+    cause and inspectionData.
+    """
+
+    def __init__(self, definition: Dict[str, Any], cache: ExpressionCache = DEFAULT_CACHE):
+        self.definition = definition
+        self.states = {name: CompiledState(name, state, cache) for name, state in iter_states(definition)}
+
+    def test_state(
+        self,
+        state_name: str,
+        state_input: Any,
+        mock: Optional[Dict[str, Any]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        state_config: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Run one state with a TestState-style mock and return a TestState-shaped response."""
+        if mock and 'result' in mock:
+            mock = dict(mock, result=json.loads(mock['result']))
+        return self.run(state_name, state_input, mock, context, state_config).to_response()
+
+    def run(
+        self,
+        state_name: str,
+        state_input: Any,
+        mock: Optional[Dict[str, Any]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        state_config: Optional[Dict[str, Any]] = None
+    ) -> StateResult:
+        """
+        Run one state against parsed values.
+
+        Unlike test_state(), ``mock['result']`` is the parsed result value rather
+        than a JSON string, and the StateResult keeps the output unserialized.
+        """
+        state = self.states.get(state_name)
+        if state is None:
+            raise LocalTestStateError(f"State {state_name} does not exist in the definition")
+        states = {'input': state_input, 'context': context or {}}
+        inspection = {'input': state_input}
+        handler = getattr(self, f"_run_{state.type.lower()}", None) if state.type else None
+        if handler is None:
+            raise LocalTestStateError(f"State type {state.type} is not supported by the local engine")
+        return handler(state, states, inspection, mock or {}, state_config or {})
+
+    # ------------------------------------------------------------------
+    # State types
+    # ------------------------------------------------------------------
+
+    def _run_task(self, state, states, inspection, mock, state_config):
+        try:
+            if state.arguments is not None:
+                arguments = state.arguments.evaluate({'states': states})
+                inspection['afterArguments'] = arguments
+            result = self._mock_result(state.name, mock)
+        except StateError as error:
+            return self._handle_error(state, states, inspection, error, state_config)
+        except JSONataError as error:
+            return self._handle_error(
+                state, states, inspection, StateError('States.QueryEvaluationError', str(error)), state_config
+            )
+        return self._succeed_with_result(state, states, inspection, result, state_config)
+
+    def _run_map(self, state, states, inspection, mock, state_config):
+        for field, key in (('MaxConcurrency', 'maxConcurrency'),
+                           ('ToleratedFailureCount', 'toleratedFailureCount'),
+                           ('ToleratedFailurePercentage', 'toleratedFailurePercentage')):
+            if field in state.state:
+                inspection[key] = state.state[field]
+        try:
+            result = self._mock_result(state.name, mock)
+            if not isinstance(result, list):
+                raise LocalTestStateError(f"Mock result for Map state {state.name} must be a JSON array")
+        except StateError as error:
+            return self._handle_error(state, states, inspection, error, state_config)
+        return self._succeed_with_result(state, states, inspection, result, state_config)
+
+    def _run_parallel(self, state, states, inspection, mock, state_config):
+        try:
+            result = self._mock_result(state.name, mock)
+            if not isinstance(result, list) or len(result) != len(state.state.get('Branches', [])):
+                raise LocalTestStateError(
+                    f"Mock result for Parallel state {state.name} must be a JSON array with one entry per branch"
+                )
+        except StateError as error:
+            return self._handle_error(state, states, inspection, error, state_config)
+        return self._succeed_with_result(state, states, inspection, result, state_config)
+
+    def _run_choice(self, state, states, inspection, mock, state_config):
+        env = Environment({'states': states})
+        try:
+            number = state.choice_index.match(env)
+            if number is not None:
+                _, output, next_state = state.choices[number]
+                # A rule without its own Output uses the state's Output
+                output = self._output(output if output is not None else state.output, states, states['input'])
+                return StateResult('SUCCEEDED', inspection, output=output, next_state=next_state)
+            if state.default is not None:
+                output = self._output(state.output, states, states['input'])
+                return StateResult('SUCCEEDED', inspection, output=output, next_state=state.default)
+        except JSONataError as error:
+            return self._query_failed(inspection, error)
+        return StateResult(
+            'FAILED', inspection, error='States.NoChoiceMatched',
+            cause=f"No Matches! Choice state {state.name} had no matching rule and no Default"
+        )
+
+    def _run_pass(self, state, states, inspection, mock, state_config):
+        try:
+            output = self._output(state.output, states, states['input'])
+        except JSONataError as error:
+            return self._query_failed(inspection, error)
+        return StateResult('SUCCEEDED', inspection, output=output, next_state=state.state.get('Next'))
+
+    _run_wait = _run_pass
+
+    def _run_succeed(self, state, states, inspection, mock, state_config):
+        try:
+            output = self._output(state.output, states, states['input'])
+        except JSONataError as error:
+            return self._query_failed(inspection, error)
+        return StateResult('SUCCEEDED', inspection, output=output)
+
+    def _run_fail(self, state, states, inspection, mock, state_config):
+        env = Environment({'states': states})
+        try:
+            error = state.error.evaluate_in(env)
+            cause = state.cause.evaluate_in(env)
+        except JSONataError as evaluation_error:
+            return self._query_failed(inspection, evaluation_error)
+        return StateResult('FAILED', inspection, error=error, cause=cause)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _mock_result(state_name: str, mock: Dict[str, Any]) -> Any:
+        if 'errorOutput' in mock:
+            error_output = mock['errorOutput']
+            raise StateError(error_output.get('error', ''), error_output.get('cause', ''))
+        if 'result' in mock:
+            return mock['result']
+        raise LocalTestStateError(
+            f"State {state_name} needs a mock result or errorOutput when run by the local engine"
+        )
+
+    def _succeed_with_result(self, state, states, inspection, result, state_config):
+        inspection['result'] = result
+        states = dict(states, result=result)
+        try:
+            output = self._output(state.output, states, result)
+        except JSONataError as error:
+            return self._handle_error(
+                state, states, inspection, StateError('States.QueryEvaluationError', str(error)), state_config
+            )
+        return StateResult('SUCCEEDED', inspection, output=output, next_state=state.state.get('Next'))
+
+    @staticmethod
+    def _query_failed(inspection: Dict[str, Any], error: JSONataError) -> StateResult:
+        """The FAILED result of a state whose expressions could not be evaluated."""
+        return StateResult('FAILED', inspection, error='States.QueryEvaluationError', cause=str(error))
+
+    @staticmethod
+    def _output(output: Optional[Template], states: Dict[str, Any], default: Any) -> Any:
+        if output is None:
+            return default
+        value = output.evaluate({'states': states})
+        if value is UNDEFINED:
+            raise JSONataError('The Output expression evaluated to undefined')
+        return value
+
+    def _handle_error(self, state, states, inspection, error, state_config):
+        decision = state.retrier.decide(error.error, state_config.get('retrierRetryCount', 0))
+        if decision.status == 'RETRIABLE':
+            inspection['errorDetails'] = decision.error_details()
+            return StateResult('RETRIABLE', inspection, error=error.error, cause=error.cause)
+        if decision.status == 'CAUGHT_ERROR':
+            error_output = {'Error': error.error, 'Cause': error.cause}
+            output = state.catchers[decision.catch_policy.index][1]
+            try:
+                output = self._output(output, dict(states, errorOutput=error_output), error_output)
+            except JSONataError as evaluation_error:
+                return self._query_failed(inspection, evaluation_error)
+            inspection['errorDetails'] = decision.error_details()
+            return StateResult(
+                'CAUGHT_ERROR', inspection, output=output, next_state=decision.next_state,
+                error=error.error, cause=error.cause
+            )
+        return StateResult('FAILED', inspection, error=error.error, cause=error.cause)
+
+
+class LocalTestStateClient:
+    """
+    Drop-in replacement for ``boto3.client('stepfunctions')`` that serves
+    ``test_state`` calls from the in-process LocalStateEngine.
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, LocalStateEngine] = {}
+
+    def engine_for(self, definition: str) -> LocalStateEngine:
+        """Return the engine for a serialized definition, parsing it only once."""
+        engine = self._engines.get(definition)
+        if engine is None:
+            engine = self._engines[definition] = LocalStateEngine(json.loads(definition))
+        return engine
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        """Evaluate one state with the same parameters and response shape as the TestState API."""
+        engine = self.engine_for(params['definition'])
+        context = params.get('context')
+        return engine.test_state(
+            state_name=params['stateName'],
+            state_input=json.loads(params.get('input') or '{}'),
+            mock=params.get('mock'),
+            context=json.loads(context) if context else None,
+            state_config=params.get('stateConfiguration')
+        )
+
+
+class RetrySimulator:
+    """
+    Retry/Catch decisions for every state of a definition, without API calls.
+
+    Usage example:
+    simulator = RetrySimulator(definition)
+    decision = simulator.decide('ValidateOrder', 'Lambda.TooManyRequestsException', retry_count=1)
+    assert decision.status == 'RETRIABLE' and decision.backoff_seconds == 4
+    """
+
+    def __init__(self, definition: Dict[str, Any]):
+        self.retriers = {name: Retrier(state) for name, state in iter_states(definition)}
+
+    def retrier(self, state_name: str) -> Retrier:
+        try:
+            return self.retriers[state_name]
+        except KeyError:
+            raise LocalTestStateError(f"State {state_name} does not exist in the definition") from None
+
+    def decide(self, state_name: str, error: str, retry_count: int = 0) -> RetryDecision:
+        return self.retrier(state_name).decide(error, retry_count)
+
+    def schedule(self, state_name: str, error: str) -> List[RetryDecision]:
+        return self.retrier(state_name).schedule(error)
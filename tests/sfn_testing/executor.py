@@ -0,0 +1,242 @@
+"""
+Full-workflow executor for the local TestState engine.
+
+Starts at ``StartAt`` and follows ``nextState`` through the definition until a
+terminal state, serving every Task, Map and Parallel state from a per-state
+mock table. Retriable errors are retried in place (without sleeping), so a
+whole order run is one in-process call instead of one TestState request per
+hop.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from .emulator import LocalStateEngine, LocalTestStateError, StateResult
+from .jsonata import DEFAULT_CACHE, UNDEFINED, ExpressionCache
+from .overlay import to_plain
+from .payload_size import DATA_LIMIT_EXCEEDED, PayloadReport, data_limit_cause, measure
+
+MockSpec = Union[Dict[str, Any], List[Dict[str, Any]]]
+
+
+class TraceStep:
+    """One state attempt visited during a workflow execution."""
+
+    __slots__ = ('state_name', 'retry_count', 'state_input', 'result')
+
+    def __init__(self, state_name: str, retry_count: int, state_input: Any, result: StateResult):
+        self.state_name = state_name
+        self.retry_count = retry_count
+        self.state_input = state_input
+        self.result = result
+
+    @property
+    def status(self) -> str:
+        return self.result.status
+
+    @property
+    def next_state(self) -> Optional[str]:
+        return self.result.next_state
+
+    @property
+    def input(self) -> Any:
+        return to_plain(self.state_input)
+
+    @property
+    def output(self) -> Any:
+        return None if self.result.output is UNDEFINED else to_plain(self.result.output)
+
+    def to_response(self) -> Dict[str, Any]:
+        """Return the TestState-shaped response for this step."""
+        return self.result.to_response()
+
+    def __repr__(self):
+        return f"TraceStep({self.state_name!r}, status={self.status!r}, next_state={self.next_state!r})"
+
+
+class WorkflowExecution:
+    """The result of a full local workflow run: final status, output and the step trace."""
+
+    def __init__(
+        self,
+        status: str,
+        steps: List[TraceStep],
+        output: Any = None,
+        error: Optional[str] = None,
+        cause: Optional[str] = None,
+        payload: Optional[PayloadReport] = None
+    ):
+        self.status = status
+        self.steps = steps
+        self.output = output
+        self.error = error
+        self.cause = cause
+        self.payload = payload
+
+    @property
+    def path(self) -> List[str]:
+        """State names in the order they were entered, with retried attempts collapsed."""
+        return [step.state_name for step in self.steps if step.retry_count == 0]
+
+    def step(self, state_name: str) -> TraceStep:
+        """Return the last attempt of the named state."""
+        for step in reversed(self.steps):
+            if step.state_name == state_name:
+                return step
+        raise KeyError(f"State {state_name} was not visited; path was {self.path}")
+
+    def assert_succeeded(self) -> 'WorkflowExecution':
+        """Assert that the workflow reached a successful terminal state."""
+        assert self.status == 'SUCCEEDED', f"Expected SUCCEEDED, got {self.status} ({self.error}: {self.cause})"
+        return self
+
+    def assert_failed(self, expected_error: Optional[str] = None) -> 'WorkflowExecution':
+        """Assert that the workflow failed, optionally with the given error."""
+        assert self.status == 'FAILED', f"Expected FAILED, got {self.status}"
+        if expected_error is not None:
+            assert self.error == expected_error, f"Expected error {expected_error}, got {self.error}"
+        return self
+
+    def assert_path(self, expected_path: List[str]) -> 'WorkflowExecution':
+        """Assert the exact sequence of states entered."""
+        assert self.path == expected_path, f"Expected path {expected_path}, got {self.path}"
+        return self
+
+    def assert_visited(self, state_name: str) -> 'WorkflowExecution':
+        """Assert that the named state was entered at least once."""
+        assert state_name in self.path, f"Expected {state_name} to be visited, path was {self.path}"
+        return self
+
+    def assert_output_matches_json(self, expected_output: Any) -> 'WorkflowExecution':
+        """Assert the final output of the workflow."""
+        assert self.output == expected_output, f"Expected output {expected_output}, got {self.output}"
+        return self
+
+
+class LocalWorkflowExecutor:
+    """
+    Runs a whole state machine definition in process.
+
+    Usage example:
+    execution = (LocalWorkflowExecutor(definition)
+        .run(order_input, mocks={
+            "ValidateOrder": {"result": {"isValid": True}},
+            "SendNotification": {"errorOutput": {"error": "Lambda.ServiceException", "cause": "down"}}
+        })
+        .assert_succeeded())
+
+    A mock is either a TestState-style mock with a parsed ``result`` or an
+    ``errorOutput``, or a list of them consumed one per attempt of that state
+    (the last entry repeats), which lets a state fail and then recover on retry.
+
+    When a coverage recorder is given (any object with
+    ``record_result(state_name, result)``, such as CoverageRecorder), every
+    step is recorded in it.
+
+    With a payload_limit, every step's input, result and output are measured
+    into ``execution.payload``, and the run fails with
+    States.DataLimitExceeded at the first state whose payload passes it.
+    """
+
+    def __init__(
+        self,
+        definition: Dict[str, Any],
+        cache: ExpressionCache = DEFAULT_CACHE,
+        max_steps: int = 1000,
+        coverage: Optional[Any] = None,
+        payload_limit: Optional[int] = None
+    ):
+        self.definition = definition
+        self.engine = LocalStateEngine(definition, cache=cache)
+        self.max_steps = max_steps
+        self.coverage = coverage
+        self.payload_limit = payload_limit
+
+    def run(
+        self,
+        input_data: Any,
+        mocks: Optional[Dict[str, MockSpec]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        contexts: Optional[Dict[str, Dict[str, Any]]] = None,
+        start_at: Optional[str] = None,
+        latencies: Optional[Dict[str, float]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> WorkflowExecution:
+        """
+        Execute the workflow from StartAt (or start_at) until a terminal state.
+
+        Args:
+            input_data: Execution input
+            mocks: Mock per state name for Task, Map and Parallel states
+            context: Context object used for every state
+            contexts: Per-state context objects, taking precedence over context
+            start_at: State to start from instead of the definition's StartAt
+            latencies: Seconds to wait before each attempt of the named states,
+                to simulate slow tasks
+            cancel: When set, the run stops before its next state (or during a
+                latency wait) with status CANCELLED
+
+        Returns:
+            WorkflowExecution with the final status, output and step trace
+        """
+        mocks = mocks or {}
+        contexts = contexts or {}
+        latencies = latencies or {}
+        calls: Dict[str, int] = {}
+        steps: List[TraceStep] = []
+        state_name = start_at or self.definition['StartAt']
+        data = input_data
+        retry_count = 0
+        payload = PayloadReport([], self.payload_limit) if self.payload_limit else None
+        while True:
+            if len(steps) >= self.max_steps:
+                raise LocalTestStateError(
+                    f"Workflow did not terminate within {self.max_steps} steps; last state was {state_name}"
+                )
+            if self._cancelled(cancel, latencies.get(state_name)):
+                return WorkflowExecution('CANCELLED', steps, payload=payload)
+            mock = self._next_mock(mocks, state_name, calls)
+            state_config = {'retrierRetryCount': retry_count} if retry_count else None
+            result = self.engine.run(state_name, data, mock, contexts.get(state_name, context), state_config)
+            steps.append(TraceStep(state_name, retry_count, data, result))
+            if self.coverage is not None:
+                self.coverage.record_result(state_name, result)
+            if payload is not None:
+                size = measure(state_name, data, result.inspection.get('result', UNDEFINED), result.output, retry_count)
+                payload.sizes.append(size)
+                if size.max_bytes > payload.limit:
+                    return WorkflowExecution('FAILED', steps, error=DATA_LIMIT_EXCEEDED,
+                                             cause=data_limit_cause(size, payload.limit), payload=payload)
+            if result.status == 'RETRIABLE':
+                retry_count += 1
+                continue
+            retry_count = 0
+            if result.status == 'FAILED':
+                return WorkflowExecution('FAILED', steps, error=result.error, cause=result.cause, payload=payload)
+            if result.next_state is None:
+                output = None if result.output is UNDEFINED else to_plain(result.output)
+                return WorkflowExecution('SUCCEEDED', steps, output=output, payload=payload)
+            data = result.output
+            state_name = result.next_state
+
+    @staticmethod
+    def _cancelled(cancel: Optional[threading.Event], latency: Optional[float]) -> bool:
+        if cancel is None:
+            if latency:
+                time.sleep(latency)
+            return False
+        if latency:
+            return cancel.wait(latency)
+        return cancel.is_set()
+
+    @staticmethod
+    def _next_mock(mocks: Dict[str, MockSpec], state_name: str, calls: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        mock = mocks.get(state_name)
+        if not isinstance(mock, list):
+            return mock
+        if not mock:
+            return None
+        call = calls.get(state_name, 0)
+        calls[state_name] = call + 1
+        return mock[min(call, len(mock) - 1)]
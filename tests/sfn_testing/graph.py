@@ -0,0 +1,477 @@
+"""
+Transition graph analysis for ASL definitions.
+
+StateGraph builds the edges of one state list (the top level of a
+definition, a Map ItemProcessor or a Parallel branch) from ``Next``, Choice
+``Choices``/``Default``, Catch ``Next`` and ``End``. It enumerates the
+distinct paths from StartAt to a terminal state and computes a minimum set
+of paths that covers every edge. plan_scenarios() turns that covering set
+into mock scenarios for LocalWorkflowExecutor and checks each one by running
+it.
+"""
+
+import copy
+from collections import deque
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+
+from .emulator import LocalTestStateError
+from .executor import LocalWorkflowExecutor, WorkflowExecution
+from .jsonata import DEFAULT_CACHE, equality_condition
+from .retrier import Retrier
+
+# State types whose outcome comes from a mock in local runs
+MOCKED_TYPES = {'Task', 'Map', 'Parallel'}
+
+_SOURCE = object()
+_SINK = object()
+
+
+class Edge:
+    """
+    One transition of the graph.
+
+    kind is 'next', 'choice' (index is the rule), 'default', 'catch' (index is
+    the catcher) or 'end'; end edges leave terminal states and have no target.
+    """
+
+    __slots__ = ('source', 'target', 'kind', 'index')
+
+    def __init__(self, source: str, target: Optional[str], kind: str, index: Optional[int] = None):
+        self.source = source
+        self.target = target
+        self.kind = kind
+        self.index = index
+
+    @property
+    def key(self) -> Tuple[str, Optional[str], str, Optional[int]]:
+        return self.source, self.target, self.kind, self.index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Edge) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        label = self.kind if self.index is None else f"{self.kind}[{self.index}]"
+        return f"{self.source} -{label}-> {self.target if self.target is not None else '(end)'}"
+
+
+def _state_edges(name: str, state: Dict[str, Any]) -> List[Edge]:
+    edges = []
+    if 'Next' in state:
+        edges.append(Edge(name, state['Next'], 'next'))
+    for index, rule in enumerate(state.get('Choices', [])):
+        edges.append(Edge(name, rule['Next'], 'choice', index))
+    if 'Default' in state:
+        edges.append(Edge(name, state['Default'], 'default'))
+    for index, catcher in enumerate(state.get('Catch', [])):
+        edges.append(Edge(name, catcher['Next'], 'catch', index))
+    if state.get('End') or state.get('Type') in ('Succeed', 'Fail'):
+        edges.append(Edge(name, None, 'end'))
+    return edges
+
+
+class StateGraph:
+    """
+    The transition graph of one state list.
+
+    Usage example:
+    graph = StateGraph(definition)
+    for path in graph.edge_cover():
+        print([edge.source for edge in path])
+    """
+
+    def __init__(self, owner: Dict[str, Any]):
+        self.start = owner['StartAt']
+        self.states = owner['States']
+        self.edges: List[Edge] = []
+        self._outgoing: Dict[str, List[Edge]] = {}
+        for name, state in self.states.items():
+            edges = _state_edges(name, state)
+            self.edges.extend(edges)
+            self._outgoing[name] = edges
+        for edge in self.edges:
+            if edge.target is not None and edge.target not in self.states:
+                raise LocalTestStateError(f"{edge} points to a state that does not exist")
+
+    def outgoing(self, state_name: str) -> List[Edge]:
+        return self._outgoing[state_name]
+
+    def subgraphs(self) -> Dict[str, List['StateGraph']]:
+        """The graphs nested in Map (ItemProcessor) and Parallel (Branches) states, by state name."""
+        nested = {}
+        for name, state in self.states.items():
+            processor = state.get('ItemProcessor') or state.get('Iterator')
+            if processor:
+                nested[name] = [StateGraph(processor)]
+            elif state.get('Branches'):
+                nested[name] = [StateGraph(branch) for branch in state['Branches']]
+        return nested
+
+    def walk(self) -> List['StateGraph']:
+        """This graph followed by every nested graph, depth first."""
+        graphs = [self]
+        for nested in self.subgraphs().values():
+            for subgraph in nested:
+                graphs.extend(subgraph.walk())
+        return graphs
+
+    def is_acyclic(self) -> bool:
+        visiting, done = set(), set()
+
+        def visit(name: str) -> bool:
+            visiting.add(name)
+            for edge in self._outgoing[name]:
+                if edge.target is None or edge.target in done:
+                    continue
+                if edge.target in visiting or not visit(edge.target):
+                    return False
+            visiting.discard(name)
+            done.add(name)
+            return True
+
+        return visit(self.start)
+
+    def paths(self, max_paths: int = 10000) -> List[List[Edge]]:
+        """
+        Enumerate the distinct paths from StartAt to an end edge, visiting no state twice.
+
+        Raises LocalTestStateError if there are more than max_paths paths.
+        """
+        paths: List[List[Edge]] = []
+        stack: List[Tuple[str, List[Edge], frozenset]] = [(self.start, [], frozenset([self.start]))]
+        while stack:
+            name, prefix, visited = stack.pop()
+            for edge in reversed(self._outgoing[name]):
+                if edge.target is None:
+                    paths.append(prefix + [edge])
+                    if len(paths) > max_paths:
+                        raise LocalTestStateError(f"The graph has more than {max_paths} paths")
+                elif edge.target not in visited:
+                    stack.append((edge.target, prefix + [edge], visited | {edge.target}))
+        return paths
+
+    def reachable_edges(self) -> List[Edge]:
+        """Edges that lie on at least one path from StartAt to an end edge."""
+        forward = self._distances_from_start()
+        backward = self._next_edge_to_end()
+        return [edge for edge in self.edges
+                if edge.source in forward and (edge.target is None or edge.target in backward)]
+
+    def edge_cover(self) -> List[List[Edge]]:
+        """
+        Return a minimum number of paths that together take every reachable edge.
+
+        For acyclic graphs this is exact: a minimum flow with a lower bound of
+        one on every edge, decomposed into paths. Graphs with cycles fall back
+        to greedily picking the simple path that covers most uncovered edges.
+        """
+        if not self.is_acyclic():
+            return self._greedy_cover()
+        edges = self.reachable_edges()
+        flow = self._initial_flow(edges)
+        total = self._reduce_flow(edges, flow)
+        return self._decompose(flow, total)
+
+    # -- minimum flow -------------------------------------------------------
+
+    def _distances_from_start(self) -> Dict[str, Optional[Edge]]:
+        parents: Dict[str, Optional[Edge]] = {self.start: None}
+        queue = deque([self.start])
+        while queue:
+            name = queue.popleft()
+            for edge in self._outgoing[name]:
+                if edge.target is not None and edge.target not in parents:
+                    parents[edge.target] = edge
+                    queue.append(edge.target)
+        return parents
+
+    def _next_edge_to_end(self) -> Dict[str, Edge]:
+        incoming: Dict[str, List[Edge]] = {}
+        for edge in self.edges:
+            if edge.target is not None:
+                incoming.setdefault(edge.target, []).append(edge)
+        next_edge: Dict[str, Edge] = {}
+        queue = deque()
+        for edge in self.edges:
+            if edge.target is None and edge.source not in next_edge:
+                next_edge[edge.source] = edge
+                queue.append(edge.source)
+        while queue:
+            name = queue.popleft()
+            for edge in incoming.get(name, []):
+                if edge.source not in next_edge:
+                    next_edge[edge.source] = edge
+                    queue.append(edge.source)
+        return next_edge
+
+    def _initial_flow(self, edges: List[Edge]) -> Dict[Edge, int]:
+        """A feasible flow: one shortest start-to-end path through each edge."""
+        parents = self._distances_from_start()
+        next_edge = self._next_edge_to_end()
+        flow = {edge: 0 for edge in edges}
+        for edge in edges:
+            path = [edge]
+            name = edge.source
+            while parents[name] is not None:
+                path.append(parents[name])
+                name = parents[name].source
+            name = edge.target
+            while name is not None:
+                path.append(next_edge[name])
+                name = next_edge[name].target
+            for step in path:
+                flow[step] += 1
+        return flow
+
+    def _reduce_flow(self, edges: List[Edge], flow: Dict[Edge, int]) -> int:
+        """
+        Lower the flow to its minimum by pushing flow back from the sink to the source.
+
+        In the residual graph an edge can be followed forwards (raising its
+        flow, unbounded) or backwards (lowering it, down to one unit). Returns
+        the remaining number of paths.
+        """
+        total = sum(flow[edge] for edge in edges if edge.target is None)
+        while total > 0:
+            parents: Dict[Any, Tuple[Any, Optional[Edge], int]] = {_SINK: (None, None, 0)}
+            queue = deque([_SINK])
+            while queue and _SOURCE not in parents:
+                node = queue.popleft()
+                if node == self.start:
+                    parents[_SOURCE] = (node, None, 0)
+                    break
+                for edge in edges:
+                    head = _SINK if edge.target is None else edge.target
+                    if head == node and flow[edge] > 1 and edge.source not in parents:
+                        parents[edge.source] = (node, edge, -1)
+                        queue.append(edge.source)
+                    elif edge.source == node and head not in parents:
+                        parents[head] = (node, edge, +1)
+                        queue.append(head)
+            if _SOURCE not in parents:
+                break
+            augmenting = []
+            node = _SOURCE
+            while node is not _SINK:
+                node, edge, direction = parents[node]
+                if edge is not None:
+                    augmenting.append((edge, direction))
+            amount = min([total] + [flow[edge] - 1 for edge, direction in augmenting if direction < 0])
+            for edge, direction in augmenting:
+                flow[edge] += direction * amount
+            total -= amount
+        return total
+
+    def _decompose(self, flow: Dict[Edge, int], total: int) -> List[List[Edge]]:
+        flow = dict(flow)
+        paths = []
+        for _ in range(total):
+            path = []
+            name = self.start
+            while True:
+                edge = next(edge for edge in self._outgoing[name] if flow.get(edge, 0) > 0)
+                flow[edge] -= 1
+                path.append(edge)
+                if edge.target is None:
+                    break
+                name = edge.target
+            paths.append(path)
+        return paths
+
+    def _greedy_cover(self) -> List[List[Edge]]:
+        uncovered = set(self.reachable_edges())
+        candidates = self.paths()
+        cover = []
+        while uncovered:
+            best = max(candidates, key=lambda path: len(uncovered.intersection(path)))
+            if not uncovered.intersection(best):
+                break
+            cover.append(best)
+            uncovered.difference_update(best)
+        return cover
+
+
+class Scenario:
+    """A mocked run of the workflow that should follow one planned path."""
+
+    __slots__ = ('edges', 'input', 'mocks', 'execution', 'error')
+
+    def __init__(self, edges: List[Edge], input_data: Any, mocks: Dict[str, Any]):
+        self.edges = edges
+        self.input = input_data
+        self.mocks = mocks
+        self.execution: Optional[WorkflowExecution] = None
+        self.error: Optional[str] = None
+
+    @property
+    def path(self) -> List[str]:
+        return [edge.source for edge in self.edges]
+
+    @property
+    def name(self) -> str:
+        decisions = [repr(edge) for edge in self.edges if edge.kind not in ('next', 'end')]
+        return ', '.join(decisions) if decisions else ' -> '.join(self.path)
+
+    @property
+    def verified(self) -> bool:
+        """True once the scenario has run without an evaluation error and followed its planned path."""
+        return self.execution is not None and self.error is None and self.execution.path == self.path
+
+    def run(self, executor: LocalWorkflowExecutor,
+            fallback_mocks: Optional[Dict[str, Any]] = None) -> Optional[WorkflowExecution]:
+        """
+        Run the scenario; fallback_mocks serve states off the planned path if the run strays.
+
+        A run the local engine cannot complete leaves execution as None and
+        the reason in error. A run that fails with States.QueryEvaluationError
+        keeps its execution and puts the cause in error.
+        """
+        mocks = dict(fallback_mocks or {}, **self.mocks)
+        self.execution, self.error = None, None
+        try:
+            self.execution = executor.run(copy.deepcopy(self.input), copy.deepcopy(mocks))
+        except LocalTestStateError as e:
+            self.error = str(e)
+        else:
+            if self.execution.error == 'States.QueryEvaluationError':
+                self.error = self.execution.cause
+        return self.execution
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'path': self.path, 'input': self.input, 'mocks': self.mocks}
+
+    def __repr__(self) -> str:
+        return f"Scenario({self.name})"
+
+
+def _default_mock(state: Dict[str, Any]) -> Dict[str, Any]:
+    if state['Type'] == 'Map':
+        return {'result': []}
+    if state['Type'] == 'Parallel':
+        return {'result': [{} for _ in state.get('Branches', [])]}
+    return {'result': {}}
+
+
+def _catch_mock(state: Dict[str, Any], edge: Edge) -> Dict[str, Any]:
+    """An errorOutput mock that the edge's catcher handles, preferring errors that are not retried."""
+    retrier = Retrier(state)
+    candidates = [error for error in state['Catch'][edge.index].get('ErrorEquals', []) if error != 'States.ALL']
+    candidates += ['States.TaskFailed', 'Scenario.Error']
+    matching = [error for error in candidates if retrier.decide(error, 10 ** 6).catch_policy_handled_error == edge.index]
+    not_retried = [error for error in matching if retrier.decide(error, 0).status != 'RETRIABLE']
+    error = (not_retried or matching or candidates)[0]
+    return {'errorOutput': {'error': error, 'cause': f"Scenario for {edge!r}"}}
+
+
+def _other_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return not value
+    if isinstance(value, (int, float)):
+        return value + 1
+    if isinstance(value, str):
+        return value + '-other'
+    return 'other'
+
+
+def _set_path(target: Dict[str, Any], path: Tuple[str, ...], value: Any) -> None:
+    for key in path[:-1]:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+    target[path[-1]] = value
+
+
+class _ScenarioPlanner:
+    """Fills in mocks and input so that a scenario takes the Choice branches on its path."""
+
+    def __init__(self, definition: Dict[str, Any], executor: LocalWorkflowExecutor, base_mocks: Dict[str, Any]):
+        self.states = definition['States']
+        self.executor = executor
+        self.base_mocks = base_mocks
+        self.fallback_mocks = {
+            name: base_mocks.get(name) or _default_mock(state)
+            for name, state in self.states.items() if state['Type'] in MOCKED_TYPES
+        }
+
+    def plan(self, edges: List[Edge], base_input: Any) -> Scenario:
+        mocks = {}
+        for edge in edges:
+            state = self.states[edge.source]
+            if state['Type'] not in MOCKED_TYPES:
+                continue
+            if edge.kind == 'catch':
+                mocks[edge.source] = _catch_mock(state, edge)
+            else:
+                mocks[edge.source] = copy.deepcopy(self.fallback_mocks[edge.source])
+        scenario = Scenario(edges, copy.deepcopy(base_input), mocks)
+        for edge in edges:
+            if self.states[edge.source]['Type'] == 'Choice':
+                self._steer(scenario, edge)
+        return scenario
+
+    def _steer(self, scenario: Scenario, edge: Edge) -> None:
+        rules = self.states[edge.source].get('Choices', [])
+        wanted = [(rule, index == edge.index) for index, rule in enumerate(rules)
+                  if edge.kind == 'default' or index <= edge.index]
+        execution = scenario.run(self.executor, self.fallback_mocks)
+        if execution is None:
+            return
+        step = next((step for step in execution.steps if step.state_name == edge.source), None)
+        if step is None:
+            return
+        for rule, outcome in wanted:
+            condition = equality_condition(DEFAULT_CACHE.compile_template(rule['Condition']))
+            if condition is None or condition[0][:2] != ('states', 'input') or len(condition[0]) < 3:
+                continue
+            path, literal = condition[0][2:], condition[1]
+            self._assign(scenario, execution, step, path, literal if outcome else _other_value(literal))
+
+    def _assign(self, scenario, execution, choice_step, path, value) -> None:
+        """Write the value where the Choice input field comes from: an upstream mock result, or the input."""
+        source = choice_step.input.get(path[0]) if isinstance(choice_step.input, Mapping) else None
+        for step in reversed(execution.steps[:execution.steps.index(choice_step)]):
+            result = step.result.inspection.get('result')
+            if source is not None and result is source and step.state_name in scenario.mocks:
+                mock = scenario.mocks[step.state_name]
+                if len(path) == 1:
+                    mock['result'] = value
+                else:
+                    if not isinstance(mock.get('result'), dict):
+                        mock['result'] = {}
+                    _set_path(mock['result'], path[1:], value)
+                return
+        if not isinstance(scenario.input, dict):
+            scenario.input = {}
+        _set_path(scenario.input, path, value)
+
+
+def plan_scenarios(
+    definition: Dict[str, Any],
+    input_data: Any = None,
+    base_mocks: Optional[Dict[str, Any]] = None
+) -> List[Scenario]:
+    """
+    Build one scenario per path of the minimum edge cover of the top-level graph, and run each one.
+
+    Task, Map and Parallel states on a path get their base mock (or an empty
+    result) when the path leaves them by Next, and an errorOutput their
+    catcher handles when it leaves by Catch. Choice branches are steered for
+    simple ``<field path> = <literal>`` conditions by writing the field into
+    the mock result or execution input it comes from. Check
+    Scenario.verified for the scenarios that followed their planned path.
+
+    Usage example:
+    for scenario in plan_scenarios(definition, order_input, HAPPY_PATH_MOCKS):
+        assert scenario.verified, scenario.name
+    """
+    executor = LocalWorkflowExecutor(definition)
+    planner = _ScenarioPlanner(definition, executor, base_mocks or {})
+    scenarios = []
+    for edges in StateGraph(definition).edge_cover():
+        scenario = planner.plan(edges, input_data if input_data is not None else {})
+        scenario.run(executor, planner.fallback_mocks)
+        scenarios.append(scenario)
+    return scenarios
@@ -0,0 +1,377 @@
+"""
+Replay of exported production execution histories against the current definition.
+
+Each file in a directory is one execution history as exported by
+``aws stepfunctions get-execution-history`` (an object with an ``events``
+array, or a bare array of events). Events are read one at a time with an
+incremental decoder, so memory stays bounded by the largest event (at most
+MAX_EVENT_SIZE characters) and the number of concurrently open states,
+however big the export is.
+
+Task states are rebuilt from their events by following ``previousEventId``
+chains from TaskStateEntered, which keeps interleaved Parallel branches and
+Map iterations apart. Every task attempt becomes one ReplayCall with the
+recorded input, the recorded result or error as the mock and the retry
+count as ``retrierRetryCount``:
+
+- a failed attempt followed by another one is expected to be RETRIABLE;
+- a successful last attempt is expected to be SUCCEEDED;
+- a failed last attempt is CAUGHT_ERROR when the state still exited, or
+  FAILED when the failure ended the execution or branch.
+
+The expected nextState is the state entered right after TaskStateExited,
+and the expected output is the recorded exit output. HistoryReplayer runs
+the calls in bounded chunks through a runner's execute_batch and reports
+the calls whose status, nextState or output diverge.
+"""
+
+import glob
+import json
+import os
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_CHUNK_SIZE = 1 << 20
+
+# Characters an event may span before it is reported as malformed. Events
+# carry at most a 256 KB input or output, so real events are far smaller.
+MAX_EVENT_SIZE = 16 << 20
+
+# Events that end a task attempt with an error, with the key of their details
+_TASK_FAILURE_DETAILS = {
+    'TaskFailed': 'taskFailedEventDetails',
+    'TaskTimedOut': 'taskTimedOutEventDetails',
+    'TaskStartFailed': 'taskStartFailedEventDetails',
+    'TaskSubmitFailed': 'taskSubmitFailedEventDetails',
+}
+
+
+def iter_history_events(path: str, chunk_size: int = _CHUNK_SIZE,
+                        max_event_size: int = MAX_EVENT_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the events of an execution history export one at a time.
+
+    Only the current event and one read chunk are held in memory. An event
+    that still does not decode once max_event_size characters are buffered
+    is malformed: a ValueError names the file and the character offset of
+    the event instead of reading the rest of the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        start = _events_start(buffer)
+        while start is None:
+            chunk = f.read(chunk_size)
+            if not chunk or len(buffer) > max_event_size:
+                raise ValueError(f"{path}: no events array found")
+            buffer += chunk
+            start = _events_start(buffer)
+        # offset is the position in the file of buffer[0]
+        position, offset = start, 0
+        while True:
+            while True:
+                # Skip separators between events
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer):
+                    break
+                offset += len(buffer)
+                buffer, position = f.read(chunk_size), 0
+                if not buffer:
+                    raise ValueError(f"{path}: events array is not closed")
+            if buffer[position] == ']':
+                return
+            try:
+                event, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # The event may run past the buffer: read more and decode it again, up to max_event_size
+                pending = len(buffer) - position
+                chunk = f.read(chunk_size) if pending <= max_event_size else ''
+                if not chunk:
+                    reason = ('the file ends inside it' if pending <= max_event_size
+                              else f"it does not decode within {max_event_size} characters")
+                    raise ValueError(f"{path}: malformed event at offset {offset + position}, "
+                                     f"{reason}: {error.msg}") from error
+                offset += position
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield event
+            position = end
+            if position > chunk_size:
+                offset += position
+                buffer, position = buffer[position:], 0
+
+
+def _events_start(buffer: str) -> Optional[int]:
+    """The index just past the '[' that opens the events array, or None if it is not in the buffer yet."""
+    stripped = buffer.lstrip()
+    if stripped.startswith('['):
+        return len(buffer) - len(stripped) + 1
+    key = buffer.find('"events"')
+    if key < 0:
+        return None
+    bracket = buffer.find('[', key)
+    return bracket + 1 if bracket >= 0 else None
+
+
+class ReplayCall:
+    """One TestState call rebuilt from history, with the outcome production recorded."""
+
+    __slots__ = ('source', 'state_name', 'input', 'result', 'error', 'retry_count', 'expected_status',
+                 'expected_next_state', 'expected_output')
+
+    def __init__(self, source: str, state_name: str, state_input: Any, result: Optional[str] = None,
+                 error: Optional[Dict[str, str]] = None, retry_count: int = 0, expected_status: str = 'SUCCEEDED',
+                 expected_next_state: Optional[str] = None, expected_output: Optional[str] = None):
+        self.source = source
+        self.state_name = state_name
+        self.input = state_input
+        self.result = result
+        self.error = error
+        self.retry_count = retry_count
+        self.expected_status = expected_status
+        self.expected_next_state = expected_next_state
+        self.expected_output = expected_output
+
+    def to_spec(self) -> Dict[str, Any]:
+        """The StepFunctionTestRunner.execute_batch spec for this call."""
+        spec: Dict[str, Any] = {'state_name': self.state_name, 'input_data': self.input}
+        if self.error is not None:
+            spec['mock_error'] = {'Error': self.error['error'], 'Cause': self.error['cause']}
+        elif self.result is not None:
+            spec['mock_result'] = self.result
+        if self.retry_count:
+            spec['state_config'] = {'retrierRetryCount': self.retry_count}
+        return spec
+
+    def diverging_fields(self, response: Dict[str, Any]) -> List[str]:
+        """The fields of a TestState response that differ from what production recorded."""
+        fields = []
+        if response.get('status') != self.expected_status:
+            fields.append('status')
+        if response.get('nextState') != self.expected_next_state:
+            fields.append('nextState')
+        if self.expected_output is not None:
+            actual = response.get('output')
+            if actual is None or json.loads(actual) != json.loads(self.expected_output):
+                fields.append('output')
+        return fields
+
+    def __repr__(self):
+        return f"ReplayCall({self.source!r}, {self.state_name!r}, expected_status={self.expected_status!r})"
+
+
+class _TaskInstance:
+    """The events of one Task state from TaskStateEntered on."""
+
+    __slots__ = ('source', 'state_name', 'input', 'attempts', 'exit_output')
+
+    def __init__(self, source: str, state_name: str, state_input: Any):
+        self.source = source
+        self.state_name = state_name
+        self.input = state_input
+        # ('result', output text) or ('error', {'error': ..., 'cause': ...}) per attempt
+        self.attempts: List[Tuple[str, Any]] = []
+        self.exit_output: Optional[str] = None
+
+    def calls(self, next_state: Optional[str]) -> List[ReplayCall]:
+        calls = []
+        for number, (kind, value) in enumerate(self.attempts):
+            last = number == len(self.attempts) - 1
+            source = f"{self.source}#{self.state_name}[{number}]"
+            if kind == 'result':
+                calls.append(ReplayCall(source, self.state_name, self.input, result=value, retry_count=number,
+                                        expected_next_state=next_state, expected_output=self.exit_output))
+            elif not last:
+                calls.append(ReplayCall(source, self.state_name, self.input, error=value, retry_count=number,
+                                        expected_status='RETRIABLE'))
+            elif self.exit_output is not None:
+                calls.append(ReplayCall(source, self.state_name, self.input, error=value, retry_count=number,
+                                        expected_status='CAUGHT_ERROR', expected_next_state=next_state,
+                                        expected_output=self.exit_output))
+            else:
+                calls.append(ReplayCall(source, self.state_name, self.input, error=value, retry_count=number,
+                                        expected_status='FAILED'))
+        return calls
+
+
+def history_calls(path: str, chunk_size: int = _CHUNK_SIZE,
+                  max_event_size: int = MAX_EVENT_SIZE) -> Iterator[ReplayCall]:
+    """
+    Yield the ReplayCalls of one execution history file, as each Task state completes.
+
+    Task states whose recorded input, task result or exit output was
+    truncated in the export are skipped.
+    """
+    source = os.path.basename(path)
+    # Open Task states, keyed by the id of their latest event
+    open_tasks: Dict[int, _TaskInstance] = {}
+    for event in iter_history_events(path, chunk_size, max_event_size):
+        event_type = event.get('type', '')
+        task = open_tasks.pop(event.get('previousEventId'), None)
+        if task is not None:
+            if event_type == 'TaskSucceeded':
+                details = event.get('taskSucceededEventDetails', {})
+                if details.get('outputDetails', {}).get('truncated'):
+                    # A truncated result can be neither mocked nor parsed
+                    task = None
+                else:
+                    task.attempts.append(('result', details.get('output', 'null')))
+            elif event_type in _TASK_FAILURE_DETAILS:
+                details = event.get(_TASK_FAILURE_DETAILS[event_type], {})
+                task.attempts.append(('error', {'error': details.get('error', ''), 'cause': details.get('cause', '')}))
+            elif event_type == 'TaskStateExited':
+                details = event.get('stateExitedEventDetails', {})
+                if details.get('outputDetails', {}).get('truncated'):
+                    task = None
+                else:
+                    task.exit_output = details.get('output')
+            elif event_type == 'TaskStateAborted':
+                task = None
+            elif task.exit_output is not None:
+                # The event after the exit names the next state, or ends the execution, branch or iteration
+                next_state = event['stateEnteredEventDetails']['name'] if event_type.endswith('StateEntered') else None
+                yield from task.calls(next_state)
+                task = None
+            elif task.attempts and task.attempts[-1][0] == 'error' and not event_type.startswith('Task'):
+                # An uncaught failure ends the execution, branch or iteration
+                yield from task.calls(None)
+                task = None
+            if task is not None:
+                open_tasks[event['id']] = task
+        if event_type == 'TaskStateEntered':
+            details = event.get('stateEnteredEventDetails', {})
+            if not details.get('inputDetails', {}).get('truncated'):
+                open_tasks[event['id']] = _TaskInstance(source, details['name'], json.loads(details.get('input', '{}')))
+    for task in open_tasks.values():
+        if task.exit_output is not None:
+            yield from task.calls(None)
+
+
+def directory_calls(directory: str, pattern: str = '*.json', chunk_size: int = _CHUNK_SIZE,
+                    max_event_size: int = MAX_EVENT_SIZE) -> Iterator[ReplayCall]:
+    """Yield the ReplayCalls of every history file in a directory, file by file in name order."""
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        yield from history_calls(path, chunk_size, max_event_size)
+
+
+class Divergence:
+    """A replayed call whose response differs from production."""
+
+    __slots__ = ('call', 'fields', 'response')
+
+    def __init__(self, call: ReplayCall, fields: List[str], response: Dict[str, Any]):
+        self.call = call
+        self.fields = fields
+        self.response = response
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'source': self.call.source,
+            'state': self.call.state_name,
+            'fields': self.fields,
+            'expected': {'status': self.call.expected_status, 'nextState': self.call.expected_next_state,
+                         'output': self.call.expected_output},
+            'actual': {'status': self.response.get('status'), 'nextState': self.response.get('nextState'),
+                       'output': self.response.get('output'), 'error': self.response.get('error')}
+        }
+
+
+class ReplayReport:
+    """Counts of replayed and diverging calls per state, with the first divergences kept for inspection."""
+
+    def __init__(self, max_divergences_kept: int = 100):
+        self.max_divergences_kept = max_divergences_kept
+        self.total = 0
+        self.diverged = 0
+        self.calls_per_state: Counter = Counter()
+        self.divergences_per_state: Counter = Counter()
+        self.divergences_per_field: Counter = Counter()
+        self.divergences: List[Divergence] = []
+
+    def add(self, call: ReplayCall, response: Dict[str, Any]) -> Optional[Divergence]:
+        self.total += 1
+        self.calls_per_state[call.state_name] += 1
+        fields = call.diverging_fields(response)
+        if not fields:
+            return None
+        divergence = Divergence(call, fields, response)
+        self.diverged += 1
+        self.divergences_per_state[call.state_name] += 1
+        self.divergences_per_field.update(fields)
+        if len(self.divergences) < self.max_divergences_kept:
+            self.divergences.append(divergence)
+        return divergence
+
+    def assert_no_divergence(self) -> 'ReplayReport':
+        assert not self.diverged, f"{self.diverged} of {self.total} replayed calls diverged:\n{self.to_table()}"
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total': self.total,
+            'diverged': self.diverged,
+            'states': {
+                state: {'calls': calls, 'diverged': self.divergences_per_state[state]}
+                for state, calls in sorted(self.calls_per_state.items())
+            },
+            'fields': dict(self.divergences_per_field),
+            'divergences': [divergence.to_dict() for divergence in self.divergences]
+        }
+
+    def to_table(self) -> str:
+        """Render calls and divergences per state, then the first divergences kept."""
+        lines = [f"{'state':<32} {'calls':>8} {'diverged':>9}"]
+        for state, calls in sorted(self.calls_per_state.items()):
+            lines.append(f"{state:<32} {calls:>8} {self.divergences_per_state[state]:>9}")
+        for divergence in self.divergences:
+            lines.append(f"{divergence.call.source}: {', '.join(divergence.fields)} "
+                         f"(expected {divergence.call.expected_status} -> {divergence.call.expected_next_state}, "
+                         f"got {divergence.response.get('status')} -> {divergence.response.get('nextState')})")
+        return '\n'.join(lines)
+
+
+class HistoryReplayer:
+    """
+    Replays ReplayCalls through a StepFunctionTestRunner, a bounded chunk at a time.
+
+    Usage example:
+    report = HistoryReplayer(runner).replay(directory_calls("exports/"))
+    report.assert_no_divergence()
+    """
+
+    def __init__(self, runner: Any, max_workers: int = 8, chunk_size: int = 256, max_divergences_kept: int = 100):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.max_divergences_kept = max_divergences_kept
+
+    def replay(self, calls: Iterable[ReplayCall],
+               sink: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> ReplayReport:
+        """
+        Run every call and compare it with production.
+
+        Calls run chunk_size at a time on up to max_workers threads, so only
+        one chunk of calls and responses is held at once. sink is called with
+        (index, divergence dict) for every divergence, such as an
+        item_io.JsonLinesWriter.
+        """
+        report = ReplayReport(self.max_divergences_kept)
+        chunk: List[ReplayCall] = []
+        for call in calls:
+            chunk.append(call)
+            if len(chunk) >= self.chunk_size:
+                self._run_chunk(chunk, report, sink)
+                chunk = []
+        if chunk:
+            self._run_chunk(chunk, report, sink)
+        return report
+
+    def _run_chunk(self, chunk: List[ReplayCall], report: ReplayReport,
+                   sink: Optional[Callable[[int, Dict[str, Any]], None]]) -> None:
+        runners = self.runner.execute_batch([call.to_spec() for call in chunk], max_workers=self.max_workers)
+        for call, runner in zip(chunk, runners):
+            divergence = report.add(call, runner.get_response())
+            if divergence is not None and sink is not None:
+                sink(report.diverged - 1, divergence.to_dict())
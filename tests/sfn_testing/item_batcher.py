@@ -0,0 +1,79 @@
+"""
+ItemBatcher emulation for the local Map simulator.
+
+With an ItemBatcher, a Map hands each child execution a batch of items:
+{"Items": [...]} plus the fields of BatchInput. Batches are cut at
+MaxItemsPerBatch items or before they would exceed MaxInputBytesPerBatch
+bytes of serialized input, whichever comes first. Batching happens lazily
+as items are read, and each item is serialized only once to measure it.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .emulator import StateError
+from .jsonata import DEFAULT_CACHE, ExpressionCache
+from .overlay import json_default
+
+# Largest batch input the service accepts
+MAX_INPUT_BYTES_PER_BATCH = 256 * 1024
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=json_default).encode('utf-8'))
+
+
+class ItemBatcher:
+    """
+    Groups Map items into batch inputs.
+
+    Usage example:
+    batcher = ItemBatcher(max_items_per_batch=25)
+    for batch in batcher.batches(items):
+        run_child(batcher.batch_input(batch))
+    """
+
+    def __init__(self, max_items_per_batch: Optional[int] = None, max_input_bytes_per_batch: Optional[int] = None,
+                 batch_input: Optional[Dict[str, Any]] = None):
+        if not max_items_per_batch and not max_input_bytes_per_batch:
+            raise ValueError('An ItemBatcher needs MaxItemsPerBatch, MaxInputBytesPerBatch or both')
+        self.max_items_per_batch = max_items_per_batch
+        self.max_input_bytes_per_batch = min(max_input_bytes_per_batch or MAX_INPUT_BYTES_PER_BATCH,
+                                             MAX_INPUT_BYTES_PER_BATCH)
+        self.batch_input_fields = batch_input or {}
+        # Bytes of {"Items":[]} plus the BatchInput fields, before any item is added
+        self._empty_bytes = _size(self.batch_input([]))
+
+    @classmethod
+    def from_state(cls, item_batcher: Dict[str, Any], states: Dict[str, Any],
+                   cache: ExpressionCache = DEFAULT_CACHE) -> 'ItemBatcher':
+        """Build a batcher from a Map state's ItemBatcher field, evaluating any JSONata templates in it."""
+        fields = cache.compile_template(item_batcher).evaluate({'states': states})
+        return cls(fields.get('MaxItemsPerBatch'), fields.get('MaxInputBytesPerBatch'), fields.get('BatchInput'))
+
+    def batch_input(self, items: List[Any]) -> Dict[str, Any]:
+        """The input a child execution receives for one batch."""
+        return dict(self.batch_input_fields, Items=items)
+
+    def batches(self, items: Iterable[Any]) -> Iterator[List[Any]]:
+        """Yield lists of items, each within both limits."""
+        batch: List[Any] = []
+        size = self._empty_bytes
+        for item in items:
+            item_size = _size(item)
+            if self._empty_bytes + item_size > self.max_input_bytes_per_batch:
+                raise StateError(
+                    'States.ItemReaderFailed',
+                    f"An item of {item_size} bytes does not fit in MaxInputBytesPerBatch "
+                    f"({self.max_input_bytes_per_batch})"
+                )
+            # Every item after the first adds a comma
+            added = item_size + (1 if batch else 0)
+            if batch and (size + added > self.max_input_bytes_per_batch
+                          or len(batch) == self.max_items_per_batch):
+                yield batch
+                batch, size, added = [], self._empty_bytes, item_size
+            batch.append(item)
+            size += added
+        if batch:
+            yield batch
@@ -0,0 +1,138 @@
+"""
+Streaming item readers and result writers for the local Map simulator.
+
+They stand in for a DISTRIBUTED Map's ItemReader and ResultWriter. Readers
+yield one item at a time from a JSON Lines or CSV file, so an order with
+millions of items is never loaded at once. JsonLinesWriter appends one
+line per item result as the simulator releases it, in item order.
+
+Read and write errors are raised as States.ItemReaderFailed and
+States.ResultWriterFailed. The Map state's Retry and Catch then handle
+them as they would in a real Map Run.
+"""
+
+import csv
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+from .emulator import StateError
+from .overlay import json_default
+
+ITEM_READER_FAILED = 'States.ItemReaderFailed'
+RESULT_WRITER_FAILED = 'States.ResultWriterFailed'
+
+
+class JsonLinesReader:
+    """Items from a JSON Lines file, one JSON value per non-blank line."""
+
+    def __init__(self, path: str, max_items: Optional[int] = None):
+        self.path = path
+        self.max_items = max_items
+
+    def __iter__(self) -> Iterator[Any]:
+        count = 0
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for number, line in enumerate(f, 1):
+                    if self.max_items is not None and count >= self.max_items:
+                        return
+                    if not line.strip():
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except ValueError as error:
+                        raise StateError(ITEM_READER_FAILED, f"{self.path}:{number}: {error}") from error
+                    count += 1
+                    yield item
+        except OSError as error:
+            raise StateError(ITEM_READER_FAILED, f"{self.path}: {error}") from error
+
+
+class CsvReader:
+    """
+    Items from a CSV file, one object per row with string values.
+
+    Column names come from the first row, or from ``headers`` when given
+    (CSVHeaderLocation FIRST_ROW or GIVEN).
+    """
+
+    def __init__(self, path: str, headers: Optional[List[str]] = None, delimiter: str = ',',
+                 max_items: Optional[int] = None):
+        self.path = path
+        self.headers = headers
+        self.delimiter = delimiter
+        self.max_items = max_items
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        try:
+            with open(self.path, newline='', encoding='utf-8') as f:
+                rows = csv.reader(f, delimiter=self.delimiter)
+                headers = self.headers or next(rows, None) or []
+                for count, row in enumerate(rows):
+                    if self.max_items is not None and count >= self.max_items:
+                        return
+                    if len(row) != len(headers):
+                        raise StateError(
+                            ITEM_READER_FAILED,
+                            f"{self.path}:{rows.line_num}: expected {len(headers)} columns, got {len(row)}"
+                        )
+                    yield dict(zip(headers, row))
+        except (OSError, csv.Error) as error:
+            raise StateError(ITEM_READER_FAILED, f"{self.path}: {error}") from error
+
+
+def item_reader(path: str, reader_config: Optional[Dict[str, Any]] = None):
+    """
+    Build a reader from an ASL ItemReader ReaderConfig.
+
+    InputType JSONL (the default here) or CSV is supported, with
+    CSVHeaderLocation, CSVHeaders, CSVDelimiter and MaxItems.
+    """
+    config = reader_config or {}
+    input_type = config.get('InputType', 'JSONL')
+    if input_type == 'JSONL':
+        return JsonLinesReader(path, max_items=config.get('MaxItems'))
+    if input_type == 'CSV':
+        headers = config.get('CSVHeaders') if config.get('CSVHeaderLocation') == 'GIVEN' else None
+        delimiter = {'COMMA': ',', 'PIPE': '|', 'SEMICOLON': ';', 'SPACE': ' ', 'TAB': '\t'}[
+            config.get('CSVDelimiter', 'COMMA')
+        ]
+        return CsvReader(path, headers=headers, delimiter=delimiter, max_items=config.get('MaxItems'))
+    raise ValueError(f"Unsupported ItemReader InputType {input_type}")
+
+
+class JsonLinesWriter:
+    """
+    Result sink that appends one JSON line per item, in item order.
+
+    Usage example:
+    with JsonLinesWriter("results.jsonl") as writer:
+        simulator.run(order_input, mocks, items=JsonLinesReader("items.jsonl"), keep_results=False, sink=writer)
+    """
+
+    def __init__(self, path: str, include_index: bool = False):
+        self.path = path
+        self.include_index = include_index
+        self.written = 0
+        self._file = None
+
+    def __call__(self, index: int, output: Any) -> None:
+        record = {'index': index, 'output': output} if self.include_index else output
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write(json.dumps(record, separators=(',', ':'), default=json_default) + '\n')
+        except (OSError, TypeError, ValueError) as error:
+            raise StateError(RESULT_WRITER_FAILED, f"{self.path}: {error}") from error
+        self.written += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'JsonLinesWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
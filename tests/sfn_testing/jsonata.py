@@ -0,0 +1,890 @@
+"""
+Minimal JSONata evaluator for the "{% ... %}" templates used in ASL definitions.
+
+Supports the subset of JSONata that Step Functions definitions typically use:
+path navigation, literals, array/object constructors, comparison, boolean and
+arithmetic operators, the conditional operator, predicates and a handful of
+built-in functions such as $merge and $string.
+"""
+
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .overlay import Overlay, merge_objects
+
+
+class _Undefined:
+    """Sentinel for JSONata's 'undefined' (no value), distinct from JSON null."""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __repr__(self):
+        return 'UNDEFINED'
+
+    def __bool__(self):
+        return False
+
+
+UNDEFINED = _Undefined()
+
+TEMPLATE_PATTERN = re.compile(r'^\s*\{%(.*)%\}\s*$', re.DOTALL)
+
+
+class JSONataError(Exception):
+    """Raised when an expression cannot be parsed or evaluated."""
+
+
+# Python errors a function or operator raises on arguments of the wrong type or range
+_EVALUATION_ERRORS = (TypeError, ValueError, AttributeError, ZeroDivisionError)
+
+
+# ============================================================================
+# Tokenizer
+# ============================================================================
+
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<variable>\$\$?[A-Za-z0-9_]*)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<backtick>`[^`]*`)
+  | (?P<operator>!=|<=|>=|[.\[\]{}(),:=<>+\-*/%&?;])
+''', re.VERBOSE)
+
+_KEYWORDS = {'and', 'or', 'in', 'true', 'false', 'null'}
+
+
+def _unescape(raw: str) -> str:
+    body = raw[1:-1]
+    if raw[0] == "'":
+        body = body.replace("\\'", "'").replace('"', '\\"')
+    return json.loads('"' + body + '"')
+
+
+def tokenize(text: str) -> List[tuple]:
+    """Split an expression into (kind, value) tokens."""
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise JSONataError(f"Unexpected character {text[position]!r} at position {position} in {text!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'ws':
+            continue
+        if kind == 'number':
+            tokens.append(('literal', float(value) if any(c in value for c in '.eE') else int(value)))
+        elif kind == 'string':
+            tokens.append(('literal', _unescape(value)))
+        elif kind == 'backtick':
+            tokens.append(('name', value[1:-1]))
+        elif kind == 'name' and value in _KEYWORDS:
+            if value in ('true', 'false', 'null'):
+                tokens.append(('literal', {'true': True, 'false': False, 'null': None}[value]))
+            else:
+                tokens.append(('operator', value))
+        else:
+            tokens.append((kind, value))
+    tokens.append(('end', None))
+    return tokens
+
+
+# ============================================================================
+# AST nodes
+# ============================================================================
+
+class Node:
+    """Base class for expression AST nodes."""
+
+    __slots__ = ()
+
+    def evaluate(self, context: Any, env: 'Environment') -> Any:
+        raise NotImplementedError
+
+
+class Literal(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, context, env):
+        return self.value
+
+
+class Variable(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def evaluate(self, context, env):
+        if self.name == '':
+            return context
+        return env.lookup(self.name)
+
+
+class Name(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def evaluate(self, context, env):
+        return _field(context, self.name)
+
+
+class Path(Node):
+    __slots__ = ('source', 'step')
+
+    def __init__(self, source, step):
+        self.source = source
+        self.step = step
+
+    def evaluate(self, context, env):
+        value = self.source.evaluate(context, env)
+        if value is UNDEFINED:
+            return UNDEFINED
+        if isinstance(value, list):
+            results = []
+            for item in value:
+                _append_flat(results, self.step.evaluate(item, env))
+            return _collapse(results)
+        return self.step.evaluate(value, env)
+
+
+class Filter(Node):
+    __slots__ = ('source', 'predicate')
+
+    def __init__(self, source, predicate):
+        self.source = source
+        self.predicate = predicate
+
+    def evaluate(self, context, env):
+        value = self.source.evaluate(context, env)
+        if value is UNDEFINED:
+            return UNDEFINED
+        items = value if isinstance(value, list) else [value]
+        if isinstance(self.predicate, Literal) and _is_number(self.predicate.value):
+            index = int(math.floor(self.predicate.value))
+            if index < 0:
+                index += len(items)
+            return items[index] if 0 <= index < len(items) else UNDEFINED
+        results = []
+        for position, item in enumerate(items):
+            selector = self.predicate.evaluate(item, env)
+            if _is_number(selector):
+                index = int(math.floor(selector))
+                if index < 0:
+                    index += len(items)
+                if index == position:
+                    results.append(item)
+            elif to_boolean(selector):
+                results.append(item)
+        return _collapse(results)
+
+
+class Call(Node):
+    __slots__ = ('name', 'arguments')
+
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = arguments
+
+    def evaluate(self, context, env):
+        function = FUNCTIONS.get(self.name)
+        if function is None:
+            raise JSONataError(f"Unknown function ${self.name}")
+        arguments = [argument.evaluate(context, env) for argument in self.arguments]
+        try:
+            return function(*arguments)
+        except _EVALUATION_ERRORS as error:
+            raise JSONataError(f"${self.name} failed: {error}") from error
+
+
+class ArrayConstructor(Node):
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def evaluate(self, context, env):
+        results = []
+        for item in self.items:
+            value = item.evaluate(context, env)
+            if value is UNDEFINED:
+                continue
+            if isinstance(item, ArrayConstructor):
+                results.append(value)
+            else:
+                _append_flat(results, value)
+        return results
+
+
+class ObjectConstructor(Node):
+    __slots__ = ('pairs',)
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def evaluate(self, context, env):
+        result = {}
+        for key_node, value_node in self.pairs:
+            key = key_node.evaluate(context, env)
+            if not isinstance(key, str):
+                raise JSONataError(f"Object key must be a string, got {key!r}")
+            value = value_node.evaluate(context, env)
+            if value is not UNDEFINED:
+                result[key] = value
+        return result
+
+
+class Unary(Node):
+    __slots__ = ('operand',)
+
+    def __init__(self, operand):
+        self.operand = operand
+
+    def evaluate(self, context, env):
+        value = self.operand.evaluate(context, env)
+        if value is UNDEFINED:
+            return UNDEFINED
+        if not _is_number(value):
+            raise JSONataError(f"Cannot negate non-number {value!r}")
+        return -value
+
+
+class Binary(Node):
+    __slots__ = ('operator', 'left', 'right')
+
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+    def evaluate(self, context, env):
+        if self.operator == 'and':
+            return to_boolean(self.left.evaluate(context, env)) and to_boolean(self.right.evaluate(context, env))
+        if self.operator == 'or':
+            return to_boolean(self.left.evaluate(context, env)) or to_boolean(self.right.evaluate(context, env))
+        left = self.left.evaluate(context, env)
+        right = self.right.evaluate(context, env)
+        return _BINARY_OPERATORS[self.operator](left, right)
+
+
+class Conditional(Node):
+    __slots__ = ('condition', 'then', 'otherwise')
+
+    def __init__(self, condition, then, otherwise):
+        self.condition = condition
+        self.then = then
+        self.otherwise = otherwise
+
+    def evaluate(self, context, env):
+        if to_boolean(self.condition.evaluate(context, env)):
+            return self.then.evaluate(context, env)
+        if self.otherwise is None:
+            return UNDEFINED
+        return self.otherwise.evaluate(context, env)
+
+
+class Block(Node):
+    __slots__ = ('expressions',)
+
+    def __init__(self, expressions):
+        self.expressions = expressions
+
+    def evaluate(self, context, env):
+        result = UNDEFINED
+        for expression in self.expressions:
+            result = expression.evaluate(context, env)
+        return result
+
+
+# ============================================================================
+# Parser (Pratt / top-down operator precedence)
+# ============================================================================
+
+_BINDING_POWER = {
+    '.': 75, '[': 80,
+    '*': 60, '/': 60, '%': 60,
+    '+': 50, '-': 50, '&': 50,
+    '=': 40, '!=': 40, '<': 40, '<=': 40, '>': 40, '>=': 40, 'in': 40,
+    'and': 30, 'or': 25, '?': 20,
+}
+
+
+class _Parser:
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self) -> tuple:
+        return self.tokens[self.position]
+
+    def advance(self, expected: Optional[str] = None) -> tuple:
+        token = self.tokens[self.position]
+        if expected is not None and token[1] != expected:
+            raise JSONataError(f"Expected {expected!r} but found {token[1]!r} in {self.text!r}")
+        self.position += 1
+        return token
+
+    def parse(self) -> Node:
+        node = self.expression(0)
+        if self.peek()[0] != 'end':
+            raise JSONataError(f"Unexpected token {self.peek()[1]!r} in {self.text!r}")
+        return node
+
+    def expression(self, right_binding: int) -> Node:
+        left = self.prefix(self.advance())
+        while True:
+            kind, value = self.peek()
+            if kind != 'operator' or _BINDING_POWER.get(value, 0) <= right_binding:
+                return left
+            self.advance()
+            left = self.infix(value, left)
+
+    def prefix(self, token: tuple) -> Node:
+        kind, value = token
+        if kind == 'literal':
+            return Literal(value)
+        if kind == 'name':
+            return Name(value)
+        if kind == 'variable':
+            name = value[1:]
+            if self.peek()[1] == '(':
+                self.advance()
+                return Call(name, self.sequence(')'))
+            return Variable(name)
+        if kind == 'operator':
+            if value == '-':
+                return Unary(self.expression(70))
+            if value == '(':
+                expressions = [self.expression(0)]
+                while self.peek()[1] == ';':
+                    self.advance()
+                    expressions.append(self.expression(0))
+                self.advance(')')
+                return expressions[0] if len(expressions) == 1 else Block(expressions)
+            if value == '[':
+                return ArrayConstructor(self.sequence(']'))
+            if value == '{':
+                return ObjectConstructor(self.pairs())
+        raise JSONataError(f"Unexpected token {value!r} in {self.text!r}")
+
+    def infix(self, operator: str, left: Node) -> Node:
+        if operator == '.':
+            return Path(left, self.expression(_BINDING_POWER['.']))
+        if operator == '[':
+            if self.peek()[1] == ']':
+                self.advance()
+                return left
+            predicate = self.expression(0)
+            self.advance(']')
+            return Filter(left, predicate)
+        if operator == '?':
+            then = self.expression(0)
+            otherwise = None
+            if self.peek()[1] == ':':
+                self.advance()
+                otherwise = self.expression(0)
+            return Conditional(left, then, otherwise)
+        if operator in _BINDING_POWER:
+            return Binary(operator, left, self.expression(_BINDING_POWER[operator]))
+        raise JSONataError(f"Unsupported operator {operator!r} in {self.text!r}")
+
+    def sequence(self, closing: str) -> List[Node]:
+        items = []
+        if self.peek()[1] != closing:
+            items.append(self.expression(0))
+            while self.peek()[1] == ',':
+                self.advance()
+                items.append(self.expression(0))
+        self.advance(closing)
+        return items
+
+    def pairs(self) -> List[tuple]:
+        pairs = []
+        if self.peek()[1] != '}':
+            while True:
+                key = self.expression(0)
+                self.advance(':')
+                pairs.append((key, self.expression(0)))
+                if self.peek()[1] != ',':
+                    break
+                self.advance()
+        self.advance('}')
+        return pairs
+
+
+def parse(text: str) -> Node:
+    """Parse a JSONata expression into an AST."""
+    return _Parser(text).parse()
+
+
+# ============================================================================
+# Evaluation
+# ============================================================================
+
+class Environment:
+    """Variable bindings available to an expression (e.g. $states)."""
+
+    __slots__ = ('bindings',)
+
+    def __init__(self, bindings: Optional[Dict[str, Any]] = None):
+        self.bindings = bindings or {}
+
+    def lookup(self, name: str) -> Any:
+        return self.bindings.get(name, UNDEFINED)
+
+
+class ExpressionCache:
+    """
+    Keyed cache of parsed expressions.
+
+    Each distinct expression text is parsed once; later lookups return the
+    same AST. The cache is bounded (least recently used entries are evicted)
+    and safe to share between threads.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._nodes: 'OrderedDict[str, Node]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, expression: str) -> Node:
+        """Return the AST for an expression, parsing it only on the first request."""
+        with self._lock:
+            node = self._nodes.get(expression)
+            if node is not None:
+                self.hits += 1
+                self._nodes.move_to_end(expression)
+                return node
+            self.misses += 1
+        node = parse(expression)
+        with self._lock:
+            self._nodes[expression] = node
+            if len(self._nodes) > self.maxsize:
+                self._nodes.popitem(last=False)
+        return node
+
+    def compile_template(self, value: Any) -> 'Template':
+        """Compile a JSON value that may contain "{% ... %}" templates at any depth."""
+        if isinstance(value, str):
+            match = TEMPLATE_PATTERN.match(value)
+            if match:
+                return ExpressionTemplate(self.compile(match.group(1)))
+            return ConstantTemplate(value)
+        if isinstance(value, dict):
+            fields = [(key, self.compile_template(item)) for key, item in value.items()]
+            if all(isinstance(template, ConstantTemplate) for _, template in fields):
+                return ConstantTemplate(value)
+            return ObjectTemplate(fields)
+        if isinstance(value, list):
+            items = [self.compile_template(item) for item in value]
+            if all(isinstance(template, ConstantTemplate) for template in items):
+                return ConstantTemplate(value)
+            return ArrayTemplate(items)
+        return ConstantTemplate(value)
+
+    def cache_info(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current number of cached expressions."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._nodes), 'maxsize': self.maxsize}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._nodes.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class Template:
+    """A compiled JSON value whose "{% ... %}" strings have been parsed ahead of time."""
+
+    __slots__ = ()
+
+    def evaluate(self, bindings: Optional[Dict[str, Any]] = None) -> Any:
+        return self.evaluate_in(Environment(bindings))
+
+    def evaluate_in(self, env: Environment) -> Any:
+        raise NotImplementedError
+
+
+class ConstantTemplate(Template):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate_in(self, env):
+        return self.value
+
+
+class ExpressionTemplate(Template):
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def evaluate_in(self, env):
+        return self.node.evaluate(UNDEFINED, env)
+
+
+class ObjectTemplate(Template):
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def evaluate_in(self, env):
+        result = {}
+        for key, template in self.fields:
+            value = template.evaluate_in(env)
+            if value is not UNDEFINED:
+                result[key] = value
+        return result
+
+
+class ArrayTemplate(Template):
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def evaluate_in(self, env):
+        return [value for value in (template.evaluate_in(env) for template in self.items) if value is not UNDEFINED]
+
+
+def field_path(node: Node) -> Optional[Tuple[str, ...]]:
+    """
+    Return the variable and field names of a plain navigation such as
+    ``$states.input.order.id`` as ('states', 'input', 'order', 'id'), or None
+    for anything else (filters, function calls, the context value).
+    """
+    if isinstance(node, Variable):
+        return (node.name,) if node.name else None
+    if isinstance(node, Path) and isinstance(node.step, Name):
+        source = field_path(node.source)
+        return source + (node.step.name,) if source is not None else None
+    return None
+
+
+def equality_condition(template: Template) -> Optional[Tuple[Tuple[str, ...], Any]]:
+    """
+    Return (field path, literal) for a template of the form ``{% <field path> = <literal> %}``
+    (either operand order), or None if the template is anything more complex.
+    """
+    if not isinstance(template, ExpressionTemplate):
+        return None
+    node = template.node
+    if not isinstance(node, Binary) or node.operator != '=':
+        return None
+    for path_node, literal_node in ((node.left, node.right), (node.right, node.left)):
+        path = field_path(path_node)
+        if path is not None and isinstance(literal_node, Literal):
+            return path, literal_node.value
+    return None
+
+
+DEFAULT_CACHE = ExpressionCache()
+
+
+def compile_expression(expression: str) -> Node:
+    """Return the cached AST for an expression from the shared DEFAULT_CACHE."""
+    return DEFAULT_CACHE.compile(expression)
+
+
+def compile_template(value: Any) -> Template:
+    """Compile a template value using the shared DEFAULT_CACHE."""
+    return DEFAULT_CACHE.compile_template(value)
+
+
+def evaluate(expression: str, bindings: Optional[Dict[str, Any]] = None) -> Any:
+    """Evaluate a JSONata expression against the given variable bindings."""
+    return compile_expression(expression).evaluate(UNDEFINED, Environment(bindings))
+
+
+def is_template(value: Any) -> bool:
+    """Return True if the value is a "{% ... %}" JSONata template string."""
+    return isinstance(value, str) and TEMPLATE_PATTERN.match(value) is not None
+
+
+def evaluate_template(value: Any, bindings: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Evaluate a JSON value that may contain "{% ... %}" templates at any depth.
+
+    Object fields that evaluate to undefined are omitted, as in JSONata object constructors.
+    Callers that evaluate the same value repeatedly should keep the result of
+    compile_template() instead.
+    """
+    return compile_template(value).evaluate(bindings)
+
+
+# ============================================================================
+# Value helpers
+# ============================================================================
+
+# JSON objects: plain dicts and the Overlays $merge returns
+_OBJECT_TYPES = (dict, Overlay)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _field(context: Any, name: str) -> Any:
+    if isinstance(context, _OBJECT_TYPES):
+        return context.get(name, UNDEFINED)
+    if isinstance(context, list):
+        results = []
+        for item in context:
+            _append_flat(results, _field(item, name))
+        return _collapse(results)
+    return UNDEFINED
+
+
+def _append_flat(results: list, value: Any) -> None:
+    if value is UNDEFINED:
+        return
+    if isinstance(value, list):
+        results.extend(value)
+    else:
+        results.append(value)
+
+
+def _collapse(results: list) -> Any:
+    if not results:
+        return UNDEFINED
+    if len(results) == 1:
+        return results[0]
+    return results
+
+
+def to_boolean(value: Any) -> bool:
+    """Cast a value to boolean using JSONata's truthiness rules."""
+    if value is UNDEFINED or value is None:
+        return False
+    if isinstance(value, list):
+        return any(to_boolean(item) for item in value)
+    if isinstance(value, (dict, Overlay, str)):
+        return len(value) > 0
+    return bool(value)
+
+
+def _equals(left: Any, right: Any) -> bool:
+    if left is UNDEFINED or right is UNDEFINED:
+        return False
+    if isinstance(left, bool) or isinstance(right, bool):
+        return isinstance(left, bool) and isinstance(right, bool) and left == right
+    if _is_number(left) and _is_number(right):
+        return left == right
+    if isinstance(left, _OBJECT_TYPES) and isinstance(right, _OBJECT_TYPES):
+        return left == right
+    if type(left) is not type(right):
+        return False
+    return left == right
+
+
+def _compare(operator: Callable[[Any, Any], bool]) -> Callable[[Any, Any], Any]:
+    def compare(left, right):
+        if left is UNDEFINED or right is UNDEFINED:
+            return False
+        if _is_number(left) and _is_number(right) or isinstance(left, str) and isinstance(right, str):
+            return operator(left, right)
+        raise JSONataError(f"Cannot compare {left!r} with {right!r}")
+    return compare
+
+
+def _arithmetic(symbol: str, operator: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    def arithmetic(left, right):
+        if left is UNDEFINED or right is UNDEFINED:
+            return UNDEFINED
+        if not (_is_number(left) and _is_number(right)):
+            raise JSONataError(f"Arithmetic operands must be numbers, got {left!r} and {right!r}")
+        try:
+            return _normalize_number(operator(left, right))
+        except _EVALUATION_ERRORS as error:
+            raise JSONataError(f"Operator {symbol} failed on {left!r} and {right!r}: {error}") from error
+    return arithmetic
+
+
+def _normalize_number(value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+        return int(value)
+    return value
+
+
+def _concatenate(left: Any, right: Any) -> str:
+    left = '' if left is UNDEFINED else fn_string(left)
+    right = '' if right is UNDEFINED else fn_string(right)
+    return left + right
+
+
+def _contains(left: Any, right: Any) -> bool:
+    if left is UNDEFINED or right is UNDEFINED:
+        return False
+    items = right if isinstance(right, list) else [right]
+    return any(_equals(left, item) for item in items)
+
+
+_BINARY_OPERATORS = {
+    '=': _equals,
+    '!=': lambda left, right: left is not UNDEFINED and right is not UNDEFINED and not _equals(left, right),
+    '<': _compare(lambda left, right: left < right),
+    '<=': _compare(lambda left, right: left <= right),
+    '>': _compare(lambda left, right: left > right),
+    '>=': _compare(lambda left, right: left >= right),
+    '+': _arithmetic('+', lambda left, right: left + right),
+    '-': _arithmetic('-', lambda left, right: left - right),
+    '*': _arithmetic('*', lambda left, right: left * right),
+    '/': _arithmetic('/', lambda left, right: left / right),
+    '%': _arithmetic('%', lambda left, right: math.fmod(left, right)),
+    '&': _concatenate,
+    'in': _contains,
+}
+
+
+def _format_number(value: Any) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value.is_integer() and abs(value) < 1e21:
+        return str(int(value))
+    return format(value, '.15g')
+
+
+def to_json(value: Any) -> str:
+    """Serialize a value the way JSONata's $string does (compact, JS number formatting)."""
+    if _is_number(value):
+        return _format_number(value)
+    if isinstance(value, _OBJECT_TYPES):
+        return '{' + ','.join(json.dumps(key) + ':' + to_json(item) for key, item in value.items()) + '}'
+    if isinstance(value, list):
+        return '[' + ','.join(to_json(item) for item in value) + ']'
+    return json.dumps(value)
+
+
+# ============================================================================
+# Built-in functions
+# ============================================================================
+
+def fn_string(value: Any = UNDEFINED) -> Any:
+    if value is UNDEFINED:
+        return UNDEFINED
+    if isinstance(value, str):
+        return value
+    return to_json(value)
+
+
+def fn_number(value: Any = UNDEFINED) -> Any:
+    if value is UNDEFINED:
+        return UNDEFINED
+    if _is_number(value):
+        return value
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return _normalize_number(float(value))
+        except ValueError:
+            pass
+    raise JSONataError(f"Unable to cast {value!r} to a number")
+
+
+def fn_merge(objects: Any = UNDEFINED) -> Any:
+    if objects is UNDEFINED:
+        return UNDEFINED
+    objects = objects if isinstance(objects, list) else [objects]
+    for item in objects:
+        if not isinstance(item, _OBJECT_TYPES):
+            raise JSONataError(f"$merge expects an array of objects, got {item!r}")
+    return merge_objects(objects)
+
+
+def fn_count(value: Any = UNDEFINED) -> int:
+    if value is UNDEFINED:
+        return 0
+    return len(value) if isinstance(value, list) else 1
+
+
+def fn_sum(value: Any = UNDEFINED) -> Any:
+    if value is UNDEFINED:
+        return UNDEFINED
+    return _normalize_number(sum(value if isinstance(value, list) else [value]))
+
+
+def fn_exists(value: Any = UNDEFINED) -> bool:
+    return value is not UNDEFINED
+
+
+def fn_length(value: Any = UNDEFINED) -> Any:
+    if value is UNDEFINED:
+        return UNDEFINED
+    return len(value)
+
+
+def fn_keys(value: Any = UNDEFINED) -> Any:
+    if isinstance(value, _OBJECT_TYPES):
+        return _collapse(list(value.keys()))
+    return UNDEFINED
+
+
+def fn_lookup(value: Any = UNDEFINED, key: Any = UNDEFINED) -> Any:
+    return _field(value, key)
+
+
+def fn_append(first: Any = UNDEFINED, second: Any = UNDEFINED) -> Any:
+    if first is UNDEFINED:
+        return second
+    if second is UNDEFINED:
+        return first
+    return (first if isinstance(first, list) else [first]) + (second if isinstance(second, list) else [second])
+
+
+def fn_join(values: Any = UNDEFINED, separator: str = '') -> Any:
+    if values is UNDEFINED:
+        return UNDEFINED
+    return separator.join(values if isinstance(values, list) else [values])
+
+
+def fn_not(value: Any = UNDEFINED) -> Any:
+    if value is UNDEFINED:
+        return UNDEFINED
+    return not to_boolean(value)
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    'string': fn_string,
+    'number': fn_number,
+    'boolean': lambda value=UNDEFINED: UNDEFINED if value is UNDEFINED else to_boolean(value),
+    'not': fn_not,
+    'exists': fn_exists,
+    'merge': fn_merge,
+    'count': fn_count,
+    'sum': fn_sum,
+    'max': lambda value=UNDEFINED: UNDEFINED if value is UNDEFINED else max(value if isinstance(value, list) else [value]),
+    'min': lambda value=UNDEFINED: UNDEFINED if value is UNDEFINED else min(value if isinstance(value, list) else [value]),
+    'length': fn_length,
+    'keys': fn_keys,
+    'lookup': fn_lookup,
+    'append': fn_append,
+    'join': fn_join,
+    'uppercase': lambda value=UNDEFINED: UNDEFINED if value is UNDEFINED else value.upper(),
+    'lowercase': lambda value=UNDEFINED: UNDEFINED if value is UNDEFINED else value.lower(),
+    'abs': lambda value=UNDEFINED: UNDEFINED if value is UNDEFINED else abs(value),
+}
@@ -0,0 +1,389 @@
+"""
+Local simulator for Map states.
+
+MapSimulator runs the ItemProcessor of a Map state once per item with the
+local workflow executor, instead of taking the whole result array from a
+mock. A pool of MaxConcurrency worker threads pulls items from the Items
+expression, or from any iterable passed in such as a generator, so at most
+that many item executions are in flight and no per-item futures are
+queued. Results are aggregated in item order as they complete. Workers
+never run more than a fixed window ahead of the oldest unfinished item, so
+at most that many out-of-order results are buffered. With
+keep_results=False and a sink such as item_io.JsonLinesWriter, memory stays
+flat however many items the reader yields.
+
+Errors the reader or the sink raise as StateError (States.ItemReaderFailed,
+States.ResultWriterFailed) stop the run and fail the Map state with that
+error.
+
+Once failures exceed ToleratedFailureCount or ToleratedFailurePercentage
+no further items are started. The Map state then fails with
+States.ExceedToleratedFailureThreshold, which goes through its own Retry
+and Catch like any other error.
+
+An item whose ItemSelector fails fails the ItemProcessor execution that
+would have received it, with States.QueryEvaluationError, and that
+execution counts against the threshold like any other failure.
+
+With an ItemBatcher, from the state or passed to run(), each ItemProcessor
+execution receives a batch of items as {"Items": [...]} plus BatchInput.
+Indices, mocks, results and failures are then per batch, while the
+tolerated failure threshold counts every item of a failed batch, as the
+service does. An item whose ItemSelector fails is batched by its
+unselected value and fails its whole batch.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .emulator import LocalStateEngine, LocalTestStateError, StateError, StateResult, find_state
+from .executor import LocalWorkflowExecutor, MockSpec, WorkflowExecution
+from .item_batcher import ItemBatcher
+from .jsonata import DEFAULT_CACHE, UNDEFINED, ExpressionCache, JSONataError
+from .overlay import to_plain
+
+# Per-item mocks: one table for every item, a sequence indexed by item, or a function of (index, item)
+ItemMocks = Union[Dict[str, MockSpec], Sequence[Dict[str, MockSpec]], Callable[[int, Any], Dict[str, MockSpec]]]
+
+# Worker threads used when MaxConcurrency is 0 (no limit)
+DEFAULT_MAX_CONCURRENCY = 40
+
+# How far, per worker, items may be started ahead of the oldest unfinished one
+READ_AHEAD_PER_WORKER = 4
+
+EXCEED_TOLERATED_FAILURE_THRESHOLD = 'States.ExceedToleratedFailureThreshold'
+
+
+class ItemFailure:
+    """An item whose ItemProcessor execution failed."""
+
+    __slots__ = ('index', 'error', 'cause')
+
+    def __init__(self, index: int, error: Optional[str], cause: Optional[str]):
+        self.index = index
+        self.error = error
+        self.cause = cause
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'index': self.index, 'error': self.error, 'cause': self.cause}
+
+    def __repr__(self):
+        return f"ItemFailure({self.index}, {self.error!r})"
+
+
+class _OrderedResults:
+    """Releases item outputs in index order to an optional list and sink as soon as a prefix is complete."""
+
+    def __init__(self, keep: bool, sink: Optional[Callable[[int, Any], None]]):
+        self.results: Optional[List[Any]] = [] if keep else None
+        self.sink = sink
+        self.next_index = 0
+        self.pending: Dict[int, Any] = {}
+        self.max_pending = 0
+
+    def add(self, index: int, value: Any) -> None:
+        self.pending[index] = value
+        self.max_pending = max(self.max_pending, len(self.pending))
+        while self.next_index in self.pending:
+            value = self.pending.pop(self.next_index)
+            if self.results is not None:
+                self.results.append(value)
+            if self.sink is not None:
+                self.sink(self.next_index, value)
+            self.next_index += 1
+
+
+class MapRun:
+    """
+    The outcome of a simulated Map state: per-item counts and failures, and
+    the Map state's own StateResult after Output, Retry and Catch.
+
+    started, succeeded and failed count ItemProcessor executions, which are
+    batches when an ItemBatcher is used; items and failed_items count items.
+    """
+
+    def __init__(self, state_result: StateResult, started: int, succeeded: int, failures: List[ItemFailure],
+                 failed: int, results: Optional[List[Any]], max_in_flight: int, max_buffered: int = 0,
+                 items: Optional[int] = None, failed_items: Optional[int] = None):
+        self.state_result = state_result
+        self.started = started
+        self.succeeded = succeeded
+        self.failed = failed
+        self.failures = failures
+        self.results = results
+        self.max_in_flight = max_in_flight
+        self.max_buffered = max_buffered
+        self.items = started if items is None else items
+        self.failed_items = failed if failed_items is None else failed_items
+
+    @property
+    def status(self) -> str:
+        return self.state_result.status
+
+    @property
+    def next_state(self) -> Optional[str]:
+        return self.state_result.next_state
+
+    @property
+    def output(self) -> Any:
+        return None if self.state_result.output is UNDEFINED else to_plain(self.state_result.output)
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.state_result.error
+
+    def to_response(self) -> Dict[str, Any]:
+        """Return the TestState-shaped response for the Map state."""
+        return self.state_result.to_response()
+
+    def assert_status(self, expected_status: str) -> 'MapRun':
+        assert self.status == expected_status, (
+            f"Expected {expected_status}, got {self.status} ({self.error}); {self.failed} of {self.started} items failed"
+        )
+        return self
+
+    def assert_next_state(self, expected_next_state: str) -> 'MapRun':
+        assert self.next_state == expected_next_state, f"Expected {expected_next_state}, got {self.next_state}"
+        return self
+
+
+class MapSimulator:
+    """
+    Runs a Map state's ItemProcessor for every item, locally.
+
+    Usage example:
+    run = MapSimulator(definition, 'ProcessOrderItems').run(
+        order_input,
+        item_mocks=lambda index, item: {"ProcessItem": {"result": {"itemId": item["itemId"], "processed": True}}}
+    )
+    run.assert_status("SUCCEEDED").assert_next_state("ParallelProcessing")
+    """
+
+    def __init__(self, definition: Dict[str, Any], state_name: str = 'ProcessOrderItems',
+                 cache: ExpressionCache = DEFAULT_CACHE, max_failures_kept: int = 100):
+        self.state_name = state_name
+        self.state = find_state(definition, state_name)
+        if self.state.get('Type') != 'Map':
+            raise LocalTestStateError(f"State {state_name} is not a Map state")
+        self.processor = self.state.get('ItemProcessor') or self.state.get('Iterator')
+        self.distributed = self.processor.get('ProcessorConfig', {}).get('Mode') == 'DISTRIBUTED'
+        self.engine = LocalStateEngine(definition, cache=cache)
+        self.executor = LocalWorkflowExecutor(self.processor, cache=cache)
+        self.items = cache.compile_template(self.state['Items']) if 'Items' in self.state else None
+        self.item_selector = cache.compile_template(self.state['ItemSelector']) if 'ItemSelector' in self.state else None
+        self.max_failures_kept = max_failures_kept
+        self.cache = cache
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.state.get('MaxConcurrency') or DEFAULT_MAX_CONCURRENCY
+
+    def tolerated_failures(self, total: Optional[int]) -> Optional[float]:
+        """The number of failed items the Map tolerates, or None when it can only be known at the end."""
+        tolerated = []
+        if 'ToleratedFailureCount' in self.state:
+            tolerated.append(self.state['ToleratedFailureCount'])
+        if 'ToleratedFailurePercentage' in self.state:
+            if total is None:
+                return None
+            tolerated.append(total * self.state['ToleratedFailurePercentage'] / 100.0)
+        return min(tolerated) if tolerated else 0
+
+    def run(
+        self,
+        state_input: Any,
+        item_mocks: Optional[ItemMocks] = None,
+        items: Optional[Iterable[Any]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        max_concurrency: Optional[int] = None,
+        keep_results: bool = True,
+        sink: Optional[Callable[[int, Any], None]] = None,
+        state_config: Optional[Dict[str, Any]] = None,
+        item_batcher: Optional[ItemBatcher] = None
+    ) -> MapRun:
+        """
+        Run every item through the ItemProcessor and then the Map state itself.
+
+        Args:
+            state_input: Input of the Map state
+            item_mocks: Mocks for the ItemProcessor states, for all items or per item
+            items: Items to process instead of evaluating the Items expression
+            context: Context object for the Map state and every item execution
+            max_concurrency: Worker count, defaulting to the state's MaxConcurrency
+            keep_results: Collect item outputs for the Map result; when False
+                the Map state's Output is evaluated with an empty result
+            sink: Called with (index, output) for every item, in item order
+            state_config: TestState stateConfiguration for the Map state itself
+            item_batcher: Batch items per ItemProcessor execution, overriding
+                the state's ItemBatcher
+
+        Returns:
+            MapRun with item counts, failures and the Map state's result
+        """
+        states = {'input': state_input, 'context': context or {}}
+        try:
+            if items is None:
+                items = self._evaluate_items(states)
+            if item_batcher is None and 'ItemBatcher' in self.state:
+                item_batcher = ItemBatcher.from_state(self.state['ItemBatcher'], states, self.cache)
+        except JSONataError as error:
+            state_result = self._finish(state_input, context, state_config, None,
+                                        ('States.QueryEvaluationError', str(error)))
+            return MapRun(state_result, 0, 0, [], 0, None, 0)
+        total = len(items) if hasattr(items, '__len__') else None
+        tolerated = self.tolerated_failures(total)
+        workers = max(1, min(max_concurrency or self.max_concurrency, total if total is not None else float('inf')))
+
+        # ItemSelector errors of items not yet handed to an execution, by item index
+        selection_errors: Dict[int, JSONataError] = {}
+        if item_batcher is None:
+            source = enumerate(items)
+        else:
+            # ItemSelector applies to each item before it is batched
+            selected = (self._selected_item(states, index, item, selection_errors) for index, item in enumerate(items))
+            source = enumerate(item_batcher.batch_input(batch) for batch in item_batcher.batches(selected))
+        aggregate = _OrderedResults(keep_results, sink)
+        window = workers * READ_AHEAD_PER_WORKER
+        lock = threading.Condition()
+        stop = threading.Event()
+        counts = {'started': 0, 'succeeded': 0, 'failed': 0, 'items': 0, 'failed_items': 0,
+                  'in_flight': 0, 'max_in_flight': 0}
+        failures: List[ItemFailure] = []
+        # The failure with the lowest index, kept even when max_failures_kept is 0
+        first_failure: List[ItemFailure] = []
+        errors: List[BaseException] = []
+        io_errors: List[StateError] = []
+
+        def fail(error: BaseException) -> None:
+            (io_errors if isinstance(error, StateError) else errors).append(error)
+            stop.set()
+            lock.notify_all()
+
+        def work() -> None:
+            while not stop.is_set():
+                with lock:
+                    while counts['started'] - aggregate.next_index >= window and not stop.is_set():
+                        lock.wait()
+                    if stop.is_set():
+                        return
+                    try:
+                        entry = next(source, None)
+                    except BaseException as error:
+                        fail(error)
+                        return
+                    if entry is None:
+                        return
+                    counts['started'] += 1
+                    counts['in_flight'] += 1
+                    counts['max_in_flight'] = max(counts['max_in_flight'], counts['in_flight'])
+                    index, item = entry
+                    size = 1 if item_batcher is None else len(item['Items'])
+                    positions = range(counts['items'], counts['items'] + size)
+                    counts['items'] += size
+                    failed_selections = [selection_errors.pop(position) for position in positions
+                                         if position in selection_errors]
+                selection_error = failed_selections[0] if failed_selections else None
+                item_input = item
+                if item_batcher is None:
+                    try:
+                        item_input = self._item_input(states, index, item)
+                    except JSONataError as error:
+                        selection_error = error
+                if selection_error is not None:
+                    execution = WorkflowExecution('FAILED', [], error='States.QueryEvaluationError',
+                                                  cause=str(selection_error))
+                else:
+                    try:
+                        execution = self.executor.run(item_input, self._mocks_for(item_mocks, index, item),
+                                                      context=context)
+                    except BaseException as error:
+                        with lock:
+                            fail(error)
+                        return
+                with lock:
+                    counts['in_flight'] -= 1
+                    if execution.status == 'SUCCEEDED':
+                        counts['succeeded'] += 1
+                        output = execution.output
+                    else:
+                        counts['failed'] += 1
+                        counts['failed_items'] += size
+                        failure = ItemFailure(index, execution.error, execution.cause)
+                        if len(failures) < self.max_failures_kept:
+                            failures.append(failure)
+                        if not first_failure or index < first_failure[0].index:
+                            first_failure[:] = [failure]
+                        output = {'Error': execution.error, 'Cause': execution.cause}
+                        if tolerated is not None and counts['failed_items'] > tolerated:
+                            stop.set()
+                    try:
+                        aggregate.add(index, output)
+                    except BaseException as error:
+                        fail(error)
+                        return
+                    lock.notify_all()
+
+        threads = [threading.Thread(target=work, name=f"map-{self.state_name}-{number}") for number in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        failures.sort(key=lambda failure: failure.index)
+        if tolerated is None:
+            tolerated = self.tolerated_failures(counts['items'])
+        error = None
+        if io_errors:
+            error = (io_errors[0].error, io_errors[0].cause)
+        elif counts['failed_items'] > tolerated:
+            if self.distributed or tolerated > 0:
+                error = (EXCEED_TOLERATED_FAILURE_THRESHOLD,
+                         f"{counts['failed_items']} of {counts['items']} items failed; {tolerated:g} tolerated")
+            else:
+                error = (first_failure[0].error, first_failure[0].cause)
+        state_result = self._finish(state_input, context, state_config, aggregate.results, error)
+        return MapRun(state_result, counts['started'], counts['succeeded'], failures, counts['failed'],
+                      aggregate.results, counts['max_in_flight'], aggregate.max_pending,
+                      counts['items'], counts['failed_items'])
+
+    def _evaluate_items(self, states: Dict[str, Any]) -> Iterable[Any]:
+        if self.items is None:
+            items = states['input']
+        else:
+            items = self.items.evaluate({'states': states})
+        if not isinstance(items, list):
+            raise JSONataError(f"The Items field of Map state {self.state_name} must evaluate to an array")
+        return items
+
+    def _item_input(self, states: Dict[str, Any], index: int, item: Any) -> Any:
+        if self.item_selector is None:
+            return item
+        context = dict(states['context'], Map={'Item': {'Index': index, 'Value': item}})
+        return self.item_selector.evaluate({'states': dict(states, context=context)})
+
+    def _selected_item(self, states: Dict[str, Any], index: int, item: Any,
+                       selection_errors: Dict[int, JSONataError]) -> Any:
+        """ItemSelector for an item about to be batched; on failure the item is batched as it is and the error kept."""
+        try:
+            return self._item_input(states, index, item)
+        except JSONataError as error:
+            selection_errors[index] = error
+            return item
+
+    @staticmethod
+    def _mocks_for(item_mocks: Optional[ItemMocks], index: int, item: Any) -> Optional[Dict[str, MockSpec]]:
+        if item_mocks is None or isinstance(item_mocks, dict):
+            return item_mocks
+        if callable(item_mocks):
+            return item_mocks(index, item)
+        return item_mocks[index]
+
+    def _finish(self, state_input: Any, context: Optional[Dict[str, Any]], state_config: Optional[Dict[str, Any]],
+                results: Optional[List[Any]], error: Optional[Tuple[str, str]]) -> StateResult:
+        if error is not None:
+            mock = {'errorOutput': {'error': error[0], 'cause': error[1]}}
+        else:
+            mock = {'result': results if results is not None else []}
+        return self.engine.run(self.state_name, state_input, mock, context, state_config)
@@ -0,0 +1,120 @@
+"""
+Structural sharing for JSONata objects built by $merge.
+
+Almost every Output in the definition has the shape
+``$merge([$states.input, {'x': $states.result}])``. Copying the input into
+a new dict at every state makes a workflow run cost grow with payload size
+times path length. $merge instead returns an Overlay: a read-only mapping
+that holds the new keys and points at the unchanged input, so a merge costs
+O(keys added). Chains are flattened once they get deep, to keep lookups
+cheap.
+
+Overlays compare equal to dicts with the same items. They are turned into
+plain dicts only at the boundary, when a response is serialized or a
+workflow's final output is returned: see to_plain() and json_default().
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List
+
+# Lookups walk at most this many layers before a chain is flattened into a dict
+MAX_OVERLAY_DEPTH = 32
+
+_MISSING = object()
+
+
+class Overlay(Mapping):
+    """
+    A mapping of ``layer`` on top of ``base``; keys in ``layer`` win.
+
+    Keys iterate in the order dict.update would give them: the base keys
+    first, then keys only the layer has.
+    """
+
+    __slots__ = ('base', 'layer', 'depth', '_length')
+
+    def __init__(self, base: Mapping, layer: Dict[str, Any]):
+        if isinstance(base, Overlay) and base.depth >= MAX_OVERLAY_DEPTH:
+            base = base.flatten()
+        self.base = base
+        self.layer = layer
+        self.depth = base.depth + 1 if isinstance(base, Overlay) else 1
+        self._length = len(base) + sum(1 for key in layer if key not in base)
+
+    def flatten(self) -> Dict[str, Any]:
+        """Copy the chain into one dict, applying the layers bottom up."""
+        layers = []
+        node: Mapping = self
+        while isinstance(node, Overlay):
+            layers.append(node.layer)
+            node = node.base
+        flat = dict(node)
+        for layer in reversed(layers):
+            flat.update(layer)
+        return flat
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.layer.get(key, _MISSING)
+        if value is _MISSING:
+            return self.base[key]
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.layer.get(key, _MISSING)
+        if value is _MISSING:
+            return self.base.get(key, default)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.layer or key in self.base
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.base
+        base = self.base
+        for key in self.layer:
+            if key not in base:
+                yield key
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __repr__(self) -> str:
+        return repr(to_plain(self))
+
+
+def merge_objects(objects: List[Mapping]) -> Mapping:
+    """
+    Shallow-merge objects like $merge, sharing the first one instead of copying it.
+
+    Only the keys of the later objects are copied.
+    """
+    if not objects:
+        return {}
+    base = objects[0]
+    layer: Dict[str, Any] = {}
+    for item in objects[1:]:
+        layer.update(item.items() if isinstance(item, Overlay) else item)
+    if not layer:
+        return base
+    return Overlay(base, layer)
+
+
+def to_plain(value: Any) -> Any:
+    """Return the value with every Overlay, at any depth, replaced by a plain dict."""
+    if isinstance(value, Overlay):
+        value = value.flatten()
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, dict):
+        plain = {key: to_plain(item) for key, item in value.items()}
+        return value if all(plain[key] is item for key, item in value.items()) else plain
+    if isinstance(value, list):
+        plain = [to_plain(item) for item in value]
+        return value if all(new is old for new, old in zip(plain, value)) else plain
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """``default`` hook for json.dumps that serializes Overlays as objects."""
+    if isinstance(value, Overlay):
+        return value.flatten()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
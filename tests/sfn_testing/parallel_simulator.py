@@ -0,0 +1,229 @@
+"""
+Local simulator for Parallel states.
+
+ParallelSimulator runs every branch of a Parallel state as its own local
+workflow on its own thread, instead of taking the branch results from one
+mock array. As soon as a branch fails, for example by reaching
+PaymentFailed or InventoryFailed, the sibling branches are cancelled before
+their next state. Simulated task latencies are cut short by the
+cancellation. The branch failure is then raised on the Parallel state as
+States.BranchFailed and goes through its Retry and Catch; each RETRIABLE
+decision re-runs all branches as a new attempt. Every attempt keeps
+per-branch start and end times for the trace.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .emulator import LocalStateEngine, LocalTestStateError, StateResult, find_state
+from .executor import LocalWorkflowExecutor, MockSpec, WorkflowExecution
+from .jsonata import DEFAULT_CACHE, UNDEFINED, ExpressionCache
+from .overlay import to_plain
+
+# Mocks for the branch states (names are unique across branches), or a function of the attempt number
+BranchMocks = Union[Dict[str, MockSpec], Callable[[int], Dict[str, MockSpec]]]
+
+BRANCH_FAILED = 'States.BranchFailed'
+
+
+class BranchRun:
+    """One branch of one attempt, with its execution and timing relative to the attempt start."""
+
+    __slots__ = ('index', 'execution', 'started', 'finished')
+
+    def __init__(self, index: int, execution: WorkflowExecution, started: float, finished: float):
+        self.index = index
+        self.execution = execution
+        self.started = started
+        self.finished = finished
+
+    @property
+    def status(self) -> str:
+        return self.execution.status
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'branch': self.index,
+            'status': self.status,
+            'path': self.execution.path,
+            'error': self.execution.error,
+            'startMs': round(self.started * 1000, 3),
+            'durationMs': round(self.duration * 1000, 3),
+        }
+
+    def __repr__(self):
+        return f"BranchRun({self.index}, status={self.status!r}, path={self.execution.path!r})"
+
+
+def _first_failure(branches: List[BranchRun]) -> Optional[BranchRun]:
+    failed = [branch for branch in branches if branch.status == 'FAILED']
+    return min(failed, key=lambda branch: branch.finished) if failed else None
+
+
+class ParallelAttempt:
+    """All branches of one attempt of the Parallel state, and the state's result for that attempt."""
+
+    __slots__ = ('number', 'branches', 'state_result')
+
+    def __init__(self, number: int, branches: List[BranchRun], state_result: StateResult):
+        self.number = number
+        self.branches = branches
+        self.state_result = state_result
+
+    @property
+    def failed_branch(self) -> Optional[BranchRun]:
+        """The branch that failed first; its siblings were cancelled."""
+        return _first_failure(self.branches)
+
+
+class ParallelRun:
+    """The attempts of a simulated Parallel state; the last one decides the outcome."""
+
+    def __init__(self, attempts: List[ParallelAttempt]):
+        self.attempts = attempts
+
+    @property
+    def state_result(self) -> StateResult:
+        return self.attempts[-1].state_result
+
+    @property
+    def status(self) -> str:
+        return self.state_result.status
+
+    @property
+    def next_state(self) -> Optional[str]:
+        return self.state_result.next_state
+
+    @property
+    def output(self) -> Any:
+        return None if self.state_result.output is UNDEFINED else to_plain(self.state_result.output)
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.state_result.error
+
+    @property
+    def branches(self) -> List[BranchRun]:
+        return self.attempts[-1].branches
+
+    def trace(self) -> List[Dict[str, Any]]:
+        """One entry per branch per attempt, with status, path and timing."""
+        return [dict(branch.to_dict(), attempt=attempt.number, attemptStatus=attempt.state_result.status)
+                for attempt in self.attempts for branch in attempt.branches]
+
+    def to_response(self) -> Dict[str, Any]:
+        """Return the TestState-shaped response for the last attempt of the Parallel state."""
+        return self.state_result.to_response()
+
+    def assert_status(self, expected_status: str) -> 'ParallelRun':
+        assert self.status == expected_status, f"Expected {expected_status}, got {self.status} ({self.error})"
+        return self
+
+    def assert_next_state(self, expected_next_state: str) -> 'ParallelRun':
+        assert self.next_state == expected_next_state, f"Expected {expected_next_state}, got {self.next_state}"
+        return self
+
+
+class ParallelSimulator:
+    """
+    Runs a Parallel state's branches concurrently, locally.
+
+    Usage example:
+    run = ParallelSimulator(definition, 'ParallelProcessing').run(order_input, {
+        "ProcessPayment": {"result": {"paymentId": "pay-1"}},
+        "UpdateInventory": {"result": {"inventoryUpdated": True}}
+    })
+    run.assert_status("SUCCEEDED").assert_next_state("WaitForApproval")
+    """
+
+    def __init__(self, definition: Dict[str, Any], state_name: str = 'ParallelProcessing',
+                 cache: ExpressionCache = DEFAULT_CACHE, branch_error: Optional[str] = BRANCH_FAILED):
+        self.state_name = state_name
+        self.state = find_state(definition, state_name)
+        if self.state.get('Type') != 'Parallel':
+            raise LocalTestStateError(f"State {state_name} is not a Parallel state")
+        self.engine = LocalStateEngine(definition, cache=cache)
+        self.executors = [LocalWorkflowExecutor(branch, cache=cache) for branch in self.state['Branches']]
+        self.arguments = cache.compile_template(self.state['Arguments']) if 'Arguments' in self.state else None
+        self.branch_error = branch_error
+
+    def run(
+        self,
+        state_input: Any,
+        mocks: Optional[BranchMocks] = None,
+        context: Optional[Dict[str, Any]] = None,
+        latencies: Optional[Dict[str, float]] = None,
+        max_attempts: int = 100
+    ) -> ParallelRun:
+        """
+        Run the branches, retrying the whole Parallel state while its Retry allows.
+
+        Args:
+            state_input: Input of the Parallel state
+            mocks: Mocks for the branch states, or a function of the attempt number
+                (0 for the first run) returning them
+            context: Context object for the Parallel state and every branch
+            latencies: Seconds each named branch state takes, to observe cancellation
+            max_attempts: Safety bound on the number of attempts
+
+        Returns:
+            ParallelRun with every attempt's branches and the final state result
+        """
+        attempts = []
+        for number in range(max_attempts):
+            branch_mocks = mocks(number) if callable(mocks) else mocks
+            branches = self._run_branches(state_input, branch_mocks, context, latencies)
+            state_result = self._state_result(state_input, branches, context, number)
+            attempts.append(ParallelAttempt(number, branches, state_result))
+            if state_result.status != 'RETRIABLE':
+                break
+        return ParallelRun(attempts)
+
+    def _run_branches(self, state_input: Any, mocks: Optional[Dict[str, MockSpec]],
+                      context: Optional[Dict[str, Any]], latencies: Optional[Dict[str, float]]) -> List[BranchRun]:
+        branch_input = state_input
+        if self.arguments is not None:
+            branch_input = self.arguments.evaluate({'states': {'input': state_input, 'context': context or {}}})
+        cancel = threading.Event()
+        runs: List[Optional[BranchRun]] = [None] * len(self.executors)
+        errors: List[BaseException] = []
+        origin = time.perf_counter()
+
+        def run_branch(index: int, executor: LocalWorkflowExecutor) -> None:
+            started = time.perf_counter() - origin
+            try:
+                execution = executor.run(branch_input, mocks, context=context, latencies=latencies, cancel=cancel)
+            except BaseException as error:
+                errors.append(error)
+                cancel.set()
+                return
+            if execution.status == 'FAILED':
+                cancel.set()
+            runs[index] = BranchRun(index, execution, started, time.perf_counter() - origin)
+
+        threads = [threading.Thread(target=run_branch, args=(index, executor), name=f"{self.state_name}-{index}")
+                   for index, executor in enumerate(self.executors)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return runs
+
+    def _state_result(self, state_input: Any, branches: List[BranchRun], context: Optional[Dict[str, Any]],
+                      retry_count: int) -> StateResult:
+        branch = _first_failure(branches)
+        if branch is not None:
+            error = self.branch_error or branch.execution.error
+            cause = f"Branch {branch.index} failed with {branch.execution.error}: {branch.execution.cause}"
+            mock = {'errorOutput': {'error': error, 'cause': cause}}
+        else:
+            mock = {'result': [branch.execution.output for branch in branches]}
+        state_config = {'retrierRetryCount': retry_count} if retry_count else None
+        return self.engine.run(self.state_name, state_input, mock, context, state_config)
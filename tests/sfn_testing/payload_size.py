@@ -0,0 +1,196 @@
+"""
+Payload size accounting against the Step Functions 256 KB limit.
+
+Every state in the definition merges its result into ``$states.input``, so
+the payload grows along the workflow. Step Functions fails a state with
+States.DataLimitExceeded when its input, task result or output passes
+256 KB. measure() records the serialized bytes of each, with the size of
+every top-level key of the largest one, so a report can name the keys that
+account for the growth. measure_serialized() does the same for JSON texts
+a caller already has, counting their bytes without parsing them unless
+they pass the limit.
+
+The local workflow executor and the fluent runner use it to fail fast once
+a state passes a configurable limit. scale_order_items() and
+find_item_limit() grow ``orderItems`` to find the smallest order that
+crosses it.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .jsonata import UNDEFINED
+from .overlay import Overlay, json_default
+
+PAYLOAD_LIMIT_BYTES = 256 * 1024
+
+DATA_LIMIT_EXCEEDED = 'States.DataLimitExceeded'
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=json_default)
+
+
+def _size(value: Any) -> Tuple[int, Dict[str, int]]:
+    """Serialized UTF-8 bytes of a value and, for an object, of each of its values."""
+    if value is UNDEFINED:
+        return 0, {}
+    if not isinstance(value, (dict, Overlay)):
+        return len(_dumps(value).encode('utf-8')), {}
+    keys = {key: len(_dumps(item).encode('utf-8')) for key, item in value.items()}
+    total = 2 + max(0, len(keys) - 1) + sum(len(_dumps(key).encode('utf-8')) + 1 + size for key, size in keys.items())
+    return total, keys
+
+
+def payload_bytes(value: Any) -> int:
+    """Serialized UTF-8 bytes of a value, as the service counts them."""
+    return _size(value)[0]
+
+
+class StatePayloadSize:
+    """Serialized bytes of one state attempt's input, result and output."""
+
+    __slots__ = ('state_name', 'retry_count', 'input_bytes', 'result_bytes', 'output_bytes', 'key_sizes')
+
+    def __init__(self, state_name: str, retry_count: int, input_bytes: int, result_bytes: int, output_bytes: int,
+                 key_sizes: Dict[str, int]):
+        self.state_name = state_name
+        self.retry_count = retry_count
+        self.input_bytes = input_bytes
+        self.result_bytes = result_bytes
+        self.output_bytes = output_bytes
+        self.key_sizes = key_sizes
+
+    @property
+    def max_bytes(self) -> int:
+        return max(self.input_bytes, self.result_bytes, self.output_bytes)
+
+    def largest_keys(self, count: int = 5) -> List[Tuple[str, int]]:
+        """The top-level keys of the largest payload, biggest first."""
+        return sorted(self.key_sizes.items(), key=lambda entry: -entry[1])[:count]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'state': self.state_name,
+            'retryCount': self.retry_count,
+            'inputBytes': self.input_bytes,
+            'resultBytes': self.result_bytes,
+            'outputBytes': self.output_bytes,
+            'largestKeys': [{'key': key, 'bytes': size} for key, size in self.largest_keys()]
+        }
+
+    def __repr__(self):
+        return f"StatePayloadSize({self.state_name!r}, max_bytes={self.max_bytes})"
+
+
+def measure(state_name: str, state_input: Any, result: Any = UNDEFINED, output: Any = UNDEFINED,
+            retry_count: int = 0) -> StatePayloadSize:
+    """Measure one state attempt; the key sizes are those of the largest of the three payloads."""
+    sizes = [_size(state_input), _size(result), _size(output)]
+    largest = max(sizes, key=lambda size: size[0])
+    return StatePayloadSize(state_name, retry_count, sizes[0][0], sizes[1][0], sizes[2][0], largest[1])
+
+
+def measure_serialized(state_name: str, input_text: str, result_text: Optional[str] = None,
+                       output_text: Optional[str] = None, limit: Optional[int] = None,
+                       retry_count: int = 0) -> StatePayloadSize:
+    """
+    Measure one state attempt from JSON texts that are already serialized, such as a TestState request and response.
+
+    Only the texts' byte lengths are taken. The largest one is parsed for its
+    key sizes only when it passes limit, which is when a cause names them.
+    """
+    texts = (input_text, result_text, output_text)
+    lengths = [len(text.encode('utf-8')) if text is not None else 0 for text in texts]
+    key_sizes: Dict[str, int] = {}
+    if limit is not None and max(lengths) > limit:
+        key_sizes = _size(json.loads(texts[lengths.index(max(lengths))]))[1]
+    return StatePayloadSize(state_name, retry_count, lengths[0], lengths[1], lengths[2], key_sizes)
+
+
+def data_limit_cause(size: StatePayloadSize, limit: int) -> str:
+    """The cause reported when a state passes the limit, naming the largest keys."""
+    keys = ', '.join(f"{key} ({bytes_} bytes)" for key, bytes_ in size.largest_keys(3))
+    return (f"State {size.state_name} has a payload of {size.max_bytes} bytes, over the limit of {limit} bytes"
+            + (f"; largest keys: {keys}" if keys else ''))
+
+
+class PayloadReport:
+    """Payload sizes along a workflow run."""
+
+    def __init__(self, sizes: List[StatePayloadSize], limit: int = PAYLOAD_LIMIT_BYTES):
+        self.sizes = sizes
+        self.limit = limit
+
+    @property
+    def peak(self) -> Optional[StatePayloadSize]:
+        """The state attempt with the largest payload."""
+        return max(self.sizes, key=lambda size: size.max_bytes, default=None)
+
+    @property
+    def exceeded(self) -> List[StatePayloadSize]:
+        return [size for size in self.sizes if size.max_bytes > self.limit]
+
+    def to_dict(self) -> Dict[str, Any]:
+        peak = self.peak
+        return {
+            'limit': self.limit,
+            'peakBytes': peak.max_bytes if peak else 0,
+            'peakState': peak.state_name if peak else None,
+            'states': [size.to_dict() for size in self.sizes]
+        }
+
+    def to_table(self) -> str:
+        """Render bytes per state attempt and its largest key as a fixed-width text table."""
+        lines = [f"{'state':<32} {'input':>10} {'result':>10} {'output':>10}  largest key"]
+        for size in self.sizes:
+            name = size.state_name + (f" (retry {size.retry_count})" if size.retry_count else '')
+            top = size.largest_keys(1)
+            largest = f"{top[0][0]} ({top[0][1]})" if top else ''
+            lines.append(f"{name:<32} {size.input_bytes:>10} {size.result_bytes:>10} {size.output_bytes:>10}  {largest}")
+        return '\n'.join(lines)
+
+
+def scale_order_items(order: Dict[str, Any], count: int) -> Dict[str, Any]:
+    """
+    Return a copy of the order with ``count`` items, repeating its items with unique itemIds.
+
+    The order's own items are the templates; an order without items gets
+    ``{"itemId": ..., "quantity": 1}`` items.
+    """
+    templates = order.get('orderItems') or [{'quantity': 1}]
+    items = [dict(templates[index % len(templates)], itemId=f"item-{index + 1}") for index in range(count)]
+    return dict(order, orderItems=items)
+
+
+def find_item_limit(exceeds: Callable[[int], bool], start: int = 1, max_count: int = 1 << 20) -> Optional[int]:
+    """
+    Return the smallest item count for which ``exceeds(count)`` is true, or None up to max_count.
+
+    The count is doubled until the limit is passed, then bisected, so the
+    check runs O(log n) times. exceeds must be monotonic in the count.
+
+    Usage example:
+    executor = LocalWorkflowExecutor(definition, payload_limit=PAYLOAD_LIMIT_BYTES)
+
+    def exceeds(count):
+        order = scale_order_items(ORDER_INPUT, count)
+        mocks = dict(HAPPY_PATH_MOCKS, ProcessOrderItems={"result": [
+            {"itemId": item["itemId"], "processed": True} for item in order["orderItems"]]})
+        return executor.run(order, mocks).error == DATA_LIMIT_EXCEEDED
+
+    count = find_item_limit(exceeds)
+    """
+    low, high = start - 1, start
+    while not exceeds(high):
+        if high >= max_count:
+            return None
+        low, high = high, min(high * 2, max_count)
+    # low does not exceed (or is below start), high does
+    while high - low > 1:
+        middle = (low + high) // 2
+        if exceeds(middle):
+            high = middle
+        else:
+            low = middle
+    return high
@@ -0,0 +1,209 @@
+"""
+Client-side rate limiting for TestState calls.
+
+RateLimitedClient wraps a Step Functions client so that parallel and batch
+runs adapt to the account's TestState quota instead of failing on
+ThrottlingException. A token bucket paces the request rate and a limit on
+in-flight calls bounds concurrency; both grow additively while calls
+succeed and are halved on a throttle (AIMD). Throttled calls are retried
+with full-jitter exponential backoff.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .timing import THROTTLING_ERRORS
+
+
+def is_throttling_error(exception: Exception) -> bool:
+    """Return True for the API errors Step Functions uses to reject calls over the rate limit."""
+    response = getattr(exception, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in THROTTLING_ERRORS
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self._clock = clock
+        self._updated = clock()
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """Take one token, waiting for the bucket to refill if needed. Returns the time waited."""
+        waited = 0.0
+        with self._condition:
+            while True:
+                self._refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+                self._condition.wait(delay)
+                waited += delay
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate; tokens already in the bucket are kept up to the new burst size."""
+        with self._condition:
+            self._refill()
+            self.rate = rate
+            self.burst = max(1.0, rate)
+            self.tokens = min(self.tokens, self.burst)
+            self._condition.notify_all()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease control of request rate and concurrency.
+
+    Each success raises the in-flight limit by 1/limit and the rate by
+    rate_step/rate, so both grow by about one unit per round of calls. A
+    throttle halves both, at most once per congestion event: throttles from
+    calls that started before the last decrease are ignored.
+    """
+
+    def __init__(self, bucket: TokenBucket, concurrency: float, min_rate: float, max_rate: float,
+                 max_concurrency: int, rate_step: float = 1.0, decrease_factor: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bucket = bucket
+        self.concurrency = float(concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._clock = clock
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+
+    def enter(self) -> float:
+        """Wait for a free concurrency slot and a rate token. Returns the call's start time."""
+        with self._condition:
+            while self.in_flight >= max(1, int(self.concurrency)):
+                self._condition.wait()
+            self.in_flight += 1
+        self.bucket.acquire()
+        return self._clock()
+
+    def exit(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            rate = min(self.max_rate, self.bucket.rate + self.rate_step / self.bucket.rate)
+            self._condition.notify()
+        self.bucket.set_rate(rate)
+
+    def on_throttle(self, started: float) -> bool:
+        """Back off after a throttle; returns False when the throttle was already accounted for."""
+        with self._condition:
+            if started <= self._last_decrease:
+                return False
+            self._last_decrease = self._clock()
+            self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+            rate = max(self.min_rate, self.bucket.rate * self.decrease_factor)
+        self.bucket.set_rate(rate)
+        return True
+
+
+class RateLimitedClient:
+    """
+    Step Functions client wrapper that paces test_state calls and retries throttles.
+
+    Usage example:
+    client = RateLimitedClient(boto3.client('stepfunctions'), rate=20)
+    runner = StepFunctionTestRunner(client, definition)
+    print(client.metrics())
+    """
+
+    def __init__(self, client: Any, rate: float = 20.0, max_rate: Optional[float] = None, min_rate: float = 0.5,
+                 max_concurrency: int = 32, max_retries: int = 8, base_delay: float = 0.1, max_delay: float = 10.0,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.bucket = TokenBucket(rate, clock=clock)
+        self.controller = AIMDController(
+            self.bucket,
+            concurrency=max(1, max_concurrency // 4),
+            min_rate=min_rate,
+            max_rate=max_rate if max_rate is not None else rate * 10,
+            max_concurrency=max_concurrency,
+            clock=clock
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._clock = clock
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self._first_call: Optional[float] = None
+        self._last_success: Optional[float] = None
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        """Call the wrapped client's test_state within the rate and concurrency limits."""
+        for attempt in range(self.max_retries + 1):
+            started = self.controller.enter()
+            try:
+                with self._lock:
+                    self.calls += 1
+                    if self._first_call is None:
+                        self._first_call = started
+                response = self.client.test_state(**params)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                self.controller.on_throttle(started)
+                with self._lock:
+                    self.throttles += 1
+                if attempt == self.max_retries:
+                    raise
+            else:
+                self.controller.on_success()
+                with self._lock:
+                    self.successes += 1
+                    self._last_success = self._clock()
+                return response
+            finally:
+                self.controller.exit()
+            delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            with self._lock:
+                self.retries += 1
+                self.backoff_seconds += delay
+            self._sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return call, throttle and retry counters, sustained throughput and the current limits."""
+        with self._lock:
+            elapsed = (self._last_success - self._first_call) if self._last_success is not None else 0.0
+            return {
+                'calls': self.calls,
+                'successes': self.successes,
+                'throttles': self.throttles,
+                'retries': self.retries,
+                'backoffSeconds': round(self.backoff_seconds, 3),
+                'throughputPerSecond': round(self.successes / elapsed, 2) if elapsed > 0 else None,
+                'rateLimit': round(self.bucket.rate, 2),
+                'concurrencyLimit': int(self.controller.concurrency),
+            }
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
@@ -0,0 +1,64 @@
+"""
+Canonical, content-addressed keys for TestState requests.
+
+Two requests that differ only in JSON formatting or key order produce the same
+key; the definition is represented by its SHA-256 hash so keys stay small.
+"""
+
+import functools
+import hashlib
+import json
+from typing import Any, Dict
+
+# Parameters whose values are JSON documents passed as strings
+_JSON_STRING_PARAMS = ('input', 'context')
+
+
+def canonical_json(value: Any) -> str:
+    """Serialize a value deterministically (sorted keys, no whitespace)."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+@functools.lru_cache(maxsize=64)
+def definition_hash(definition: str) -> str:
+    """
+    Return the SHA-256 hex digest of a serialized definition.
+
+    Memoized: runners send the same definition string object on every call,
+    so repeated lookups cost a dictionary hit rather than a full digest.
+    """
+    return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+
+def _parse_json_string(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def canonical_request(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a canonical form of test_state parameters.
+
+    JSON-string parameters are parsed so formatting does not matter, and the
+    definition is replaced by its hash ('definitionHash').
+    """
+    request = {}
+    for name, value in params.items():
+        if name == 'definition':
+            continue
+        if name in _JSON_STRING_PARAMS:
+            value = _parse_json_string(value)
+        elif name == 'mock' and isinstance(value, dict) and 'result' in value:
+            value = dict(value, result=_parse_json_string(value['result']))
+        request[name] = value
+    request['definitionHash'] = definition_hash(params['definition'])
+    return request
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Return a stable SHA-256 key for a set of test_state parameters."""
+    return hashlib.sha256(canonical_json(canonical_request(params)).encode('utf-8')).hexdigest()
@@ -0,0 +1,142 @@
+"""
+Content-addressed cache for TestState responses.
+
+Responses are keyed on request_key(), a SHA-256 of the canonical JSON of all
+test_state parameters. The in-memory layer is a bounded LRU; an optional
+directory store persists entries across sessions as one JSON file per key.
+"""
+
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .emulator import iter_states
+from .request_keys import definition_hash, request_key
+
+# State types whose TestState result is fully determined by the request.
+# Task, Map and Parallel states call real services unless they are mocked.
+_DETERMINISTIC_TYPES = {'Choice', 'Pass', 'Wait', 'Succeed', 'Fail'}
+
+
+class ResponseCache:
+    """Bounded LRU of responses with an optional persistent directory store."""
+
+    def __init__(self, maxsize: int = 1024, directory: Optional[str] = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached response for a key (memory first, then disk), or None.
+
+        Every hit is a deep copy, so a caller that changes its response does
+        not change what later callers get.
+        """
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(response)
+        response = self._read(key)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, response)
+        return copy.deepcopy(response)
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Cache a copy of a response in memory and, if configured, on disk."""
+        with self._lock:
+            self._store(key, copy.deepcopy(response))
+        self._write(key, response)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the current in-memory size."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def _store(self, key: str, response: Dict[str, Any]) -> None:
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: str, response: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(response, f, separators=(',', ':'))
+        os.replace(temporary_path, path)
+
+
+class CachingClient:
+    """
+    Step Functions client wrapper that deduplicates identical test_state calls.
+
+    Only deterministic requests are cached: calls that carry a mock, and calls
+    to states that never invoke a service (Choice, Pass, Wait, Succeed, Fail).
+    Unmocked Task, Map and Parallel calls always reach the wrapped client.
+    """
+
+    def __init__(self, client: Any, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+        self._state_types: Dict[str, Dict[str, str]] = {}
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        """Serve a test_state call from the cache, calling the wrapped client on a miss."""
+        if not self._is_cacheable(params):
+            return self.client.test_state(**params)
+        key = request_key(params)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.client.test_state(**params)
+            response = {name: value for name, value in response.items() if name != 'ResponseMetadata'}
+            self.cache.put(key, response)
+        return response
+
+    def _is_cacheable(self, params: Dict[str, Any]) -> bool:
+        if params.get('mock'):
+            return True
+        definition = params['definition']
+        digest = definition_hash(definition)
+        state_types = self._state_types.get(digest)
+        if state_types is None:
+            state_types = {name: state.get('Type') for name, state in iter_states(json.loads(definition))}
+            self._state_types[digest] = state_types
+        return state_types.get(params['stateName']) in _DETERMINISTIC_TYPES
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
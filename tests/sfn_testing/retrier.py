@@ -0,0 +1,157 @@
+"""
+Local Retry/Catch decision engine.
+
+Retrier reads a state's ``Retry`` and ``Catch`` arrays once and decides, for
+an error name and a ``retrierRetryCount``, what TestState would report:
+RETRIABLE with the matching retrier and its backoff, CAUGHT_ERROR with the
+matching catcher and its ``Next`` state, or FAILED. A decision scans each
+policy list at most once, so a whole retry matrix is computed in
+microseconds without calling the API.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Retrier field defaults from the Amazon States Language specification
+DEFAULT_INTERVAL_SECONDS = 1
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF_RATE = 2.0
+
+
+def error_matches(error_equals: List[str], error: str) -> bool:
+    """Return True if an ErrorEquals list matches the error name."""
+    for candidate in error_equals:
+        if candidate == error or candidate == 'States.ALL':
+            return True
+        if candidate == 'States.TaskFailed' and error != 'States.Timeout':
+            return True
+    return False
+
+
+class RetryPolicy:
+    """One entry of a state's Retry array."""
+
+    __slots__ = ('index', 'error_equals', 'interval_seconds', 'max_attempts', 'backoff_rate',
+                 'max_delay_seconds', 'jitter_strategy')
+
+    def __init__(self, index: int, retrier: Dict[str, Any]):
+        self.index = index
+        self.error_equals = list(retrier.get('ErrorEquals', []))
+        self.interval_seconds = retrier.get('IntervalSeconds', DEFAULT_INTERVAL_SECONDS)
+        self.max_attempts = retrier.get('MaxAttempts', DEFAULT_MAX_ATTEMPTS)
+        self.backoff_rate = retrier.get('BackoffRate', DEFAULT_BACKOFF_RATE)
+        self.max_delay_seconds = retrier.get('MaxDelaySeconds')
+        self.jitter_strategy = retrier.get('JitterStrategy', 'NONE')
+
+    def backoff(self, retry_count: int) -> float:
+        """
+        Return the wait before retry number retry_count + 1, capped by MaxDelaySeconds.
+
+        With JitterStrategy FULL the service waits a random time between zero
+        and this value; the upper bound is what TestState reports.
+        """
+        delay = self.interval_seconds * self.backoff_rate ** retry_count
+        if self.max_delay_seconds is not None:
+            delay = min(delay, self.max_delay_seconds)
+        return delay
+
+
+class CatchPolicy:
+    """One entry of a state's Catch array."""
+
+    __slots__ = ('index', 'error_equals', 'next_state')
+
+    def __init__(self, index: int, catcher: Dict[str, Any]):
+        self.index = index
+        self.error_equals = list(catcher.get('ErrorEquals', []))
+        self.next_state = catcher['Next']
+
+
+class RetryDecision:
+    """
+    What TestState reports for an error at a given retrierRetryCount.
+
+    retry_policy is the first retrier matching the error, also when it is
+    exhausted; it handled the error only if the status is RETRIABLE.
+    """
+
+    __slots__ = ('status', 'error', 'retry_count', 'retry_policy', 'backoff_seconds', 'catch_policy')
+
+    def __init__(self, status: str, error: str, retry_count: int, retry_policy: Optional[RetryPolicy] = None,
+                 backoff_seconds: Optional[float] = None, catch_policy: Optional[CatchPolicy] = None):
+        self.status = status
+        self.error = error
+        self.retry_count = retry_count
+        self.retry_policy = retry_policy
+        self.backoff_seconds = backoff_seconds
+        self.catch_policy = catch_policy
+
+    @property
+    def retry_policy_handled_error(self) -> Optional[int]:
+        return self.retry_policy.index if self.status == 'RETRIABLE' else None
+
+    @property
+    def catch_policy_handled_error(self) -> Optional[int]:
+        return self.catch_policy.index if self.catch_policy is not None else None
+
+    @property
+    def next_state(self) -> Optional[str]:
+        return self.catch_policy.next_state if self.catch_policy is not None else None
+
+    @property
+    def jittered(self) -> bool:
+        return self.status == 'RETRIABLE' and self.retry_policy.jitter_strategy == 'FULL'
+
+    def error_details(self) -> Dict[str, Any]:
+        """Return the inspectionData.errorDetails TestState would include for this decision."""
+        if self.status == 'RETRIABLE':
+            return {
+                'retryIndex': self.retry_policy.index,
+                'retryPolicyHandledError': self.retry_policy.index,
+                'retryBackoffIntervalSeconds': int(self.backoff_seconds),
+            }
+        if self.status == 'CAUGHT_ERROR':
+            return {'catchIndex': self.catch_policy.index, 'catchPolicyHandledError': self.catch_policy.index}
+        return {}
+
+    def __repr__(self) -> str:
+        return (f"RetryDecision(status={self.status!r}, error={self.error!r}, retry_count={self.retry_count}, "
+                f"error_details={self.error_details()!r}, next_state={self.next_state!r})")
+
+
+class Retrier:
+    """The Retry and Catch policies of one state."""
+
+    __slots__ = ('retry_policies', 'catch_policies')
+
+    def __init__(self, state: Dict[str, Any]):
+        self.retry_policies = [RetryPolicy(index, retrier) for index, retrier in enumerate(state.get('Retry', []))]
+        self.catch_policies = [CatchPolicy(index, catcher) for index, catcher in enumerate(state.get('Catch', []))]
+
+    def decide(self, error: str, retry_count: int = 0) -> RetryDecision:
+        """
+        Decide the outcome of an error at the given retrierRetryCount.
+
+        The first retrier whose ErrorEquals matches decides whether the error
+        is retried; once it is exhausted the Catch policies are consulted.
+        """
+        retry_policy = None
+        for policy in self.retry_policies:
+            if error_matches(policy.error_equals, error):
+                if retry_count < policy.max_attempts:
+                    return RetryDecision('RETRIABLE', error, retry_count, policy, policy.backoff(retry_count))
+                retry_policy = policy
+                break
+        for policy in self.catch_policies:
+            if error_matches(policy.error_equals, error):
+                return RetryDecision('CAUGHT_ERROR', error, retry_count, retry_policy, catch_policy=policy)
+        return RetryDecision('FAILED', error, retry_count, retry_policy)
+
+    def schedule(self, error: str, max_retry_count: int = 100) -> List[RetryDecision]:
+        """Return the decisions for retrierRetryCount 0, 1, ... up to the first one that is not RETRIABLE."""
+        decisions = []
+        for retry_count in range(max_retry_count + 1):
+            decision = self.decide(error, retry_count)
+            decisions.append(decision)
+            if decision.status != 'RETRIABLE':
+                break
+        return decisions
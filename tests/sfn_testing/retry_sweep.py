@@ -0,0 +1,157 @@
+"""
+Planning and reporting for exhaustive retry-schedule sweeps.
+
+plan_retry_sweep() builds the (state x error x attempt) grid for the Task
+states of a definition. States whose Retry policies and Catch ErrorEquals
+are identical behave the same for every error and attempt, so the grid is
+generated once per distinct policy and every cell lists the states it
+stands for. Expected outcomes come from the local Retrier; the runner
+fills in the observed status and backoff.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from .emulator import iter_states
+from .request_keys import canonical_json
+from .retrier import Retrier, RetryDecision
+
+# Error raised in the sweep that no retrier lists, to exercise the Catch path
+UNLISTED_ERROR = 'States.TaskFailed'
+
+_WILDCARD_ERRORS = {'States.ALL', 'States.TaskFailed'}
+
+
+def retry_policy_key(state: Dict[str, Any]) -> str:
+    """Return a key that is equal for states whose retry and catch decisions are identical."""
+    return canonical_json({
+        'Retry': state.get('Retry', []),
+        'Catch': [catcher.get('ErrorEquals', []) for catcher in state.get('Catch', [])],
+    })
+
+
+class SweepCell:
+    """One (state, error, attempt) check of a retry sweep."""
+
+    __slots__ = ('state_name', 'shared_with', 'error', 'retry_count', 'expected', 'status', 'backoff_seconds',
+                 'message')
+
+    def __init__(self, state_name: str, shared_with: List[str], error: str, retry_count: int,
+                 expected: RetryDecision):
+        self.state_name = state_name
+        self.shared_with = shared_with
+        self.error = error
+        self.retry_count = retry_count
+        self.expected = expected
+        self.status: Optional[str] = None
+        self.backoff_seconds: Optional[int] = None
+        self.message: Optional[str] = None
+
+    @property
+    def expected_backoff_seconds(self) -> Optional[int]:
+        return self.expected.error_details().get('retryBackoffIntervalSeconds')
+
+    @property
+    def passed(self) -> bool:
+        return (self.message is None and self.status == self.expected.status
+                and self.backoff_seconds == self.expected_backoff_seconds)
+
+    def record(self, response: Dict[str, Any]) -> None:
+        """Store the observed status and backoff from a TestState response."""
+        self.status = response['status']
+        self.backoff_seconds = response.get('inspectionData', {}).get('errorDetails', {}).get(
+            'retryBackoffIntervalSeconds'
+        )
+
+
+def plan_retry_sweep(definition: Dict[str, Any], state_names: Optional[Iterable[str]] = None,
+                     errors: Optional[Iterable[str]] = None, max_retry_count: Optional[int] = None) -> List[SweepCell]:
+    """
+    Build the sweep grid, one block of cells per distinct retry policy.
+
+    By default it covers every Task state, every error named in any Task's
+    Retry array plus one unlisted error, and every retrierRetryCount from 0
+    up to the largest MaxAttempts, so each policy is also seen exhausted.
+    """
+    tasks = {name: state for name, state in iter_states(definition) if state.get('Type') == 'Task'}
+    if state_names is not None:
+        tasks = {name: tasks[name] for name in state_names}
+    retriers = {name: Retrier(state) for name, state in tasks.items()}
+    if errors is None:
+        listed = []
+        for retrier in retriers.values():
+            for policy in retrier.retry_policies:
+                listed.extend(error for error in policy.error_equals if error not in _WILDCARD_ERRORS)
+        errors = list(dict.fromkeys(listed + [UNLISTED_ERROR]))
+    else:
+        errors = list(errors)
+    if max_retry_count is None:
+        max_retry_count = max(
+            [policy.max_attempts for retrier in retriers.values() for policy in retrier.retry_policies] or [0]
+        )
+
+    groups: Dict[str, List[str]] = {}
+    for name, state in tasks.items():
+        groups.setdefault(retry_policy_key(state), []).append(name)
+
+    cells = []
+    for names in groups.values():
+        retrier = retriers[names[0]]
+        for error in errors:
+            for retry_count in range(max_retry_count + 1):
+                cells.append(SweepCell(names[0], names[1:], error, retry_count, retrier.decide(error, retry_count)))
+    return cells
+
+
+class RetrySweepResult:
+    """The checked cells of a retry sweep, with a compact table for reports."""
+
+    def __init__(self, cells: List[SweepCell]):
+        self.cells = cells
+
+    @property
+    def failures(self) -> List[SweepCell]:
+        return [cell for cell in self.cells if not cell.passed]
+
+    @property
+    def states_covered(self) -> List[str]:
+        names = []
+        for cell in self.cells:
+            names.extend(name for name in [cell.state_name] + cell.shared_with if name not in names)
+        return names
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One dict per cell: states, error, attempt, expected and actual outcome."""
+        return [{
+            'state': cell.state_name,
+            'sharedWith': cell.shared_with,
+            'error': cell.error,
+            'retryCount': cell.retry_count,
+            'expectedStatus': cell.expected.status,
+            'status': cell.status,
+            'expectedBackoffSeconds': cell.expected_backoff_seconds,
+            'backoffSeconds': cell.backoff_seconds,
+            'passed': cell.passed,
+            'message': cell.message,
+        } for cell in self.cells]
+
+    def to_table(self) -> str:
+        """Render the sweep as a fixed-width text table, one line per cell."""
+        lines = [('states', 'error', 'try', 'expected', 'actual', 'ok')]
+        for cell in self.cells:
+            states = cell.state_name + (f" (+{len(cell.shared_with)})" if cell.shared_with else '')
+            expected = _outcome(cell.expected.status, cell.expected_backoff_seconds)
+            actual = _outcome(cell.status, cell.backoff_seconds) if cell.message is None else cell.message
+            lines.append((states, cell.error, str(cell.retry_count), expected, actual, 'ok' if cell.passed else 'FAIL'))
+        widths = [max(len(line[column]) for line in lines) for column in range(len(lines[0]))]
+        return '\n'.join(
+            '  '.join(value.ljust(width) for value, width in zip(line, widths)).rstrip() for line in lines
+        )
+
+    def assert_all_passed(self) -> 'RetrySweepResult':
+        """Assert that every cell matched its expected status and backoff."""
+        assert not self.failures, f"{len(self.failures)} retry sweep cells failed:\n{self.to_table()}"
+        return self
+
+
+def _outcome(status: Optional[str], backoff_seconds: Optional[int]) -> str:
+    return f"{status} {backoff_seconds}s" if backoff_seconds is not None else str(status)
@@ -0,0 +1,60 @@
+"""
+Duration-based test ordering for serial and pytest-xdist runs.
+
+Per-test wall times are recorded into the pytest cache (``.pytest_cache``) at
+the end of each run. On the next run the collected items are ordered longest
+first (LPT scheduling), so with ``pytest -n <workers>`` the slow multi-hop
+tests start immediately and the short ones fill the gaps at the end. Every
+xdist worker reads the same recorded timings, so all workers collect the
+items in the same order, as xdist requires.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+DURATIONS_CACHE_KEY = 'sfn_testing/durations'
+
+
+def worker_id(config) -> Optional[str]:
+    """Return the pytest-xdist worker id (e.g. 'gw0'), or None outside a worker."""
+    workerinput = getattr(config, 'workerinput', None)
+    if workerinput is not None:
+        return workerinput.get('workerid')
+    return os.environ.get('PYTEST_XDIST_WORKER')
+
+
+class DurationRecorder:
+    """
+    Accumulates per-test wall time (setup + call + teardown) from test reports.
+
+    Register an instance as a pytest plugin to record every report; under
+    xdist the controller receives the reports of all workers.
+    """
+
+    def __init__(self, previous: Optional[Dict[str, float]] = None):
+        self.previous = dict(previous or {})
+        self.current: Dict[str, float] = {}
+
+    def add(self, nodeid: str, duration: float) -> None:
+        self.current[nodeid] = self.current.get(nodeid, 0.0) + duration
+
+    def pytest_runtest_logreport(self, report) -> None:
+        self.add(report.nodeid, report.duration)
+
+    def merged(self) -> Dict[str, float]:
+        """Previous timings updated with this run's measurements."""
+        durations = dict(self.previous)
+        durations.update(self.current)
+        return durations
+
+
+def order_slowest_first(items: List, durations: Dict[str, float]) -> None:
+    """
+    Reorder collected items in place, longest recorded duration first.
+
+    Tests without a recorded duration are treated as slow (they may be new
+    multi-hop tests) and run first; ties keep collection order.
+    """
+    unknown = float('inf')
+    positions = {id(item): index for index, item in enumerate(items)}
+    items.sort(key=lambda item: (-durations.get(item.nodeid, unknown), positions[id(item)]))
@@ -0,0 +1,181 @@
+"""
+Incremental test selection from per-state definition hashes.
+
+Every run records which states each test called test_state on
+(StateUsageRecorder, fed by StateUsageClient) and a content hash per state
+of the definition. With selection enabled the next run compares the current
+hashes with the recorded ones and keeps only the tests that touched a
+changed state or one of its direct predecessors, whose output is the
+changed state's input. Tests without a recorded mapping are always kept, as
+is everything when a definition-level field (QueryLanguage, TimeoutSeconds,
+...) changed.
+
+A state's recorded hash moves forward only when every test a change to it
+would select ran in that session without failing, so neither a failing run
+nor a partial one (-k, a single file) hides a change from the next run.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .emulator import iter_states
+from .graph import StateGraph
+from .request_keys import canonical_json
+
+STATE_HASHES_CACHE_KEY = 'sfn_testing/state_hashes'
+TEST_STATES_CACHE_KEY = 'sfn_testing/test_states'
+
+# Hash key for the definition fields outside States
+DEFINITION_KEY = ''
+
+
+def _sha256(value: Any) -> str:
+    return hashlib.sha256(canonical_json(value).encode('utf-8')).hexdigest()
+
+
+def state_hashes(definition: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Hash every state, nested ones included, plus the top-level fields.
+
+    A Map or Parallel state's hash covers its nested states, so an edit
+    inside a branch also marks the state that contains it.
+    """
+    hashes = {DEFINITION_KEY: _sha256({key: value for key, value in definition.items() if key != 'States'})}
+    for name, state in iter_states(definition):
+        hashes[name] = _sha256(state)
+    return hashes
+
+
+def changed_states(previous: Dict[str, str], current: Dict[str, str]) -> Set[str]:
+    """Names whose hash differs, including added and removed states."""
+    return {name for name in set(previous) | set(current) if previous.get(name) != current.get(name)}
+
+
+def affected_states(definition: Dict[str, Any], changed: Iterable[str]) -> Set[str]:
+    """The changed states plus every state with a transition into one of them."""
+    changed = set(changed)
+    affected = set(changed)
+    for graph in StateGraph(definition).walk():
+        affected.update(edge.source for edge in graph.edges if edge.target in changed)
+    return affected
+
+
+class StateUsageRecorder:
+    """
+    Maps each test to the state names it exercised.
+
+    Register an instance as a pytest plugin so calls are attributed to the
+    running test; calls made outside a test are ignored.
+    """
+
+    def __init__(self, previous: Optional[Dict[str, List[str]]] = None):
+        self.previous = {test: list(states) for test, states in (previous or {}).items()}
+        self.current: Dict[str, Set[str]] = {}
+        self.current_test: Optional[str] = None
+        self.ran: Set[str] = set()
+        self.failed: Set[str] = set()
+
+    def pytest_runtest_logstart(self, nodeid, location) -> None:
+        self.current_test = nodeid
+        self.current.setdefault(nodeid, set())
+
+    def pytest_runtest_logfinish(self, nodeid, location) -> None:
+        self.current_test = None
+
+    def pytest_runtest_logreport(self, report) -> None:
+        self.ran.add(report.nodeid)
+        if report.failed:
+            self.failed.add(report.nodeid)
+
+    @property
+    def settled(self) -> Set[str]:
+        """Tests that ran in this session without failing in setup, call or teardown."""
+        return self.ran - self.failed
+
+    def record(self, state_name: str) -> None:
+        if self.current_test is not None:
+            self.current[self.current_test].add(state_name)
+
+    def record_all(self, state_names: Iterable[str]) -> None:
+        if self.current_test is not None:
+            self.current[self.current_test].update(state_names)
+
+    def update(self, tests: Dict[str, Iterable[str]]) -> None:
+        for test, states in tests.items():
+            self.current.setdefault(test, set()).update(states)
+
+    def merged(self) -> Dict[str, List[str]]:
+        """Previous mappings updated with the tests that ran in this session."""
+        tests = dict(self.previous)
+        tests.update({test: sorted(states) for test, states in self.current.items()})
+        return tests
+
+
+class StateUsageClient:
+    """Step Functions client wrapper that records the state of every test_state call."""
+
+    def __init__(self, client: Any, recorder: StateUsageRecorder):
+        self.client = client
+        self.recorder = recorder
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        self.recorder.record(params['stateName'])
+        return self.client.test_state(**params)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+def select_tests(items: List, tests: Dict[str, List[str]], definition: Dict[str, Any],
+                 previous_hashes: Dict[str, str]) -> Tuple[List, List, Set[str]]:
+    """
+    Split collected items into (selected, deselected, affected states).
+
+    Everything is selected when no hashes were recorded yet or a
+    definition-level field changed. Tests that never called test_state
+    (they may read the definition directly) are always selected.
+    """
+    if not previous_hashes:
+        return list(items), [], set()
+    changed = changed_states(previous_hashes, state_hashes(definition))
+    if DEFINITION_KEY in changed:
+        return list(items), [], changed
+    affected = affected_states(definition, changed)
+    selected, deselected = [], []
+    for item in items:
+        states = tests.get(item.nodeid)
+        if not states or affected.intersection(states):
+            selected.append(item)
+        else:
+            deselected.append(item)
+    return selected, deselected, affected
+
+
+def advance_hashes(definition: Dict[str, Any], previous_hashes: Dict[str, str], tests: Dict[str, List[str]],
+                   settled: Set[str]) -> Dict[str, str]:
+    """
+    Hashes to record after a run.
+
+    A state takes its current hash when every test that would be selected
+    for a change to it is in settled; otherwise it keeps its recorded hash,
+    or stays unrecorded, so those tests are selected again next time. A
+    definition-level change selects every test, so it waits for all of them.
+    """
+    current = state_hashes(definition)
+    predecessors: Dict[str, Set[str]] = {}
+    for graph in StateGraph(definition).walk():
+        for edge in graph.edges:
+            predecessors.setdefault(edge.target, set()).add(edge.source)
+    hashes = {}
+    for name in set(previous_hashes) | set(current):
+        if name == DEFINITION_KEY:
+            selecting = set(tests)
+        else:
+            watched = {name} | predecessors.get(name, set())
+            selecting = {test for test, states in tests.items() if watched.intersection(states)}
+        if selecting <= settled:
+            if name in current:
+                hashes[name] = current[name]
+        elif name in previous_hashes:
+            hashes[name] = previous_hashes[name]
+    return hashes
@@ -0,0 +1,169 @@
+"""
+Batch evaluation of one state over many inputs with the local engine.
+
+Replaying a corpus of real payloads through ``runner.with_input(x).execute()``
+serializes and parses every request and response. StateBatchEvaluator
+compiles the definition once and runs the state directly on parsed inputs,
+from any iterable or a JSON Lines file. Results stream one at a time, so
+the corpus is never held in memory. A BatchSummary counts nextState,
+status and error values as it goes.
+"""
+
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+from .emulator import LocalStateEngine, LocalTestStateError, StateResult
+from .jsonata import DEFAULT_CACHE, UNDEFINED, ExpressionCache
+from .item_io import JsonLinesReader
+from .overlay import to_plain
+
+# One mock for every input, or a function of (index, input) returning the mock for that input
+BatchMock = Union[Dict[str, Any], Callable[[int, Any], Optional[Dict[str, Any]]]]
+
+
+class BatchOutcome:
+    """The result of running the state on one input."""
+
+    __slots__ = ('index', 'input', 'result')
+
+    def __init__(self, index: int, state_input: Any, result: StateResult):
+        self.index = index
+        self.input = state_input
+        self.result = result
+
+    def to_record(self) -> Dict[str, Any]:
+        """A JSON-ready record of the outcome: status, nextState, output, error and cause."""
+        result = self.result
+        record: Dict[str, Any] = {'index': self.index, 'status': result.status}
+        if result.next_state is not None:
+            record['nextState'] = result.next_state
+        if result.output is not UNDEFINED:
+            record['output'] = to_plain(result.output)
+        if result.error is not None:
+            record['error'] = result.error
+            record['cause'] = result.cause
+        return record
+
+
+class BatchSummary:
+    """Counts of nextState, status and error over a batch, with the first input index for each nextState."""
+
+    def __init__(self, state_name: str):
+        self.state_name = state_name
+        self.total = 0
+        self.next_states: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.first_index: Dict[Optional[str], int] = {}
+        self.elapsed = 0.0
+
+    def add(self, outcome: BatchOutcome) -> None:
+        result = outcome.result
+        self.total += 1
+        self.next_states[result.next_state] += 1
+        self.statuses[result.status] += 1
+        if result.error is not None:
+            self.errors[result.error] += 1
+        self.first_index.setdefault(result.next_state, outcome.index)
+
+    @property
+    def per_second(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def histogram(self) -> Dict[Optional[str], int]:
+        """nextState counts, most frequent first; None counts inputs with no next state."""
+        return dict(self.next_states.most_common())
+
+    def assert_next_states(self, expected: Dict[Optional[str], int]) -> 'BatchSummary':
+        """Assert the exact nextState histogram."""
+        assert self.histogram() == expected, f"Expected nextState counts {expected}, got {self.histogram()}"
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'state': self.state_name,
+            'total': self.total,
+            'nextStates': {str(key): count for key, count in self.next_states.most_common()},
+            'statuses': dict(self.statuses.most_common()),
+            'errors': dict(self.errors.most_common()),
+            'firstIndex': {str(key): index for key, index in self.first_index.items()},
+            'elapsedSeconds': round(self.elapsed, 3)
+        }
+
+    def to_table(self) -> str:
+        """Render the nextState histogram as a fixed-width text table."""
+        lines = [f"{'nextState':<32} {'count':>10} {'share':>7}  first input"]
+        for next_state, count in self.next_states.most_common():
+            share = count / self.total * 100 if self.total else 0.0
+            lines.append(f"{str(next_state):<32} {count:>10} {share:>6.1f}%  {self.first_index[next_state]}")
+        lines.append(f"{self.total} inputs in {self.elapsed:.2f}s ({self.per_second:.0f}/s)")
+        return '\n'.join(lines)
+
+
+class StateBatchEvaluator:
+    """
+    Runs one state of a definition over many inputs.
+
+    Usage example:
+    summary = StateBatchEvaluator(definition, 'CheckApproval').run('orders.jsonl')
+    print(summary.to_table())
+    """
+
+    def __init__(self, definition: Dict[str, Any], state_name: str, cache: ExpressionCache = DEFAULT_CACHE):
+        self.state_name = state_name
+        self.engine = LocalStateEngine(definition, cache=cache)
+        if state_name not in self.engine.states:
+            raise LocalTestStateError(f"State {state_name} does not exist in the definition")
+
+    def results(
+        self,
+        inputs: Union[str, Iterable[Any]],
+        mock: Optional[BatchMock] = None,
+        context: Optional[Dict[str, Any]] = None,
+        state_config: Optional[Dict[str, Any]] = None
+    ) -> Iterator[BatchOutcome]:
+        """
+        Yield one BatchOutcome per input, in input order.
+
+        Args:
+            inputs: Parsed inputs, or the path of a JSON Lines file with one input per line
+            mock: TestState-style mock with a parsed ``result`` for every input,
+                or a function of (index, input) returning it
+            context: Context object for every input
+            state_config: TestState stateConfiguration for every input
+
+        An input whose expressions fail yields a FAILED outcome with
+        States.QueryEvaluationError, as TestState reports it.
+        """
+        if isinstance(inputs, str):
+            inputs = JsonLinesReader(inputs)
+        run, state_name = self.engine.run, self.state_name
+        per_input = callable(mock)
+        for index, state_input in enumerate(inputs):
+            state_mock = mock(index, state_input) if per_input else mock
+            yield BatchOutcome(index, state_input, run(state_name, state_input, state_mock, context, state_config))
+
+    def run(
+        self,
+        inputs: Union[str, Iterable[Any]],
+        mock: Optional[BatchMock] = None,
+        context: Optional[Dict[str, Any]] = None,
+        state_config: Optional[Dict[str, Any]] = None,
+        sink: Optional[Callable[[int, Dict[str, Any]], None]] = None
+    ) -> BatchSummary:
+        """
+        Evaluate every input and return the summary.
+
+        sink is called with (index, record) for every input, in order, where
+        record is BatchOutcome.to_record(); item_io.JsonLinesWriter can be
+        passed to stream the results to a file.
+        """
+        summary = BatchSummary(self.state_name)
+        started = time.perf_counter()
+        for outcome in self.results(inputs, mock, context, state_config):
+            summary.add(outcome)
+            if sink is not None:
+                sink(outcome.index, outcome.to_record())
+        summary.elapsed = time.perf_counter() - started
+        return summary
@@ -0,0 +1,157 @@
+"""
+State and transition coverage for TestState runs.
+
+CoverageRecorder keeps the set of (state, status, nextState, catchIndex,
+retryIndex) tuples the suite produced; recording is a single set insert per
+call. CoverageReport maps those tuples onto the transition graph of the
+definition, nested Map and Parallel graphs included, plus one item per
+Retry policy, and reports what was and was not exercised, like line
+coverage for ASL.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .emulator import StateResult, iter_states
+from .graph import Edge, StateGraph
+
+Observation = Tuple[str, Optional[str], Optional[str], Optional[int], Optional[int]]
+
+
+class CoverageRecorder:
+    """The distinct outcomes observed per state."""
+
+    def __init__(self):
+        self.observed: Set[Observation] = set()
+
+    def record(self, state_name: str, response: Dict[str, Any]) -> None:
+        """Record a TestState API response."""
+        details = response.get('inspectionData', {}).get('errorDetails') or {}
+        self.observed.add((state_name, response.get('status'), response.get('nextState'),
+                           details.get('catchIndex'), details.get('retryIndex')))
+
+    def record_result(self, state_name: str, result: StateResult) -> None:
+        """Record a local StateResult without serializing it."""
+        details = result.inspection.get('errorDetails') or {}
+        self.observed.add((state_name, result.status, result.next_state,
+                           details.get('catchIndex'), details.get('retryIndex')))
+
+    def update(self, observations: Iterable[Iterable[Any]]) -> None:
+        self.observed.update(tuple(observation) for observation in observations)
+
+
+class CoverageClient:
+    """Step Functions client wrapper that records the outcome of every test_state call."""
+
+    def __init__(self, client: Any, recorder: CoverageRecorder):
+        self.client = client
+        self.recorder = recorder
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        response = self.client.test_state(**params)
+        self.recorder.record(params['stateName'], response)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+class CoverageReport:
+    """
+    Observed outcomes measured against every edge and retrier of a definition.
+
+    Usage example:
+    report = CoverageReport(definition, recorder.observed)
+    print(report.to_table())
+    """
+
+    def __init__(self, definition: Dict[str, Any], observed: Iterable[Observation]):
+        self.observed = sorted(set(observed), key=lambda item: json.dumps(item))
+        self.state_types = {name: state.get('Type') for name, state in iter_states(definition)}
+        self._outgoing: Dict[str, List[Edge]] = {}
+        for graph in StateGraph(definition).walk():
+            for name in graph.states:
+                self._outgoing[name] = list(graph.outgoing(name))
+        for name, state in iter_states(definition):
+            self._outgoing[name].extend(Edge(name, name, 'retry', index) for index in range(len(state.get('Retry', []))))
+        self.items = [edge for edges in self._outgoing.values() for edge in edges]
+        self.covered: Set[Edge] = set()
+        self.states_exercised: Set[str] = set()
+        for observation in self.observed:
+            if observation[0] not in self._outgoing:
+                continue
+            self.states_exercised.add(observation[0])
+            edge = self._edge_for(*observation)
+            if edge is not None:
+                self.covered.add(edge)
+
+    def _edge_for(self, state_name, status, next_state, catch_index, retry_index) -> Optional[Edge]:
+        edges = self._outgoing[state_name]
+        if status == 'RETRIABLE':
+            wanted = [edge for edge in edges if edge.kind == 'retry' and edge.index == retry_index]
+        elif status == 'CAUGHT_ERROR':
+            wanted = [edge for edge in edges if edge.kind == 'catch' and edge.index == catch_index]
+        elif status == 'SUCCEEDED' and next_state is not None:
+            wanted = [edge for edge in edges if edge.kind in ('next', 'choice', 'default') and edge.target == next_state]
+        elif status == 'SUCCEEDED' or (status == 'FAILED' and self.state_types[state_name] == 'Fail'):
+            wanted = [edge for edge in edges if edge.kind == 'end']
+        else:
+            wanted = []
+        return wanted[0] if wanted else None
+
+    @property
+    def missing(self) -> List[Edge]:
+        return [edge for edge in self.items if edge not in self.covered]
+
+    def summary(self) -> Dict[str, Any]:
+        """Exercised states and covered transitions, as counts and percentages."""
+        states = len(self._outgoing)
+        items = len(self.items)
+        return {
+            'states': states,
+            'statesExercised': len(self.states_exercised),
+            'statePercent': round(100.0 * len(self.states_exercised) / states, 1) if states else 100.0,
+            'transitions': items,
+            'transitionsCovered': len(self.covered),
+            'transitionPercent': round(100.0 * len(self.covered) / items, 1) if items else 100.0,
+        }
+
+    def by_state(self) -> Dict[str, Dict[str, Any]]:
+        """Covered and missing transitions per state, in definition order."""
+        rows = {}
+        for name, edges in self._outgoing.items():
+            rows[name] = {
+                'type': self.state_types[name],
+                'exercised': name in self.states_exercised,
+                'covered': [repr(edge) for edge in edges if edge in self.covered],
+                'missing': [repr(edge) for edge in edges if edge not in self.covered],
+            }
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'summary': self.summary(),
+            'states': self.by_state(),
+            'observed': [list(observation) for observation in self.observed],
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_table(self) -> str:
+        """A fixed-width table with one row per state and the transitions it is missing."""
+        rows = [('state', 'type', 'covered', 'missing')]
+        for name, row in self.by_state().items():
+            total = len(row['covered']) + len(row['missing'])
+            missing = ', '.join(edge.split(' ', 1)[1] for edge in row['missing'])
+            rows.append((name, row['type'], f"{len(row['covered'])}/{total}", missing))
+        widths = [max(len(row[column]) for row in rows) for column in range(3)]
+        lines = ['  '.join(value.ljust(width) for value, width in zip(row[:3], widths)) + '  ' + row[3]
+                 for row in rows]
+        summary = self.summary()
+        lines.append(
+            f"states {summary['statesExercised']}/{summary['states']} ({summary['statePercent']}%), "
+            f"transitions {summary['transitionsCovered']}/{summary['transitions']} ({summary['transitionPercent']}%)"
+        )
+        return '\n'.join(line.rstrip() for line in lines)
@@ -0,0 +1,194 @@
+"""
+Latency instrumentation for TestState calls.
+
+TimingClient wraps a Step Functions client and records one CallTiming per
+test_state call: wall time, request and response size, state name, status,
+SDK retry attempts and throttled attempts. TimingRecorder collects the calls,
+attributes them to the running test and summarizes them as p50/p95/p99 per
+state and per test, for the terminal report and for a JSON export that CI
+can compare between runs.
+"""
+
+import json
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# Error codes the Step Functions API uses to reject calls over the rate limit
+THROTTLING_ERRORS = {'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded'}
+
+
+def _payload_bytes(value: Any) -> int:
+    return len(json.dumps(value, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def _error_code(exception: Exception) -> str:
+    response = getattr(exception, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(exception).__name__
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of sorted values, interpolating linearly between ranks."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class CallTiming:
+    """Measurements for one test_state call."""
+
+    __slots__ = ('test_id', 'state_name', 'status', 'wall_time', 'request_bytes', 'response_bytes',
+                 'retry_attempts', 'throttles')
+
+    def __init__(self, test_id: Optional[str], state_name: str, status: str, wall_time: float,
+                 request_bytes: int, response_bytes: int, retry_attempts: int = 0, throttles: int = 0):
+        self.test_id = test_id
+        self.state_name = state_name
+        self.status = status
+        self.wall_time = wall_time
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.retry_attempts = retry_attempts
+        self.throttles = throttles
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CallTiming':
+        return cls(**data)
+
+
+def summarize(calls: Iterable[CallTiming]) -> Dict[str, Any]:
+    """Return count, latency percentiles (ms), payload sizes and retry totals for a group of calls."""
+    calls = list(calls)
+    times = sorted(call.wall_time * 1000.0 for call in calls)
+    statuses: Dict[str, int] = {}
+    for call in calls:
+        statuses[call.status] = statuses.get(call.status, 0) + 1
+    return {
+        'calls': len(calls),
+        'p50Ms': round(percentile(times, 50), 3),
+        'p95Ms': round(percentile(times, 95), 3),
+        'p99Ms': round(percentile(times, 99), 3),
+        'maxMs': round(times[-1], 3) if times else 0.0,
+        'totalMs': round(sum(times), 3),
+        'requestBytes': sum(call.request_bytes for call in calls),
+        'responseBytes': sum(call.response_bytes for call in calls),
+        'retryAttempts': sum(call.retry_attempts for call in calls),
+        'throttles': sum(call.throttles for call in calls),
+        'statuses': statuses,
+    }
+
+
+class TimingRecorder:
+    """
+    Collects CallTiming records for a session.
+
+    Register an instance as a pytest plugin so calls are attributed to the
+    test that is running; calls made outside a test have no test id.
+    """
+
+    def __init__(self):
+        self.calls: List[CallTiming] = []
+        self.current_test: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add(self, call: CallTiming) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def extend(self, calls: Iterable[CallTiming]) -> None:
+        with self._lock:
+            self.calls.extend(calls)
+
+    def pytest_runtest_logstart(self, nodeid, location) -> None:
+        self.current_test = nodeid
+
+    def pytest_runtest_logfinish(self, nodeid, location) -> None:
+        self.current_test = None
+
+    def by_state(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries keyed by state name."""
+        return self._grouped(lambda call: call.state_name)
+
+    def by_test(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries keyed by test node id, for calls made inside a test."""
+        return self._grouped(lambda call: call.test_id)
+
+    def _grouped(self, key) -> Dict[str, Dict[str, Any]]:
+        groups: Dict[str, List[CallTiming]] = {}
+        for call in self.calls:
+            name = key(call)
+            if name is not None:
+                groups.setdefault(name, []).append(call)
+        return {name: summarize(calls) for name, calls in sorted(groups.items())}
+
+    def report(self) -> Dict[str, Any]:
+        """The machine-readable report: overall, per-state and per-test summaries plus every call."""
+        return {
+            'summary': summarize(self.calls),
+            'states': self.by_state(),
+            'tests': self.by_test(),
+            'calls': [call.to_dict() for call in self.calls],
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+
+class TimingClient:
+    """
+    Step Functions client wrapper that times every test_state call.
+
+    For boto3 clients, throttled attempts that botocore retried internally are
+    counted through its 'needs-retry' event.
+    """
+
+    def __init__(self, client: Any, recorder: TimingRecorder):
+        self.client = client
+        self.recorder = recorder
+        self._attempts = threading.local()
+        events = getattr(getattr(client, 'meta', None), 'events', None)
+        if events is not None:
+            events.register('needs-retry.sfn.TestState', self._count_throttle)
+
+    def test_state(self, **params) -> Dict[str, Any]:
+        """Call the wrapped client's test_state and record its timing."""
+        self._attempts.throttles = 0
+        request_bytes = _payload_bytes(params)
+        start = time.perf_counter()
+        try:
+            response = self.client.test_state(**params)
+        except Exception as e:
+            self._record(params, _error_code(e), time.perf_counter() - start, request_bytes, 0, {})
+            raise
+        wall_time = time.perf_counter() - start
+        metadata = response.get('ResponseMetadata', {})
+        body = {name: value for name, value in response.items() if name != 'ResponseMetadata'}
+        self._record(params, response.get('status', 'UNKNOWN'), wall_time, request_bytes, _payload_bytes(body), metadata)
+        return response
+
+    def _record(self, params, status, wall_time, request_bytes, response_bytes, metadata) -> None:
+        self.recorder.add(CallTiming(
+            test_id=self.recorder.current_test,
+            state_name=params.get('stateName'),
+            status=status,
+            wall_time=wall_time,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            retry_attempts=metadata.get('RetryAttempts', 0),
+            throttles=getattr(self._attempts, 'throttles', 0),
+        ))
+
+    def _count_throttle(self, response=None, caught_exception=None, **kwargs) -> None:
+        if response is not None and response[1].get('Error', {}).get('Code') in THROTTLING_ERRORS:
+            self._attempts.throttles = getattr(self._attempts, 'throttles', 0) + 1
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
@@ -0,0 +1,73 @@
+"""
+Tests for evaluating one state over many inputs with the local engine.
+"""
+
+import json
+
+import pytest
+
+from sfn_testing import LocalTestStateError
+from sfn_testing.item_io import JsonLinesWriter
+from sfn_testing.state_batch import StateBatchEvaluator
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+def _approvals(count):
+    return ({'orderId': f'order-{index}', 'approvalResult': {'approved': index % 4 != 0}} for index in range(count))
+
+
+class TestStateBatchEvaluator:
+    """Tests for streaming inputs through one state and counting nextState."""
+
+    def test_histogram_of_next_states(self, state_machine_definition):
+        summary = StateBatchEvaluator(state_machine_definition, 'CheckApproval').run(_approvals(10000))
+        summary.assert_next_states({'SaveOrderDetails': 7500, 'OrderRejected': 2500})
+        assert summary.statuses == {'SUCCEEDED': 10000}
+        assert summary.first_index == {'OrderRejected': 0, 'SaveOrderDetails': 1}
+        assert 'SaveOrderDetails' in summary.to_table()
+
+    def test_matches_the_runner_response_for_each_input(self, state_machine_definition, runner):
+        inputs = list(_approvals(8)) + [{'approvalResult': {'approved': 'yes'}}, {}]
+        outcomes = StateBatchEvaluator(state_machine_definition, 'CheckApproval').results(inputs)
+        for outcome, state_input in zip(outcomes, inputs):
+            response = runner.with_input(state_input).execute('CheckApproval').get_response()
+            assert outcome.result.to_response() == response
+
+    def test_jsonl_inputs_stream_to_a_jsonl_result_file(self, state_machine_definition, tmp_path):
+        source = tmp_path / 'validations.jsonl'
+        source.write_text(''.join(json.dumps({'orderId': f'order-{index}'}) + '\n' for index in range(300)))
+        target = tmp_path / 'results.jsonl'
+
+        def mock(index, state_input):
+            if index % 100 == 99:
+                return {'errorOutput': {'error': 'ValidationException', 'cause': 'bad order'}}
+            return {'result': {'isValid': index % 2 == 0}}
+
+        with JsonLinesWriter(str(target)) as writer:
+            summary = StateBatchEvaluator(state_machine_definition, 'ValidateOrder').run(
+                str(source), mock, sink=writer
+            )
+        assert summary.histogram() == {'CheckValidation': 297, 'ValidationFailed': 3}
+        assert summary.statuses == {'SUCCEEDED': 297, 'CAUGHT_ERROR': 3}
+        records = [json.loads(line) for line in target.read_text().splitlines()]
+        assert len(records) == 300
+        assert records[0]['output']['validationResult'] == {'isValid': True}
+        assert (records[99]['status'], records[99]['nextState']) == ('CAUGHT_ERROR', 'ValidationFailed')
+
+    def test_query_errors_are_counted(self, state_machine_definition):
+        summary = StateBatchEvaluator(state_machine_definition, 'OrderProcessed').run([{'orderId': 'o-1'}, {}])
+        assert summary.statuses == {'SUCCEEDED': 1, 'FAILED': 1}
+        assert summary.histogram() == {None: 2}
+
+    def test_helper_checks_the_histogram(self, sfn_test_helper):
+        summary = sfn_test_helper.evaluate_state_batch(
+            'CheckValidation', ({'validationResult': {'isValid': index < 3}} for index in range(5)),
+            expected_next_states={'ProcessOrderItems': 3, 'ValidationFailed': 2}
+        )
+        assert summary.to_dict()['total'] == 5
+
+    def test_unknown_state_is_rejected(self, state_machine_definition):
+        with pytest.raises(LocalTestStateError, match='does not exist'):
+            StateBatchEvaluator(state_machine_definition, 'Missing')
@@ -0,0 +1,87 @@
+"""
+Tests for state and transition coverage recording.
+"""
+
+import json
+
+import pytest
+
+from conftest import StepFunctionTestRunner
+from order_scenarios import HAPPY_PATH_MOCKS, ORDER_INPUT
+from sfn_testing import LocalTestStateClient, LocalWorkflowExecutor
+from sfn_testing.state_coverage import CoverageClient, CoverageRecorder, CoverageReport
+
+
+pytestmark = pytest.mark.sfn_engine('local')
+
+
+class TestCoverageRecording:
+    """Tests for the outcome tuples recorded from runner calls and workflow runs."""
+
+    def test_runner_calls_record_status_next_state_and_policy_indices(self, state_machine_definition):
+        recorder = CoverageRecorder()
+        runner = StepFunctionTestRunner(CoverageClient(LocalTestStateClient(), recorder), state_machine_definition)
+        runner.with_input({'orderId': 'o-1'}).with_mock_result({'isValid': True}).execute('ValidateOrder')
+        runner.with_mock_result(None).with_mock_error({'Error': 'Lambda.TooManyRequestsException', 'Cause': 'busy'})
+        runner.execute('ValidateOrder')
+        runner.with_retrier_retry_count(3).execute('ValidateOrder')
+        runner.with_retrier_retry_count(3).execute('ValidateOrder')
+        assert recorder.observed == {
+            ('ValidateOrder', 'SUCCEEDED', 'CheckValidation', None, None),
+            ('ValidateOrder', 'RETRIABLE', None, None, 0),
+            ('ValidateOrder', 'CAUGHT_ERROR', 'ValidationFailed', 0, None),
+        }
+
+    def test_workflow_runs_record_every_step(self, state_machine_definition):
+        recorder = CoverageRecorder()
+        LocalWorkflowExecutor(state_machine_definition, coverage=recorder).run(ORDER_INPUT, HAPPY_PATH_MOCKS)
+        assert {observation[0] for observation in recorder.observed} == {
+            'ValidateOrder', 'CheckValidation', 'ProcessOrderItems', 'ParallelProcessing', 'WaitForApproval',
+            'CheckApproval', 'SaveOrderDetails', 'SendNotification', 'OrderProcessed'
+        }
+
+
+class TestCoverageReport:
+    """Tests for mapping recorded outcomes onto the definition's graph."""
+
+    def test_happy_path_covers_its_edges_only(self, state_machine_definition):
+        recorder = CoverageRecorder()
+        LocalWorkflowExecutor(state_machine_definition, coverage=recorder).run(ORDER_INPUT, HAPPY_PATH_MOCKS)
+        report = CoverageReport(state_machine_definition, recorder.observed)
+        states = report.by_state()
+        assert states['CheckValidation']['covered'] == ['CheckValidation -choice[0]-> ProcessOrderItems']
+        assert states['CheckValidation']['missing'] == ['CheckValidation -default-> ValidationFailed']
+        assert states['OrderProcessed']['covered'] == ['OrderProcessed -end-> (end)']
+        assert not states['OrderRejected']['exercised']
+        summary = report.summary()
+        assert (summary['statesExercised'], summary['states']) == (9, 17)
+        # 19 top-level edges, 7 nested edges, 11 retry policies
+        assert (summary['transitionsCovered'], summary['transitions']) == (9, 37)
+
+    def test_retries_catches_and_fail_states_map_to_their_items(self, state_machine_definition):
+        report = CoverageReport(state_machine_definition, [
+            ('SendNotification', 'RETRIABLE', None, None, 0),
+            ('SendNotification', 'CAUGHT_ERROR', 'OrderProcessed', 0, None),
+            ('OrderRejected', 'FAILED', None, None, None),
+            ('SaveOrderDetails', 'FAILED', None, None, None),
+            ('NotInTheDefinition', 'SUCCEEDED', None, None, None),
+        ])
+        assert set(map(repr, report.covered)) == {
+            'SendNotification -retry[0]-> SendNotification',
+            'SendNotification -catch[0]-> OrderProcessed',
+            'OrderRejected -end-> (end)',
+        }
+        assert report.states_exercised == {'SendNotification', 'OrderRejected', 'SaveOrderDetails'}
+        assert 'SendNotification -next-> OrderProcessed' in map(repr, report.missing)
+
+    def test_table_and_json_output(self, state_machine_definition, tmp_path):
+        report = CoverageReport(state_machine_definition, [('CheckApproval', 'SUCCEEDED', 'OrderRejected', None, None)])
+        table = report.to_table().splitlines()
+        assert table[0].split() == ['state', 'type', 'covered', 'missing']
+        assert 'CheckApproval         Choice    1/2      -choice[0]-> SaveOrderDetails' in table
+        assert table[-1] == 'states 1/17 (5.9%), transitions 1/37 (2.7%)'
+        path = tmp_path / 'coverage.json'
+        report.write_json(str(path))
+        data = json.loads(path.read_text())
+        assert data['observed'] == [['CheckApproval', 'SUCCEEDED', 'OrderRejected', None, None]]
+        assert data['states']['CheckApproval']['covered'] == ['CheckApproval -default-> OrderRejected']
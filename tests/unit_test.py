@@ -214,6 +214,18 @@ class TestOrderProcessingStateMachine:
          .assert_caught_error()
          .assert_next_state("ValidationFailed"))
 
+    def test_retry_schedule_sweep_across_all_tasks(self, sfn_test_helper):
+        """
+        Test every Task state's retry and catch behavior for every listed error and attempt
+        """
+        sweep = sfn_test_helper.sweep_retry_mechanisms(input_data={"orderId": "order-retry-sweep", "amount": 100.0})
+        
+        assert set(sweep.states_covered) == {
+            "ValidateOrder", "ProcessItem", "ProcessPayment", "UpdateInventory",
+            "WaitForApproval", "SaveOrderDetails", "SendNotification"
+        }
+        sweep.assert_all_passed()
+
     def test_map_state_tolerated_failure_threshold(self, runner):
         """
         Test Map state with tolerated failure threshold for order item processing
@@ -264,6 +276,38 @@ class TestOrderProcessingStateMachine:
          .assert_caught_error()
          .assert_next_state("ValidationFailed"))
 
+    def test_map_state_item_processor_per_item(self, sfn_test_helper):
+        """
+        Test the Map state's ItemProcessor per order item, with the tolerated failure count applied locally
+        """
+        test_input = {
+            "orderId": "order-map-items",
+            "orderItems": [{"itemId": f"item-{index}"} for index in range(1, 6)]
+        }
+        failing = {"ProcessItem": {"errorOutput": {"error": "Lambda.ServiceException", "cause": "item failed"}}}
+
+        def item_mocks(failed_items):
+            return lambda index, item: failing if item["itemId"] in failed_items else {
+                "ProcessItem": {"result": {"itemId": item["itemId"], "processed": True}}
+            }
+
+        run = sfn_test_helper.simulate_map_state(
+            input_data=test_input,
+            item_mocks=item_mocks({"item-2", "item-4"}),
+            expected_next_state="ParallelProcessing"
+        )
+        assert (run.succeeded, run.failed) == (3, 2)
+        assert run.output["processedItems"][0] == {"itemId": "item-1", "processed": True}
+        assert run.output["processedItems"][1]["Error"] == "ItemProcessingError"
+
+        run = sfn_test_helper.simulate_map_state(
+            input_data=test_input,
+            item_mocks=item_mocks({"item-1", "item-2", "item-3"}),
+            expected_status="CAUGHT_ERROR",
+            expected_next_state="ValidationFailed"
+        )
+        assert run.error == "States.ExceedToleratedFailureThreshold"
+
     def test_parallel_state_branch_failure_handling(self, runner):
         """
         Test Parallel state branch failure handling for payment and inventory processing
@@ -322,6 +366,35 @@ class TestOrderProcessingStateMachine:
          .assert_caught_error()
          .assert_next_state("OrderRejected"))
 
+    def test_parallel_state_branches_with_fail_fast(self, sfn_test_helper):
+        """
+        Test the payment and inventory branches running locally, with a failed payment cancelling inventory
+        """
+        test_input = {"orderId": "order-parallel-branches", "amount": 200.0}
+
+        run = sfn_test_helper.simulate_parallel_state(
+            input_data=test_input,
+            branch_mocks={
+                "ProcessPayment": {"result": {"paymentId": "pay-12345", "status": "completed"}},
+                "UpdateInventory": {"result": {"inventoryUpdated": True, "itemsReserved": 1}}
+            },
+            expected_next_state="WaitForApproval"
+        )
+        assert run.output["parallelResults"][1]["itemsReserved"] == 1
+
+        run = sfn_test_helper.simulate_parallel_state(
+            input_data=test_input,
+            branch_mocks={
+                "ProcessPayment": {"errorOutput": {"error": "Payment.Declined", "cause": "Card declined"}},
+                "UpdateInventory": {"result": {"inventoryUpdated": True, "itemsReserved": 1}}
+            },
+            latencies={"UpdateInventory": 10},
+            expected_status="CAUGHT_ERROR",
+            expected_next_state="OrderRejected"
+        )
+        assert [branch.status for branch in run.branches] == ["FAILED", "CANCELLED"]
+        assert len(run.attempts) == 3  # two States.BranchFailed retries, then the Catch
+
     # ============================================================================
     # NEGATIVE SCENARIO TESTS - Testing validation failures for Choice states
     # ============================================================================
@@ -0,0 +1,73 @@
+"""
+Tests for the local full-workflow executor.
+Each test runs the complete order processing workflow in a single in-process call.
+"""
+
+import pytest
+
+from order_scenarios import HAPPY_PATH, HAPPY_PATH_MOCKS, ORDER_INPUT
+from sfn_testing import LocalTestStateError
+
+
+class TestLocalWorkflowExecutor:
+    """Tests for chaining states automatically from StartAt."""
+
+    def test_complete_order_processing_workflow(self, workflow_executor):
+        execution = (workflow_executor
+                     .run(ORDER_INPUT, mocks=HAPPY_PATH_MOCKS, context={"Task": {"Token": "token-1"}})
+                     .assert_succeeded()
+                     .assert_path(HAPPY_PATH)
+                     .assert_output_matches_json("order-12345"))
+
+        # Each hop receives the merged output of the previous one
+        save_input = execution.step("SaveOrderDetails").input
+        assert save_input["validationResult"]["isValid"] is True
+        assert save_input["approvalResult"] == {"approved": True}
+        assert len(save_input["processedItems"]) == 2
+        payload = execution.step("WaitForApproval").result.inspection["afterArguments"]["Payload"]
+        assert payload["taskToken"] == "token-1"
+
+    def test_validation_failure_path(self, workflow_executor):
+        mocks = dict(HAPPY_PATH_MOCKS, ValidateOrder={"result": {"statusCode": 400, "isValid": False}})
+        (workflow_executor
+         .run(ORDER_INPUT, mocks=mocks)
+         .assert_failed("ValidationError")
+         .assert_path(["ValidateOrder", "CheckValidation", "ValidationFailed"]))
+
+    def test_approval_rejection_path(self, workflow_executor):
+        mocks = dict(HAPPY_PATH_MOCKS, WaitForApproval={"result": {"approved": False}})
+        (workflow_executor
+         .run(ORDER_INPUT, mocks=mocks)
+         .assert_failed("ApprovalError")
+         .assert_visited("CheckApproval")
+         .assert_visited("OrderRejected"))
+
+    def test_notification_error_is_caught_and_order_still_succeeds(self, workflow_executor):
+        notification_error = {"errorOutput": {"error": "SNS.InternalError", "cause": "unavailable"}}
+        mocks = dict(HAPPY_PATH_MOCKS, SendNotification=notification_error)
+        execution = (workflow_executor
+                     .run(ORDER_INPUT, mocks=mocks)
+                     .assert_succeeded()
+                     .assert_path(HAPPY_PATH))
+        assert execution.step("SendNotification").status == "CAUGHT_ERROR"
+
+    def test_retries_until_exhausted_then_catches(self, workflow_executor):
+        throttled = {"errorOutput": {"error": "Lambda.TooManyRequestsException", "cause": "rate exceeded"}}
+        execution = (workflow_executor
+                     .run(ORDER_INPUT, mocks=dict(HAPPY_PATH_MOCKS, ValidateOrder=throttled))
+                     .assert_failed("ValidationError")
+                     .assert_path(["ValidateOrder", "ValidationFailed"]))
+        attempts = [step for step in execution.steps if step.state_name == "ValidateOrder"]
+        assert [step.status for step in attempts] == ["RETRIABLE", "RETRIABLE", "RETRIABLE", "CAUGHT_ERROR"]
+        backoffs = [step.result.inspection["errorDetails"]["retryBackoffIntervalSeconds"] for step in attempts[:3]]
+        assert backoffs == [2, 4, 8]
+
+    def test_mock_sequence_recovers_after_retry(self, workflow_executor):
+        throttled = {"errorOutput": {"error": "Lambda.TooManyRequestsException", "cause": "rate exceeded"}}
+        mocks = dict(HAPPY_PATH_MOCKS, ValidateOrder=[throttled, HAPPY_PATH_MOCKS["ValidateOrder"]])
+        execution = workflow_executor.run(ORDER_INPUT, mocks=mocks).assert_succeeded().assert_path(HAPPY_PATH)
+        assert [step.status for step in execution.steps[:2]] == ["RETRIABLE", "SUCCEEDED"]
+
+    def test_missing_mock_is_rejected(self, workflow_executor):
+        with pytest.raises(LocalTestStateError):
+            workflow_executor.run(ORDER_INPUT, mocks={})